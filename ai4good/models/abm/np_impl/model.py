@@ -1,4 +1,5 @@
 import random
+from collections import namedtuple
 import numpy as np
 import numba as nb
 
@@ -9,6 +10,8 @@ logger = get_logger(__name__)
 
 # very small float number to account for floating precision loss
 SMALL_ERROR = 0.0000001
+# Maximum number of cells along each side of the camp in the cell list of wandering agents
+MAX_GRID_CELLS = 1024
 
 FEMALE = 0
 MALE = 1
@@ -39,7 +42,7 @@ ACTIVITY_HOSPITALIZED = 5   # Agent is hospitalized. Infection spread is not mod
 
 
 # Number of features of each agent
-A_FEATURES = 16
+A_FEATURES = 17
 # Features of each agent
 A_X = 0  # x co-ordinate at any given point in time
 A_Y = 1  # y co-ordinate at any given point in time
@@ -63,6 +66,138 @@ A_DAY_COUNTER = 13
 A_IS_ASYMPTOMATIC = 14
 # The activity of agent before they went to a queue. Agents will be sent back to this activity after dequeue
 A_ACTIVITY_BEFORE_QUEUE = 15
+# Id of the household where agent lives, the row of the household in `Moria.households`
+A_HOUSEHOLD = 16
+
+# Name and type of the column of each feature, in the order of the A_* constants
+AGENT_COLUMNS = (
+    ('x', np.float32), ('y', np.float32), ('age', np.float32), ('gender', np.int8), ('disease', np.int8),
+    ('incubation_period', np.int16), ('home_range', np.float32), ('ethnicity', np.int8),
+    ('household_x', np.float32), ('household_y', np.float32), ('toilet', np.int16), ('food_line', np.int16),
+    ('activity', np.int8), ('day_counter', np.int16), ('is_asymptomatic', np.int8),
+    ('activity_before_queue', np.int8), ('household', np.int32),
+)
+
+
+class AgentStore(namedtuple('AgentStore', [name for name, _ in AGENT_COLUMNS])):
+    """
+    Agents of the camp stored column-wise, with one typed array per feature: int8/int16/int32 codes, ids and counters,
+    float32 co-ordinates, ages and home ranges.
+
+    Numba kernels take the store as it is and read the columns as attributes, e.g. `agents.disease[i]`. In python, the
+    store is indexed like the (n, A_FEATURES) matrix it replaces:
+        agents[ids, A_DISEASE]          column of the agents `ids`, which can be assigned to
+        agents[ids, [A_X, A_Y]]         (len(ids), 2) array of the features, which can be assigned to
+        agents[ids] or agents[ids, :]   new store of the agents `ids`, which can be assigned a store of the same size
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def empty(n: int) -> 'AgentStore':
+        # store of `n` agents with all features 0
+        return AgentStore(*(np.zeros(n, dtype=dtype) for _, dtype in AGENT_COLUMNS))
+
+    @staticmethod
+    def from_matrix(matrix: np.array) -> 'AgentStore':
+        # store of the agents of a (n, A_FEATURES) matrix
+        return AgentStore(*(matrix[:, f].astype(dtype) for f, (_, dtype) in enumerate(AGENT_COLUMNS)))
+
+    def to_matrix(self) -> np.array:
+        # (n, A_FEATURES) float matrix of the agents
+        return np.stack(tuple(self), axis=1).astype(np.float64)
+
+    def copy(self) -> 'AgentStore':
+        return AgentStore(*(column.copy() for column in self))
+
+    @property
+    def shape(self) -> (int, int):
+        return self.x.shape[0], A_FEATURES
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self)
+
+    def __getitem__(self, key):
+        rows, features = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(features, slice):
+            return AgentStore(*(column[rows] for column in self._columns(features)))
+        if isinstance(features, (list, np.ndarray)):
+            return np.stack([tuple.__getitem__(self, f)[rows] for f in features], axis=-1)
+        return tuple.__getitem__(self, features)[rows]
+
+    def __setitem__(self, key, value):
+        rows, features = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(features, slice):
+            for column, value_column in zip(self._columns(features), value):
+                column[rows] = value_column
+        elif isinstance(features, (list, np.ndarray)):
+            value = np.asarray(value)
+            for k, f in enumerate(features):
+                tuple.__getitem__(self, f)[rows] = value[..., k]
+        else:
+            tuple.__getitem__(self, features)[rows] = value
+
+    def _columns(self, features: slice) -> tuple:
+        if features != slice(None):
+            raise IndexError("Only all features of the agents can be selected with a slice")
+        return tuple(self)
+
+
+class Queues(namedtuple('Queues', ['members', 'head', 'size'])):
+    """
+    Ring buffers of the agents waiting in the queues of one kind (toilets or food lines), which numba kernels take as
+    they are. Queue q holds `size[q]` agent ids, starting from its front at members[q, head[q]] and wrapping around the
+    end of row q. Each row has room for all the agents who use the queue, so a queue never overflows.
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def empty(num_queues: int, capacity: int) -> 'Queues':
+        # `num_queues` empty queues with room for `capacity` agents each
+        return Queues(np.zeros((num_queues, max(capacity, 1)), dtype=np.int64), np.zeros(num_queues, dtype=np.int64),
+                      np.zeros(num_queues, dtype=np.int64))
+
+    def agents(self, q: int) -> np.array:
+        # ids of the agents in queue q, from front to back
+        return np.roll(self.members[q], -self.head[q])[:self.size[q]]
+
+
+@nb.njit
+def cell_list(positions: np.array, cell_size: float, grid_size: int) -> (np.array, np.array):
+    """
+    Bucket entities into the cells of a uniform square grid.
+
+    Parameters
+    ----------
+        positions: (?, 2) co-ordinates of the entities, non negative
+        cell_size: Side length of each cell
+        grid_size: Number of cells along each axis, co-ordinates beyond the grid go to its last row/column
+
+    Returns
+    -------
+        out: `offsets` array of length grid_size * grid_size + 1 and `members` array of entity indices ordered by
+            cell, the entities in cell (cx, cy) are members[offsets[c]:offsets[c + 1]] with c = cx * grid_size + cy
+
+    """
+    n = positions.shape[0]
+    cells = np.empty(n, dtype=np.int64)
+    offsets = np.zeros(grid_size * grid_size + 1, dtype=np.int64)
+    for k in range(n):
+        cx = min(int(positions[k, 0] / cell_size), grid_size - 1)
+        cy = min(int(positions[k, 1] / cell_size), grid_size - 1)
+        cells[k] = cx * grid_size + cy
+        offsets[cells[k] + 1] += 1
+    for c in range(grid_size * grid_size):
+        offsets[c + 1] += offsets[c]
+    # counting sort of the entities by cell
+    members = np.empty(n, dtype=np.int64)
+    filled = offsets[:-1].copy()
+    for k in range(n):
+        members[filled[cells[k]]] = k
+        filled[cells[k]] += 1
+    return offsets, members
 
 
 class OptimizedOps(object):
@@ -136,6 +271,28 @@ class OptimizedOps(object):
         # return index of the nearest entity and the nearest distance associated with that entity
         return d_min_index, d_min
 
+    @staticmethod
+    def household_index(household_ids: np.array, num_households: int) -> (np.array, np.array):
+        """
+        CSR style index of the members of each household.
+
+        Parameters
+        ----------
+            household_ids: Household id of each agent
+            num_households: Total number of households
+
+        Returns
+        -------
+            out: `offsets` array of length num_households + 1 and `members` array of agent ids ordered by household,
+                the members of household h are members[offsets[h]:offsets[h + 1]]
+
+        """
+        household_ids = household_ids.astype(np.int64)
+        offsets = np.zeros(num_households + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(household_ids, minlength=num_households))
+        members = np.argsort(household_ids, kind='stable').astype(np.int64)
+        return offsets, members
+
     @staticmethod
     @nb.njit
     def showing_symptoms(disease_state):
@@ -168,94 +325,101 @@ class Camp:
         self.params = params
         self.num_people = params.num_people
 
-        self.agents: np.array = None
-        self.toilet_queue = {}
-        self.food_line_queue = {}
+        self.agents: AgentStore = None
+        self.toilet_queue: Queues = None
+        self.food_line_queue: Queues = None
 
-    def set_agents(self, agents: np.array) -> None:
+    def set_agents(self, agents: AgentStore) -> None:
         self.agents = agents
 
     @staticmethod
     @nb.njit(parallel=True)
-    def simulate_households(agents: np.array, prob_spread: float, activity: int) -> (np.array, int):
+    def simulate_households(agents: AgentStore, ids: np.array, prob_spread: float, activity: int) -> int:
         """
         Function to send people to household and simulate infection dynamics in those households.
         This function is optimized using numba.
 
         Parameters
         ----------
-        agents: A Numpy array containing data of agents who will go inside their households at current simulation step
+        agents: The agents of the camp, the agents `ids` are updated in place
+        ids: Ids of the agents who will go inside their households at current simulation step
         prob_spread: The probability of infection transmission if a susceptible and infectious agent interact in house
         activity: The activity inside the household. It can be either ACTIVITY_HOUSEHOLD (normal household visit) or
             ACTIVITY_QUARANTINED (for when under quarantine)
 
         Returns
         -------
-        out: Updated agents array and the number of new infections
+        out: The number of new infections
 
         """
 
-        n = agents.shape[0]  # number of agents inside their households
+        n = ids.shape[0]  # number of agents inside their households
         num_new_infections = 0  # number of new infections caused by household interactions
 
-        # Loop through each pair (i,j) of agents who are inside their households.
-        # If agent i and agent j shares household AND agent i is susceptible AND agent j is infectious
-        # Then, infection can spread from agent j to agent i with some probability
-        for i in nb.prange(n):
+        # Columns used in the parallel loop. Numba drops writes made through the fields of the store (or through columns
+        # unpacked from it as a tuple) inside prange, so each column gets its own local reference
+        x = agents.x
+        y = agents.y
+        household_x = agents.household_x
+        household_y = agents.household_y
+        disease = agents.disease
+        activities = agents.activity
+        day_counter = agents.day_counter
+        household = agents.household
+
+        # Count the infectious agents inside each household in one pass over the agents. Then, agent i shares
+        # household with `num_infectious[household of i]` infectious agents
+        num_households = 0
+        for k in range(n):
+            num_households = max(num_households, household[ids[k]] + 1)
+        num_infectious = np.zeros(num_households, dtype=np.int32)
+        for k in range(n):
+            # Agent j will infect agents of its household if agent j is infectious
+            j = ids[k]
+            if disease[j] not in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED, INF_DECEASED):
+                num_infectious[household[j]] += 1
+
+        # If agent i is susceptible, infection can spread to agent i from the infectious agents of its household with
+        # some probability
+        for k in nb.prange(n):
+            i = ids[k]
 
             # Update current activity route
-            agents[i, A_ACTIVITY] = activity
+            activities[i] = activity
             # Update current location of agent to household location
-            agents[i, A_X] = agents[i, A_HOUSEHOLD_X]
-            agents[i, A_Y] = agents[i, A_HOUSEHOLD_Y]
+            x[i] = household_x[i]
+            y[i] = household_y[i]
 
             # Agent i will be infected iff he/she is currently susceptible
-            if agents[i, A_DISEASE] != INF_SUSCEPTIBLE:
+            if disease[i] != INF_SUSCEPTIBLE:
                 # Skip if agent i is not susceptible
                 continue
 
-            num_infectious_hh = 0  # number of infectious households of agent i
-
-            for j in nb.prange(n):
-
-                # Agent j will infect agent i if agent j is infectious
-                if agents[j, A_DISEASE] in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED, INF_DECEASED):
-                    # Skip if agent j is not infectious
-                    continue
-
-                # Distance between households of i and j
-                dij = (agents[i, A_HOUSEHOLD_X] - agents[j, A_HOUSEHOLD_X]) ** 2 + \
-                      (agents[i, A_HOUSEHOLD_Y] - agents[j, A_HOUSEHOLD_Y]) ** 2
-                dij = dij ** 0.5
-
-                if dij > SMALL_ERROR:
-                    # If agents i and j don't share household, then skip
-                    continue
-
-                num_infectious_hh += 1  # agent j shares household with agent i and is also infectious
+            num_infectious_hh = num_infectious[int(household[i])]  # number of infectious housemates of i
 
             # Probability of infection spread inside household for agent i
             # From tucker model: 𝑝𝑖𝑑ℎ = 1 − (1 − 𝑝ℎ)^ℎ𝑐𝑖𝑑.
             p = 1.0 - (1.0 - prob_spread) ** num_infectious_hh
 
             if random.random() <= p:  # infect agent i based on calculated probability
-                agents[i, A_DISEASE] = INF_EXPOSED
-                agents[i, A_DAY_COUNTER] = 0
+                disease[i] = INF_EXPOSED
+                day_counter[i] = 0
                 num_new_infections += 1
 
-        return agents, num_new_infections
+        return num_new_infections
 
     @staticmethod
     @nb.njit(parallel=True)
-    def simulate_wander(agents: np.array, camp_size: float, relative_strength_of_interaction: float,
-                        infection_radius: float, prob_spread: float) -> (np.array, int):
+    def simulate_wander(agents: AgentStore, ids: np.array, camp_size: float, relative_strength_of_interaction: float,
+                        infection_radius: float, prob_spread: float) -> int:
         """
         Simulate wandering of the agents in the camp. During wandering, agents will also infect others or get infected
         by others.
 
         Parameters
         ----------
-        agents: A numpy array containing information of agents who are wandering at current simulation time step
+        agents: The agents of the camp, the agents `ids` are updated in place
+        ids: Ids of the agents who are wandering at current simulation time step
         camp_size: Size of the square sized camp
         relative_strength_of_interaction: Relative encounter rate between agents of same ethnicity (gij in tucker model)
         infection_radius: Distance around each agent where infection spread can happen
@@ -264,72 +428,107 @@ class Camp:
 
         Returns
         -------
-        out: Updated agents array
+        out: The number of new infections
 
         """
-        n = agents.shape[0]  # number of agents in the camp who are wandering
+        n = ids.shape[0]  # number of agents in the camp who are wandering
         num_new_infections = 0  # number of new infections caused by household interactions
 
+        # Columns used in the parallel loops. Numba drops writes made through the fields of the store (or through
+        # columns unpacked from it as a tuple) inside prange, so each column gets its own local reference
+        x = agents.x
+        y = agents.y
+        household_x = agents.household_x
+        household_y = agents.household_y
+        disease = agents.disease
+        activity = agents.activity
+        day_counter = agents.day_counter
+        home_range = agents.home_range
+        ethnicity = agents.ethnicity
+
         # Wander people around their household based on home range
-        for i in nb.prange(n):  # using nb.prange helps it run in parallel
+        for k in nb.prange(n):  # using nb.prange helps it run in parallel
+            i = ids[k]
             # Change the activity route of the agent
-            agents[i, A_ACTIVITY] = ACTIVITY_WANDERING
+            activity[i] = ACTIVITY_WANDERING
 
             # Find r and θ for finding random point in circle centered at agent's household.
             # This r and θ values are then used to calculate the new position of the agents around their households.
-            r = agents[i, A_HOME_RANGE] * random.random()
+            r = home_range[i] * random.random()
             theta = 2.0 * np.pi * random.random()
 
             # Calculate new co-ordinates from r and θ.
-            agents[i, A_X] = agents[i, A_HOUSEHOLD_X] + r * np.cos(theta)
-            agents[i, A_Y] = agents[i, A_HOUSEHOLD_Y] + r * np.sin(theta)
+            x[i] = household_x[i] + r * np.cos(theta)
+            y[i] = household_y[i] + r * np.sin(theta)
 
             # Clip co-ordinate values so that agents don't go outside the camp during simulation
-            agents[i, A_X] = 0.0 if agents[i, A_X] < 0.0 else (camp_size if agents[i, A_X] > camp_size else
-                                                               agents[i, A_X])
-            agents[i, A_Y] = 0.0 if agents[i, A_Y] < 0.0 else (camp_size if agents[i, A_Y] > camp_size else
-                                                               agents[i, A_Y])
+            x[i] = 0.0 if x[i] < 0.0 else (camp_size if x[i] > camp_size else x[i])
+            y[i] = 0.0 if y[i] < 0.0 else (camp_size if y[i] > camp_size else y[i])
 
         # Simulate infection dynamics for the wanderers.
         # Susceptible agent i contract infection from an infectious agent j.
-        for i in nb.prange(n):
+        # Agents interact when `dij / gij <= infection_radius`, so never beyond infection_radius * max(1, gij). Only the
+        # infectious agents in the cells around agent i of a grid with cells of that size need to be checked
+        max_radius = infection_radius * max(1.0, relative_strength_of_interaction)
+        cell_size = max(max_radius, camp_size / MAX_GRID_CELLS)
+        grid_size = int(camp_size / cell_size) + 1
+
+        infectious = np.zeros(n, dtype=np.int64)
+        num_infectious = 0
+        for k in range(n):
+            j = ids[k]
+            if disease[j] not in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED, INF_DECEASED):
+                infectious[num_infectious] = j
+                num_infectious += 1
+        infectious = infectious[:num_infectious]
+        positions = np.empty((num_infectious, 2))
+        for k in range(num_infectious):
+            positions[k, 0] = x[infectious[k]]
+            positions[k, 1] = y[infectious[k]]
+        cell_offsets, cell_members = cell_list(positions, cell_size, grid_size)
+
+        for m in nb.prange(n):
+            i = ids[m]
             # Agent i will be infected iff he/she is susceptible
-            if agents[i, A_DISEASE] != INF_SUSCEPTIBLE:
+            if disease[i] != INF_SUSCEPTIBLE:
                 # Skip if agent i is not susceptible
                 continue
 
             num_inf_interactions = 0  # Number of infectious interactions agent i has with other wanderers
 
-            for j in nb.prange(n):
-                # Agent j will infect agent i if agent j is infectious
-                if agents[j, A_DISEASE] in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED, INF_DECEASED):
-                    # Skip if agent j is not infectious
-                    continue
-
-                # Account for relative encounter rate between agents of same ethnicity
-                # gij = 1 if individuals i and j have the same background, and gij = 0.2 otherwise.
-                gij = 1.0 if agents[i, A_ETHNICITY] == agents[j, A_ETHNICITY] else relative_strength_of_interaction
-
-                # Distance between agents i and j
-                dij = (agents[i, A_X] - agents[j, A_X]) ** 2 + (agents[i, A_Y] - agents[j, A_Y]) ** 2
-                dij = dij ** 0.5
-
-                # Check if agents i and j will interact. This is primarily based on distance.
-                # This also accounts in the ethnicity of the agents i.e. for agents with different ethnicities the
-                # distance dij will be scaled up by factor of `1/gij`
-                num_inf_interactions += ((dij / gij) <= infection_radius)
+            cx = min(int(x[i] / cell_size), grid_size - 1)
+            cy = min(int(y[i] / cell_size), grid_size - 1)
+            for nx in range(max(cx - 1, 0), min(cx + 2, grid_size)):
+                for ny in range(max(cy - 1, 0), min(cy + 2, grid_size)):
+                    c = nx * grid_size + ny
+                    for k in range(cell_offsets[c], cell_offsets[c + 1]):
+                        # Agent j is infectious and will infect agent i if they interact
+                        j = infectious[cell_members[k]]
+
+                        # Account for relative encounter rate between agents of same ethnicity
+                        # gij = 1 if individuals i and j have the same background, and gij = 0.2 otherwise.
+                        gij = 1.0 if ethnicity[i] == ethnicity[j] else \
+                            relative_strength_of_interaction
+
+                        # Distance between agents i and j
+                        dij = (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2
+                        dij = dij ** 0.5
+
+                        # Check if agents i and j will interact. This is primarily based on distance.
+                        # This also accounts in the ethnicity of the agents i.e. for agents with different ethnicities
+                        # the distance dij will be scaled up by factor of `1/gij`
+                        num_inf_interactions += ((dij / gij) <= infection_radius)
 
             # probability of infection spread inside household for agent i
             p = 1.0 - (1.0 - prob_spread) ** num_inf_interactions
 
             if random.random() <= p:  # check if agent i contracts infection based on calculated probability
                 # set disease state of newly exposed agent i as `INF_EXPOSED`
-                agents[i, A_DISEASE] = INF_EXPOSED
-                agents[i, A_DAY_COUNTER] = 0
+                disease[i] = INF_EXPOSED
+                day_counter[i] = 0
                 num_new_infections += 1
 
-        # return updated agents array
-        return agents, num_new_infections
+        return num_new_infections
 
     def simulate_queues(self, ids: np.array, queue_name: str, queue_pos: np.array) -> int:
         """
@@ -339,7 +538,7 @@ class Camp:
 
         Parameters
         ----------
-        ids: Boolean array containing `True` at indices where agent will go to queue else `False`
+        ids: Ids of the agents who will go to the queue
         queue_name: Type of the queue. Possible values ["toilet", "food_line"]
         queue_pos: (x,y) co-ordinates of all the queues of type `queue_name`
 
@@ -349,102 +548,128 @@ class Camp:
 
         """
 
-        # Get the queue indices where each agents is going
-        queue = self.agents[ids, A_TOILET if queue_name == "toilet" else A_FOOD_LINE].astype(np.int32)
-        # Random order of queueing agents (useful specifically when two agents in `ids` have same queue)
-        q_order = list(range(ids.shape[0]))
-        random.shuffle(q_order)
+        if queue_name == "toilet":
+            Camp.enqueue(self.agents, self.toilet_queue, ids, self.agents.toilet, ACTIVITY_TOILET, queue_pos)
+            return Camp.queue_interactions(self.agents, self.toilet_queue, self.params.prob_spread_toilet)
+
+        Camp.enqueue(self.agents, self.food_line_queue, ids, self.agents.food_line, ACTIVITY_FOOD_LINE, queue_pos)
+        return Camp.queue_interactions(self.agents, self.food_line_queue, self.params.prob_spread_foodline)
+
+    def update_queues(self, pct_dequeue: float) -> None:
+        # at each step during the day, we clear some percentage of all agents in the queues
+        Camp.dequeue(self.agents, self.toilet_queue, pct_dequeue)
+        Camp.dequeue(self.agents, self.food_line_queue, pct_dequeue)
+
+    @staticmethod
+    @nb.njit
+    def enqueue(agents: AgentStore, queues: Queues, ids: np.array, queue_ids: np.array, activity: int,
+                queue_pos: np.array) -> None:
+        """
+        Add agents at the back of their queues.
+
+        Parameters
+        ----------
+        agents: The agents of the camp
+        queues: The queues to add the agents to
+        ids: Ids of the agents who will go to the queue. Agents who already have activity `activity` are skipped
+        queue_ids: Id of the queue of each agent of the camp (`agents.toilet` or `agents.food_line`)
+        activity: The activity of agents in the queues, ACTIVITY_TOILET or ACTIVITY_FOOD_LINE
+        queue_pos: (x,y) co-ordinates of all the queues
+
+        """
+
+        capacity = queues.members.shape[1]
 
-        for i in q_order:
-            q = queue[i]
+        # Random order of queueing agents (useful specifically when two agents in `ids` have same queue)
+        for k in np.random.permutation(ids.shape[0]):
+            i = ids[k]
             # add agent to queue if he/she is not already in the queue
-            if self.agents[ids[i], A_ACTIVITY] != ACTIVITY_TOILET and queue_name == "toilet":
-                self.toilet_queue[q].append(ids[i])  # add agent to queue
-                self.agents[ids[i], A_ACTIVITY_BEFORE_QUEUE] = self.agents[ids[i], A_ACTIVITY]  # save current activity
-                self.agents[ids[i], A_ACTIVITY] = ACTIVITY_TOILET  # update agent's activity
-                self.agents[ids[i], [A_X, A_Y]] = queue_pos[q, :]  # update agent's co-ordinates
-            elif self.agents[ids[i], A_ACTIVITY] != ACTIVITY_FOOD_LINE and queue_name == "food_line":
-                self.food_line_queue[q].append(ids[i])  # add agent to queue
-                self.agents[ids[i], A_ACTIVITY_BEFORE_QUEUE] = self.agents[ids[i], A_ACTIVITY]  # save current activity
-                self.agents[ids[i], A_ACTIVITY] = ACTIVITY_FOOD_LINE  # update agent's activity
-                self.agents[ids[i], [A_X, A_Y]] = queue_pos[q, :]  # update agent's co-ordinates
-
-        # Simulate infection spread
-
-        # Array to store the number of infected people interaction for each person
-        interactions = np.zeros((self.agents.shape[0],), dtype=np.int32)
-        # Probability values of infection spread
-        prob = None
+            if agents.activity[i] == activity:
+                continue
+            q = queue_ids[i]
+            queues.members[q, (queues.head[q] + queues.size[q]) % capacity] = i  # add agent to queue
+            queues.size[q] += 1
+            agents.activity_before_queue[i] = agents.activity[i]  # save current activity
+            agents.activity[i] = activity  # update agent's activity
+            agents.x[i] = queue_pos[q, 0]  # update agent's co-ordinates
+            agents.y[i] = queue_pos[q, 1]
 
-        if queue_name == "toilet":
-            for t in self.toilet_queue:  # for each toilet queue in the camp
-                t_ids = self.toilet_queue[t]  # get the list of agents in that queue
-                for i in range(len(t_ids)):
-                    # For each agent `t_ids[i]` in the queue, check if agent in front `i-1` and back `i+1` are
-                    # infectious. If they are, then add to the `interactions` array
-                    if i-1 >= 0:
-                        interactions[t_ids[i]] += (self.agents[t_ids[i-1], A_DISEASE]
-                                                   not in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED, INF_DECEASED))
-                    if i+1 <= len(t_ids)-1:
-                        interactions[t_ids[i]] += (self.agents[t_ids[i+1], A_DISEASE]
-                                                   not in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED, INF_DECEASED))
-            # find probability of infection spread per agent via queue interaction
-            prob = 1.0 - (1.0 - self.params.prob_spread_toilet) ** interactions
-
-        elif queue_name == "food_line":
-            for f in self.food_line_queue:  # for each food line queue in the camp
-                f_ids = self.food_line_queue[f]  # get the list of agents in that queue
-                for i in range(len(f_ids)):
-                    # For each agent `f_ids[i]` in the queue, check if agent in front `i-1` and back `i+1` are
-                    # infectious. If they are, then add to the `interactions` array
-                    if i-1 >= 0:
-                        interactions[f_ids[i]] += (self.agents[f_ids[i-1], A_DISEASE]
-                                                   not in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED, INF_DECEASED))
-                    if i+1 <= len(f_ids)-1:
-                        interactions[f_ids[i]] += (self.agents[f_ids[i+1], A_DISEASE]
-                                                   not in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED, INF_DECEASED))
-            # find probability of infection spread per agent via queue interaction
-            prob = 1.0 - (1.0 - self.params.prob_spread_foodline) ** interactions
-
-        newly_exposed_ids = (self.agents[:, A_DISEASE] == INF_SUSCEPTIBLE) * \
-                            (np.random.random((self.agents.shape[0],)) <= prob)
-        self.agents[newly_exposed_ids, A_DISEASE] = INF_EXPOSED
-        self.agents[newly_exposed_ids, A_DAY_COUNTER] = 0
-
-        return np.count_nonzero(newly_exposed_ids)
+    @staticmethod
+    @nb.njit
+    def queue_interactions(agents: AgentStore, queues: Queues, prob_spread: float) -> int:
+        """
+        Simulate infection spread in the queues. Each agent interacts with the agents in front and back of him/her.
 
-    def update_queues(self, pct_dequeue: float) -> None:
-        # remove agents from the front of the queues
-        for t in self.toilet_queue:
-            # at each step during the day, we clear some percentage of all agents in the queue
-            dequeue_count = int(np.ceil(pct_dequeue * len(self.toilet_queue[t])))
-            try:
-                # get first `dequeue_count` agents at front of the queue
-                front = self.toilet_queue[t][:dequeue_count]
-                # remove them from the queue
-                self.toilet_queue[t] = self.toilet_queue[t][dequeue_count:]
-                # change activity of the agents as the ones before they went into queue
-                self.agents[front, A_ACTIVITY] = self.agents[front, A_ACTIVITY_BEFORE_QUEUE]
-                self.agents[front, A_ACTIVITY_BEFORE_QUEUE] = -1
-            except IndexError:
-                pass
-        for f in self.food_line_queue:
-            # at each step of the day, we clear some percentage of all agents in the queue
-            dequeue_count = int(np.ceil(pct_dequeue * len(self.food_line_queue[f])))
-            try:
-                # get first `dequeue_count` agents at front of the queue
-                front = self.food_line_queue[f][:dequeue_count]
-                # remove them from the queue
-                self.food_line_queue[f] = self.food_line_queue[f][dequeue_count:]
-                # change activity of the agents as the ones before they went into queue
-                self.agents[front, A_ACTIVITY] = self.agents[front, A_ACTIVITY_BEFORE_QUEUE]
-                self.agents[front, A_ACTIVITY_BEFORE_QUEUE] = -1
-            except IndexError:
-                pass
+        Parameters
+        ----------
+        agents: The agents of the camp
+        queues: The queues of the agents
+        prob_spread: The probability of infection transmission if a susceptible and infectious agent interact in queue
+
+        Returns
+        -------
+        out: Number of new infections
+
+        """
+
+        capacity = queues.members.shape[1]
+        num_new_infections = 0
+
+        for q in range(queues.size.shape[0]):  # for each queue in the camp
+            size = queues.size[q]
+            for k in range(size):
+                i = queues.members[q, (queues.head[q] + k) % capacity]
+                # Agent i will be infected iff he/she is susceptible. Newly exposed agents are not infectious, so
+                # exposing agents along the queue does not change the interactions of the agents behind them
+                if agents.disease[i] != INF_SUSCEPTIBLE:
+                    continue
+
+                # Check if agent in front `k-1` and back `k+1` are infectious
+                interactions = 0
+                if k - 1 >= 0:
+                    j = queues.members[q, (queues.head[q] + k - 1) % capacity]
+                    interactions += agents.disease[j] not in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED,
+                                                              INF_DECEASED)
+                if k + 1 <= size - 1:
+                    j = queues.members[q, (queues.head[q] + k + 1) % capacity]
+                    interactions += agents.disease[j] not in (INF_SUSCEPTIBLE, INF_EXPOSED, INF_RECOVERED,
+                                                              INF_DECEASED)
+                if interactions == 0:
+                    continue
+
+                # probability of infection spread via queue interaction
+                p = 1.0 - (1.0 - prob_spread) ** interactions
+                if random.random() <= p:
+                    agents.disease[i] = INF_EXPOSED
+                    agents.day_counter[i] = 0
+                    num_new_infections += 1
+
+        return num_new_infections
+
+    @staticmethod
+    @nb.njit
+    def dequeue(agents: AgentStore, queues: Queues, pct_dequeue: float) -> None:
+        """
+        Remove `pct_dequeue` (rounded up) of the agents from the front of each queue. Agents are sent back to the
+        activity they were doing before they went to the queue.
+        """
+
+        capacity = queues.members.shape[1]
+
+        for q in range(queues.size.shape[0]):
+            dequeue_count = int(np.ceil(pct_dequeue * queues.size[q]))
+            for _ in range(dequeue_count):
+                # remove the agent at the front of the queue
+                i = queues.members[q, queues.head[q]]
+                queues.head[q] = (queues.head[q] + 1) % capacity
+                queues.size[q] -= 1
+                # change activity of the agent as the one before he/she went into queue
+                agents.activity[i] = agents.activity_before_queue[i]
+                agents.activity_before_queue[i] = -1
 
     @staticmethod
     @nb.njit
-    def disease_progression(agents: np.array, p_symp2mild: np.array, p_symp2sevr: np.array) -> np.array:
+    def disease_progression(agents: AgentStore, p_symp2mild: np.array, p_symp2sevr: np.array) -> np.array:
         """
         Update the disease state of the agent defined by `agents` numpy array. This is inspired partly by tucker model.
         This method is called at the end of each day.
@@ -460,7 +685,7 @@ class Camp:
 
         """
 
-        n = agents.shape[0]  # number of agents in the camp
+        n = agents.x.shape[0]  # number of agents in the camp
 
         # After 5 days showing symptoms, individuals pass from the symptomatic to the “mild” or “severe” states, with
         # age- and condition-dependent probabilities following Verity and colleagues (2020) and Tuite and colleagues
@@ -479,14 +704,14 @@ class Camp:
 
             # read current attributes of the agent
 
-            is_high_risk = int(agents[i, A_AGE] > 80)  # define which agents are considered as high risk
+            is_high_risk = int(agents.age[i] > 80)  # define which agents are considered as high risk
 
-            disease_state = int(agents[i, A_DISEASE])  # current disease state
-            activity = int(agents[i, A_ACTIVITY])  # current activity of the agent
-            day_count = int(agents[i, A_DAY_COUNTER])  # current disease state day count
-            is_asymptomatic = int(agents[i, A_IS_ASYMPTOMATIC])  # flag if agent is asymptomatic by nature
-            incubation_period = int(agents[i, A_INCUBATION_PERIOD])  # incubation period of the agent
-            age_slot = int(agents[i, A_AGE]/10.0)  # age slot of the agent
+            disease_state = int(agents.disease[i])  # current disease state
+            activity = int(agents.activity[i])  # current activity of the agent
+            day_count = int(agents.day_counter[i])  # current disease state day count
+            is_asymptomatic = int(agents.is_asymptomatic[i])  # flag if agent is asymptomatic by nature
+            incubation_period = int(agents.incubation_period[i])  # incubation period of the agent
+            age_slot = int(agents.age[i]/10.0)  # age slot of the agent
 
             # In the first half of this period, the individual is “exposed” but not infectious. In the second half, the
             # individual is “pre-symptomatic” and infectious
@@ -530,7 +755,7 @@ class Camp:
             # On each day, individuals in the mild or 2nd asymptomatic state pass to the recovered state with
             # probability 0.37 (Lui et al. 2020), and individuals in the severe state pass to the recovered state with
             # probability 0.071 (Cai et al., preprint).
-            elif (agents[i, A_DISEASE] == INF_MILD or disease_state == INF_ASYMPTOMATIC2) and random.random() <= 0.37:
+            elif (agents.disease[i] == INF_MILD or disease_state == INF_ASYMPTOMATIC2) and random.random() <= 0.37:
                 disease_state = INF_RECOVERED
                 day_count = 0
 
@@ -557,8 +782,8 @@ class Camp:
                 activity = ACTIVITY_HOUSEHOLD
 
             # Update array with updated values
-            agents[i, A_DISEASE] = disease_state
-            agents[i, A_ACTIVITY] = activity
-            agents[i, A_DAY_COUNTER] = day_count
+            agents.disease[i] = disease_state
+            agents.activity[i] = activity
+            agents.day_counter[i] = day_count
 
         return agents
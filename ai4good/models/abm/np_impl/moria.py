@@ -62,7 +62,7 @@ class Moria(Camp):
         # get households in the moria camp
         self.households: np.array = self._get_households()
         # initialize agents array
-        agents = np.empty((self.num_people, A_FEATURES))
+        agents = AgentStore.empty(self.num_people)
 
         agents[:, A_AGE] = self.params.age_and_gender[:, 0]
         agents[:, A_GENDER] = self.params.age_and_gender[:, 1]
@@ -76,7 +76,7 @@ class Moria(Camp):
 
         # get home ranges of each agent
         agents[:, A_HOME_RANGE] = np.array([
-            self.params.smaller_movement_radius * CAMP_SIZE if (agents[i, A_GENDER] == FEMALE or agents[i, A_AGE] < 10)
+            self.params.smaller_movement_radius * CAMP_SIZE if (agents.gender[i] == FEMALE or agents.age[i] < 10)
             else self.params.larger_movement_radius * CAMP_SIZE
             for i in range(self.num_people)
         ])
@@ -85,8 +85,12 @@ class Moria(Camp):
         agents[:, A_ETHNICITY] = self._assign_ethnicity_to_agents()
         # assign households to the agents
         agents_households: np.array = self._assign_households_to_agents(self.households, agents[:, A_ETHNICITY])
+        agents[:, A_HOUSEHOLD] = agents_households
         agents[:, [A_HOUSEHOLD_X, A_HOUSEHOLD_Y]] = self.households[agents_households, 2:]
         agents[:, [A_X, A_Y]] = agents[:, [A_HOUSEHOLD_X, A_HOUSEHOLD_Y]].copy()
+        # members of each household, for the household level kernels
+        self.household_offsets, self.household_members = OptimizedOps.household_index(agents_households,
+                                                                                       self.households.shape[0])
 
         # initially, everyone's inside their households
         agents[:, A_ACTIVITY] = ACTIVITY_HOUSEHOLD
@@ -107,7 +111,7 @@ class Moria(Camp):
         self._init_queue("toilet", self.params.toilets_blocks[0])
         self._init_queue("food_line", self.params.foodline_blocks[0])
 
-        logger.info("Shape of agents array: {}".format(agents.shape))
+        logger.info("Shape of agents array: {}, {} bytes".format(agents.shape, agents.nbytes))
 
         # Name of the file to store progress
         self.progress_file_name = "abm_moria_{}_{}.csv".format(
@@ -214,11 +218,10 @@ class Moria(Camp):
             # Perform activities for current time step of the day
 
             # 1. Simulate agents wandering in the camp
-            wanderer_ids = activities == ACTIVITY_WANDERING
-            self.agents[wanderer_ids, :], new_wd_inf = Camp.simulate_wander(self.agents[wanderer_ids, :], CAMP_SIZE,
-                                                                            self.params.relative_strength_of_interaction,
-                                                                            self.params.infection_radius * CAMP_SIZE,
-                                                                            self.params.prob_spread_wander)
+            wanderer_ids = np.flatnonzero(activities == ACTIVITY_WANDERING)
+            new_wd_inf = Camp.simulate_wander(self.agents, wanderer_ids, CAMP_SIZE,
+                                              self.params.relative_strength_of_interaction,
+                                              self.params.infection_radius * CAMP_SIZE, self.params.prob_spread_wander)
 
             # 2. Simulate agent's visit to toilet
             new_inf_t = self.simulate_queues(np.argwhere((activities == ACTIVITY_TOILET) & ~in_queue).reshape((-1,)),
@@ -230,15 +233,13 @@ class Moria(Camp):
 
             # 4. Simulate visit to respective household. Quarantined agents are quarantined inside their households, so
             # similar simulation for them too
-            hh_ids = activities == ACTIVITY_HOUSEHOLD
-            self.agents[hh_ids, :], new_hh_inf = Camp.simulate_households(self.agents[hh_ids, :],
-                                                                          self.params.prob_spread_house,
-                                                                          ACTIVITY_HOUSEHOLD)
+            hh_ids = np.flatnonzero(activities == ACTIVITY_HOUSEHOLD)
+            new_hh_inf = Camp.simulate_households(self.agents, hh_ids, self.params.prob_spread_house,
+                                                  ACTIVITY_HOUSEHOLD)
 
-            qt_ids = activities == ACTIVITY_QUARANTINED
-            self.agents[qt_ids, :], new_qt_inf = Camp.simulate_households(self.agents[qt_ids, :],
-                                                                          self.params.prob_spread_house,
-                                                                          ACTIVITY_QUARANTINED)
+            qt_ids = np.flatnonzero(activities == ACTIVITY_QUARANTINED)
+            new_qt_inf = Camp.simulate_households(self.agents, qt_ids, self.params.prob_spread_house,
+                                                  ACTIVITY_QUARANTINED)
 
             # 5. Update toilet and food line queues
             self.update_queues(self.params.percentage_of_toilet_queue_cleared_at_each_step)
@@ -256,10 +257,8 @@ class Moria(Camp):
         # Get activities for all agents at the end of the day. Current implementation sends all agents back to their
         # households at the end of the day.
         activities = Moria.get_activities(self.agents, 0.0, 0.0, force_activity=ACTIVITY_HOUSEHOLD)
-        hh_ids = activities == ACTIVITY_HOUSEHOLD
-        self.agents[hh_ids, :], new_hh_inf = Camp.simulate_households(self.agents[hh_ids, :],
-                                                                      self.params.prob_spread_house,
-                                                                      ACTIVITY_HOUSEHOLD)
+        hh_ids = np.flatnonzero(activities == ACTIVITY_HOUSEHOLD)
+        new_hh_inf = Camp.simulate_households(self.agents, hh_ids, self.params.prob_spread_house, ACTIVITY_HOUSEHOLD)
         new_infections[ACTIVITY_HOUSEHOLD] += new_hh_inf
 
         # Increment day
@@ -274,15 +273,17 @@ class Moria(Camp):
         # If P_detect value is present, then isolate/de-isolate agents
         if self.P_detect > SMALL_ERROR:
             # Camp managers can detect agents with symptoms with some probability and isolate them
-            self.agents = Moria.detect_and_isolate(self.agents, self.P_detect)
+            self.agents = Moria.detect_and_isolate(self.agents, self.P_detect, self.household_offsets,
+                                                   self.household_members)
             # If all agents of isolated household are not showing symptoms for some days, then send them back to camp
-            self.agents = Moria.check_and_de_isolate(self.agents, self.P_n)
+            self.agents = Moria.check_and_de_isolate(self.agents, self.P_n, self.household_offsets,
+                                                     self.household_members)
 
         return new_infections
 
     @staticmethod
     @nb.njit
-    def get_activities(agents: np.array, prob_food_line: float, prob_toilet: float,
+    def get_activities(agents: AgentStore, prob_food_line: float, prob_toilet: float,
                        force_activity: int = -1) -> np.array:
         """
         Return the activities all agents will do at any point in time.
@@ -305,22 +306,22 @@ class Moria(Camp):
 
         """
 
-        n = agents.shape[0]  # number of agents
+        n = agents.x.shape[0]  # number of agents
         out = np.zeros((n,), dtype=np.int32) - 1  # empty activities array
 
         # Iterate all agents
         for i in range(n):
 
-            if agents[i, A_DISEASE] == INF_DECEASED:
+            if agents.disease[i] == INF_DECEASED:
                 # Deceased agents are no longer processed
                 continue
 
             # Check if agent is showing symptoms
-            showing_symptoms = agents[i, A_DISEASE] in (INF_SYMPTOMATIC, INF_MILD, INF_SEVERE)
+            showing_symptoms = agents.disease[i] in (INF_SYMPTOMATIC, INF_MILD, INF_SEVERE)
 
             # If agent is quarantined or hospitalized, then don't do anything
-            if agents[i, A_ACTIVITY] == ACTIVITY_QUARANTINED or agents[i, A_ACTIVITY] == ACTIVITY_HOSPITALIZED:
-                out[i] = agents[i, A_ACTIVITY]
+            if agents.activity[i] == ACTIVITY_QUARANTINED or agents.activity[i] == ACTIVITY_HOSPITALIZED:
+                out[i] = agents.activity[i]
 
             # Check for force activity
             elif force_activity != -1:
@@ -328,10 +329,10 @@ class Moria(Camp):
 
             # Go to toilet with some probability
             # An agent already in the toilet will remain there till the `update_queues` method dequeues it
-            elif agents[i, A_ACTIVITY] == ACTIVITY_TOILET or random.random() <= prob_toilet:
+            elif agents.activity[i] == ACTIVITY_TOILET or random.random() <= prob_toilet:
                 out[i] = ACTIVITY_TOILET
             # Same logic in food line
-            elif agents[i, A_ACTIVITY] == ACTIVITY_FOOD_LINE or \
+            elif agents.activity[i] == ACTIVITY_FOOD_LINE or \
                     (not showing_symptoms and random.random() <= prob_food_line):
                 out[i] = ACTIVITY_FOOD_LINE
 
@@ -448,21 +449,24 @@ class Moria(Camp):
 
     @staticmethod
     @nb.njit
-    def detect_and_isolate(agents: np.array, prob_detect: float) -> np.array:
+    def detect_and_isolate(agents: AgentStore, prob_detect: float, household_offsets: np.array,
+                           household_members: np.array) -> np.array:
         # Check if agent needs to be quarantined.
         # An agent in the camp who is showing symptoms can be quarantined with some probability.
         # The detected agent will be removed along with its household.
+        # The members of household h are household_members[household_offsets[h]:household_offsets[h + 1]], see
+        # `OptimizedOps.household_index`
 
-        n = agents.shape[0]  # number of agents in the camp
+        n = agents.x.shape[0]  # number of agents in the camp
 
         for i in range(n):  # Iterate for each agent in the camp
 
             # If agent i is already quarantined, don't process
-            if agents[i, A_ACTIVITY] == ACTIVITY_QUARANTINED:
+            if agents.activity[i] == ACTIVITY_QUARANTINED:
                 continue
 
             # An agent who is showing infection symptoms can be detected by camp manager with some probability
-            i_detected = agents[i, A_DISEASE] in (INF_SYMPTOMATIC, INF_MILD, INF_SEVERE) and \
+            i_detected = agents.disease[i] in (INF_SYMPTOMATIC, INF_MILD, INF_SEVERE) and \
                          random.random() <= prob_detect
 
             # if agent is not detected, skip
@@ -470,29 +474,23 @@ class Moria(Camp):
                 continue
 
             # when agent i is detected by camp managers, isolate everyone in agent i's household
-            for j in range(n):
-
-                # Skip if agent j DOES NOT share household with agent i
-                # This is checked by calculating the distance between i's household and j's household, if the distance
-                # -> 0 then we say agent i and j share household
-                d = (agents[i, A_HOUSEHOLD_X] - agents[j, A_HOUSEHOLD_X]) ** 2 + \
-                    (agents[i, A_HOUSEHOLD_Y] - agents[j, A_HOUSEHOLD_Y]) ** 2
-                d = d ** 0.5
-                if d > SMALL_ERROR:
-                    continue
+            hh = int(agents.household[i])
+            for k in range(household_offsets[hh], household_offsets[hh + 1]):
+                j = household_members[k]
 
                 # Quarantine agent j who shares household with detected agent i
-                # Since agent i is also covered  in the j loop, no need to explicitly quarantine agent i
-                agents[j, A_ACTIVITY] = ACTIVITY_QUARANTINED
+                # Since agent i is also a member of the household, no need to explicitly quarantine agent i
+                agents.activity[j] = ACTIVITY_QUARANTINED
                 # When agent is quarantined, they will remain in their household
-                agents[j, A_X] = agents[j, A_HOUSEHOLD_X]
-                agents[j, A_Y] = agents[j, A_HOUSEHOLD_Y]
+                agents.x[j] = agents.household_x[j]
+                agents.y[j] = agents.household_y[j]
 
         return agents
 
     @staticmethod
     @nb.njit
-    def check_and_de_isolate(agents: np.array, p_n: int) -> np.array:
+    def check_and_de_isolate(agents: AgentStore, p_n: int, household_offsets: np.array,
+                             household_members: np.array) -> np.array:
         """
         Check agents who are in isolation and return them back to the camp if no agent in their household is showing
         any symptoms for the past n days.
@@ -500,39 +498,29 @@ class Moria(Camp):
             "We assume that individuals are returned to the camp 7 days after they have recovered, or if they do not
             become infected, 7 days after the last infected person in their household has recovered"
         In our implementation, this "7 days" is parameterized in `P_n` (class level) or n (function level).
+        The members of household h are household_members[household_offsets[h]:household_offsets[h + 1]], see
+        `OptimizedOps.household_index`.
         """
 
-        n = agents.shape[0]  # number of agents in the camp
+        n = agents.x.shape[0]  # number of agents in the camp
 
         for i in range(n):  # Iterate for each agent in the camp
 
             # If agent i is not quarantined, don't process
-            if agents[i, A_ACTIVITY] != ACTIVITY_QUARANTINED:
+            if agents.activity[i] != ACTIVITY_QUARANTINED:
                 continue
 
-            # Storing agents who are sharing household with agent i.
-            housemate_ids = []
-            # Number of agents who are sharing household with agent i and are not showing symptoms for the past n days
-            num_not_showing_sym = 0
-
             # For a quarantined agent i in the camp, check for his/her housemates (who would be also quarantined) and
             # check if they all can now go back to the camp or not.
-            for j in range(n):
-
-                # Skip if agent j DOES NOT share household with agent i
-                # This is checked by calculating the distance between i's household and j's household, if the distance
-                # -> 0 then we say agent i and j share household
-                d = (agents[i, A_HOUSEHOLD_X] - agents[j, A_HOUSEHOLD_X]) ** 2 + \
-                    (agents[i, A_HOUSEHOLD_Y] - agents[j, A_HOUSEHOLD_Y]) ** 2
-                d = d ** 0.5
-                if d > SMALL_ERROR:
-                    continue
-
-                housemate_ids.append(j)  # add agent j as housemate of agent i
+            hh = int(agents.household[i])
+            housemate_ids = household_members[household_offsets[hh]:household_offsets[hh + 1]]
 
+            # Number of agents who are sharing household with agent i and are not showing symptoms for the past n days
+            num_not_showing_sym = 0
+            for j in housemate_ids:
                 # Check if agent j (housemate of agent i) is not showing symptoms for the past `P_n` days
-                if agents[j, A_DISEASE] not in (INF_SYMPTOMATIC, INF_MILD, INF_SEVERE) \
-                        and agents[j, A_DAY_COUNTER] >= p_n:
+                if agents.disease[j] not in (INF_SYMPTOMATIC, INF_MILD, INF_SEVERE) \
+                        and agents.day_counter[j] >= p_n:
                     num_not_showing_sym += 1
 
             # Skip if all any housemate is not Ok to be back in the camp. All of them should be not showing symptoms
@@ -544,7 +532,8 @@ class Moria(Camp):
             # them back to camp.
             # Update their activity to household so they can do other activities (like wandering, going to toilet and
             # food line, etc.) in the camp
-            agents[np.array(housemate_ids), A_ACTIVITY] = ACTIVITY_HOUSEHOLD
+            for j in housemate_ids:
+                agents.activity[j] = ACTIVITY_HOUSEHOLD
 
         # return updated agents array
         return agents
@@ -561,116 +550,116 @@ class Moria(Camp):
 
     @staticmethod
     @nb.njit  # Not using parallel=True here due to https://github.com/numba/numba/issues/3681
-    def _get_progress_data(agents: np.array) -> list:
+    def _get_progress_data(agents: AgentStore) -> list:
 
-        n = agents.shape[0]  # number of agents
+        n = agents.x.shape[0]  # number of agents
         out = [0] * 91
 
         for i in range(n):
             o = 0
 
-            out[o] += (agents[i, A_DISEASE] == INF_SUSCEPTIBLE); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_EXPOSED); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_PRESYMPTOMATIC); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SYMPTOMATIC); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_MILD); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SEVERE); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC1); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC2); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_RECOVERED); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_DECEASED); o += 1
-
-            out[o] += (agents[i, A_ACTIVITY] == ACTIVITY_HOSPITALIZED); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_SUSCEPTIBLE and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SUSCEPTIBLE and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SUSCEPTIBLE and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SUSCEPTIBLE and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SUSCEPTIBLE and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SUSCEPTIBLE and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SUSCEPTIBLE and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SUSCEPTIBLE and 70 <= agents[i, A_AGE]); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_EXPOSED and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_EXPOSED and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_EXPOSED and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_EXPOSED and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_EXPOSED and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_EXPOSED and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_EXPOSED and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_EXPOSED and 70 <= agents[i, A_AGE]); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_PRESYMPTOMATIC and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_PRESYMPTOMATIC and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_PRESYMPTOMATIC and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_PRESYMPTOMATIC and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_PRESYMPTOMATIC and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_PRESYMPTOMATIC and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_PRESYMPTOMATIC and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_PRESYMPTOMATIC and 70 <= agents[i, A_AGE]); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_SYMPTOMATIC and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SYMPTOMATIC and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SYMPTOMATIC and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SYMPTOMATIC and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SYMPTOMATIC and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SYMPTOMATIC and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SYMPTOMATIC and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SYMPTOMATIC and 70 <= agents[i, A_AGE]); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_MILD and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_MILD and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_MILD and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_MILD and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_MILD and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_MILD and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_MILD and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_MILD and 70 <= agents[i, A_AGE]); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_SEVERE and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SEVERE and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SEVERE and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SEVERE and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SEVERE and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SEVERE and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SEVERE and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_SEVERE and 70 <= agents[i, A_AGE]); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC1 and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC1 and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC1 and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC1 and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC1 and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC1 and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC1 and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC1 and 70 <= agents[i, A_AGE]); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC2 and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC2 and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC2 and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC2 and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC2 and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC2 and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC2 and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_ASYMPTOMATIC2 and 70 <= agents[i, A_AGE]); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_RECOVERED and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_RECOVERED and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_RECOVERED and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_RECOVERED and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_RECOVERED and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_RECOVERED and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_RECOVERED and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_RECOVERED and 70 <= agents[i, A_AGE]); o += 1
-
-            out[o] += (agents[i, A_DISEASE] == INF_DECEASED and agents[i, A_AGE] < 10); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_DECEASED and 10 <= agents[i, A_AGE] < 20); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_DECEASED and 20 <= agents[i, A_AGE] < 30); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_DECEASED and 30 <= agents[i, A_AGE] < 40); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_DECEASED and 40 <= agents[i, A_AGE] < 50); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_DECEASED and 50 <= agents[i, A_AGE] < 60); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_DECEASED and 60 <= agents[i, A_AGE] < 70); o += 1
-            out[o] += (agents[i, A_DISEASE] == INF_DECEASED and 70 <= agents[i, A_AGE]); o += 1
+            out[o] += (agents.disease[i] == INF_SUSCEPTIBLE); o += 1
+            out[o] += (agents.disease[i] == INF_EXPOSED); o += 1
+            out[o] += (agents.disease[i] == INF_PRESYMPTOMATIC); o += 1
+            out[o] += (agents.disease[i] == INF_SYMPTOMATIC); o += 1
+            out[o] += (agents.disease[i] == INF_MILD); o += 1
+            out[o] += (agents.disease[i] == INF_SEVERE); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC1); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC2); o += 1
+            out[o] += (agents.disease[i] == INF_RECOVERED); o += 1
+            out[o] += (agents.disease[i] == INF_DECEASED); o += 1
+
+            out[o] += (agents.activity[i] == ACTIVITY_HOSPITALIZED); o += 1
+
+            out[o] += (agents.disease[i] == INF_SUSCEPTIBLE and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_SUSCEPTIBLE and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_SUSCEPTIBLE and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_SUSCEPTIBLE and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_SUSCEPTIBLE and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_SUSCEPTIBLE and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_SUSCEPTIBLE and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_SUSCEPTIBLE and 70 <= agents.age[i]); o += 1
+
+            out[o] += (agents.disease[i] == INF_EXPOSED and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_EXPOSED and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_EXPOSED and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_EXPOSED and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_EXPOSED and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_EXPOSED and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_EXPOSED and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_EXPOSED and 70 <= agents.age[i]); o += 1
+
+            out[o] += (agents.disease[i] == INF_PRESYMPTOMATIC and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_PRESYMPTOMATIC and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_PRESYMPTOMATIC and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_PRESYMPTOMATIC and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_PRESYMPTOMATIC and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_PRESYMPTOMATIC and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_PRESYMPTOMATIC and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_PRESYMPTOMATIC and 70 <= agents.age[i]); o += 1
+
+            out[o] += (agents.disease[i] == INF_SYMPTOMATIC and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_SYMPTOMATIC and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_SYMPTOMATIC and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_SYMPTOMATIC and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_SYMPTOMATIC and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_SYMPTOMATIC and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_SYMPTOMATIC and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_SYMPTOMATIC and 70 <= agents.age[i]); o += 1
+
+            out[o] += (agents.disease[i] == INF_MILD and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_MILD and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_MILD and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_MILD and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_MILD and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_MILD and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_MILD and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_MILD and 70 <= agents.age[i]); o += 1
+
+            out[o] += (agents.disease[i] == INF_SEVERE and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_SEVERE and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_SEVERE and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_SEVERE and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_SEVERE and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_SEVERE and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_SEVERE and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_SEVERE and 70 <= agents.age[i]); o += 1
+
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC1 and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC1 and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC1 and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC1 and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC1 and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC1 and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC1 and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC1 and 70 <= agents.age[i]); o += 1
+
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC2 and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC2 and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC2 and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC2 and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC2 and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC2 and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC2 and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_ASYMPTOMATIC2 and 70 <= agents.age[i]); o += 1
+
+            out[o] += (agents.disease[i] == INF_RECOVERED and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_RECOVERED and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_RECOVERED and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_RECOVERED and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_RECOVERED and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_RECOVERED and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_RECOVERED and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_RECOVERED and 70 <= agents.age[i]); o += 1
+
+            out[o] += (agents.disease[i] == INF_DECEASED and agents.age[i] < 10); o += 1
+            out[o] += (agents.disease[i] == INF_DECEASED and 10 <= agents.age[i] < 20); o += 1
+            out[o] += (agents.disease[i] == INF_DECEASED and 20 <= agents.age[i] < 30); o += 1
+            out[o] += (agents.disease[i] == INF_DECEASED and 30 <= agents.age[i] < 40); o += 1
+            out[o] += (agents.disease[i] == INF_DECEASED and 40 <= agents.age[i] < 50); o += 1
+            out[o] += (agents.disease[i] == INF_DECEASED and 50 <= agents.age[i] < 60); o += 1
+            out[o] += (agents.disease[i] == INF_DECEASED and 60 <= agents.age[i] < 70); o += 1
+            out[o] += (agents.disease[i] == INF_DECEASED and 70 <= agents.age[i]); o += 1
 
         return out
 
@@ -909,9 +898,10 @@ class Moria(Camp):
         Initialize a queue (toilet or food line).
         Steps for initialization:
             1. Uniformly position queues throughout the camp
-            2. Mark all queues as empty in the beginning i.e. no person is standing/waiting in the line
-            3. Find the queue nearest to each agent's household and assign it to him/her. The agent will always use
+            2. Find the queue nearest to each agent's household and assign it to him/her. The agent will always use
                 the assigned queue.
+            3. Mark all queues as empty in the beginning i.e. no person is standing/waiting in the line. Each queue has
+                room for all the agents assigned to it.
 
         Parameters
         ----------
@@ -924,26 +914,27 @@ class Moria(Camp):
             # add toilets to the camp
             self.toilets: np.array = OptimizedOps.position_blocks(grid_size, CAMP_SIZE)
 
-            # initialize queues of each toilet in the camp
-            for i in range(grid_size*grid_size):
-                self.toilet_queue[i] = []
-
             # assign each agent with the toilet nearest to his/her household
             for i in range(self.num_people):
                 # toilet nearest to agent's household
                 t_id, _ = OptimizedOps.find_nearest(self.agents[i, [A_HOUSEHOLD_X, A_HOUSEHOLD_Y]], self.toilets)
                 self.agents[i, A_TOILET] = t_id
 
+            # initialize queues of each toilet in the camp
+            num_toilets = grid_size * grid_size
+            self.toilet_queue = Queues.empty(num_toilets, np.bincount(self.agents.toilet, minlength=num_toilets).max())
+
         if queue_name == "food_line":
             # add food lines to the camp
             self.food_lines: np.array = OptimizedOps.position_blocks(grid_size, CAMP_SIZE)
 
-            # initialize queues of each food line in the camp
-            for i in range(grid_size * grid_size):
-                self.food_line_queue[i] = []
-
             # assign each agent with the food line nearest to his/her household
             for i in range(self.num_people):
                 # food line nearest to agent's household
                 f_id, _ = OptimizedOps.find_nearest(self.agents[i, [A_HOUSEHOLD_X, A_HOUSEHOLD_Y]], self.food_lines)
                 self.agents[i, A_FOOD_LINE] = f_id
+
+            # initialize queues of each food line in the camp
+            num_food_lines = grid_size * grid_size
+            self.food_line_queue = Queues.empty(num_food_lines,
+                                                np.bincount(self.agents.food_line, minlength=num_food_lines).max())
@@ -2,12 +2,11 @@
 This file sets up the parameters for ABM models used in the cov_functions_AI.py
 """
 
-import json
-import hashlib
 import numpy as np
 import pandas as pd
 
 from ai4good.params.param_store import ParamStore
+from ai4good.utils.fingerprint import fingerprint
 from ai4good.utils.path_utils import get_am_aug_pop
 from ai4good.utils.logger_util import get_logger
 
@@ -150,12 +149,12 @@ class Parameters(object):
         self.validate()
 
     def sha1_hash(self) -> str:
-        hash_params = [
+        return fingerprint(
             self.camp,
-            self.model_params.to_dict('records'),
+            self.model_params,
             self.number_of_steps,
-            self.prob_symp2sevr.tolist(),
-            self.prob_symp2mild.tolist(),
+            self.prob_symp2sevr,
+            self.prob_symp2mild,
             self.permanently_asymptomatic_cases,
             self.relative_strength_of_interaction,
             self.smaller_movement_radius,
@@ -167,11 +166,7 @@ class Parameters(object):
             self.lockdown_home_range,
             self.prob_spread_wander,
             self.prob_spread_house,
-        ]
-        serialized_params = json.dumps(hash_params, sort_keys=True)
-        hash_object = hashlib.sha1(serialized_params.encode('UTF-8'))
-        _hash = hash_object.hexdigest()
-        return _hash
+        )
 
     def read_age_gender(self, num_ppl):
         # Data frame. V1 = age, V2 is sex (1 = male?, 0  = female?).
@@ -92,6 +92,109 @@ class OpTester(unittest.TestCase):
         out = OptimizedOps.is_infected(inp)
         self.assertTrue(np.all(out == exp))
 
+    def test_cell_list(self):
+        logger.info("Running test: test_cell_list")
+
+        positions = np.array([[0.5, 0.5], [2.5, 0.1], [0.2, 0.9], [3.0, 3.0], [9.0, 0.0]])
+        offsets, members = cell_list(positions, 1.0, 3)
+        # each entity is in the cell of its co-ordinates, those beyond the grid in its last row/column
+        cells = [members[offsets[c]:offsets[c + 1]].tolist() for c in range(9)]
+        self.assertTrue(cells == [[0, 2], [], [], [], [], [], [1, 4], [], [3]])
+
+    def test_agent_store(self):
+        logger.info("Running test: test_agent_store")
+
+        matrix = np.zeros((5, A_FEATURES))
+        matrix[:, A_X] = [0.5, 1.5, 2.5, 3.5, 4.5]
+        matrix[:, A_DISEASE] = [INF_SUSCEPTIBLE, INF_EXPOSED, INF_MILD, INF_RECOVERED, INF_DECEASED]
+        matrix[:, A_ACTIVITY_BEFORE_QUEUE] = -1
+        matrix[:, A_HOUSEHOLD] = [3, 3, 0, 1, 2]
+        agents = AgentStore.from_matrix(matrix)
+
+        # Features are read and written like the columns of the matrix
+        self.assertTrue(np.all(agents.to_matrix() == matrix))
+        self.assertTrue(agents.shape == (5, A_FEATURES))
+        self.assertTrue(agents.nbytes * 3 < matrix.nbytes)
+        self.assertTrue(agents.disease.dtype == np.int8 and agents.x.dtype == np.float32)
+        self.assertTrue(agents[[1, 2], A_DISEASE].tolist() == [INF_EXPOSED, INF_MILD])
+        self.assertTrue(agents[2, [A_X, A_HOUSEHOLD]].tolist() == [2.5, 0.0])
+        agents[[0, 1], [A_X, A_Y]] = [[7.0, 8.0], [9.0, 10.0]]
+        agents[4, A_ACTIVITY] = ACTIVITY_HOSPITALIZED
+        self.assertTrue(agents.x[:2].tolist() == [7.0, 9.0] and agents.y[:2].tolist() == [8.0, 10.0])
+        self.assertTrue(agents.activity[4] == ACTIVITY_HOSPITALIZED)
+
+        # Selecting agents gives a store of their copy, which can be written back
+        subset = agents[[3, 4], :]
+        subset[:, A_HOUSEHOLD] = 9
+        self.assertTrue(agents.household[3:].tolist() == [1, 2])
+        agents[[3, 4]] = subset
+        self.assertTrue(agents.household[3:].tolist() == [9, 9])
+        with self.assertRaises(IndexError):
+            _ = agents[:, 2:5]
+
+    def test_queues(self):
+        logger.info("Running test: test_queues")
+
+        agents = AgentStore.empty(6)
+        agents.toilet[:] = [0, 0, 0, 1, 1, 0]
+        agents.disease[1] = INF_SYMPTOMATIC
+        agents.activity[:] = ACTIVITY_WANDERING
+        queues = Queues.empty(2, 4)
+        queue_pos = np.array([[10.0, 20.0], [30.0, 40.0]])
+
+        # Agents join their queues in random order, agents already in a queue are not added again
+        Camp.enqueue(agents, queues, np.array([0, 1, 2]), agents.toilet, ACTIVITY_TOILET, queue_pos)
+        Camp.enqueue(agents, queues, np.array([0, 3]), agents.toilet, ACTIVITY_TOILET, queue_pos)
+        order = queues.agents(0).tolist()
+        self.assertTrue(sorted(order) == [0, 1, 2] and queues.agents(1).tolist() == [3])
+        self.assertTrue(np.all(agents.activity[:4] == ACTIVITY_TOILET))
+        self.assertTrue(np.all(agents.activity_before_queue[:4] == ACTIVITY_WANDERING))
+        self.assertTrue(agents[3, [A_X, A_Y]].tolist() == [30.0, 40.0])
+
+        # With certain spread, the neighbours of the infectious agent in the queue are infected
+        position = order.index(1)
+        neighbours = order[max(position - 1, 0):position] + order[position + 1:position + 2]
+        self.assertTrue(Camp.queue_interactions(agents, queues, 1.0) == len(neighbours))
+        self.assertTrue(np.flatnonzero(agents.disease == INF_EXPOSED).tolist() == sorted(neighbours))
+
+        # Agents leave from the front of the queue and go back to their previous activity
+        Camp.dequeue(agents, queues, 0.5)
+        self.assertTrue(queues.agents(0).tolist() == order[2:] and queues.size[1] == 0)
+        self.assertTrue(np.all(agents.activity[order[:2]] == ACTIVITY_WANDERING))
+        self.assertTrue(np.all(agents.activity_before_queue[order[:2]] == -1))
+
+        # The queue continues at the start of its buffer after reaching the end
+        Camp.enqueue(agents, queues, np.array([5]), agents.toilet, ACTIVITY_TOILET, queue_pos)
+        Camp.enqueue(agents, queues, np.array([order[0]]), agents.toilet, ACTIVITY_TOILET, queue_pos)
+        self.assertTrue(queues.agents(0).tolist() == [order[2], 5, order[0]])
+        self.assertTrue(queues.members[0, 0] == order[0])
+
+    def test_wander_interactions(self):
+        logger.info("Running test: test_wander_interactions")
+
+        rng = np.random.default_rng(0)
+        n = 2000
+        agents = AgentStore.empty(n)
+        agents[:, [A_HOUSEHOLD_X, A_HOUSEHOLD_Y]] = rng.random((n, 2)) * CAMP_SIZE
+        agents[:, A_ETHNICITY] = rng.integers(0, 8, n)
+        agents[:, A_DISEASE] = np.where(rng.random(n) < 0.1, INF_SYMPTOMATIC, INF_SUSCEPTIBLE)
+        pos = agents[:, [A_HOUSEHOLD_X, A_HOUSEHOLD_Y]]  # no home range, so agents wander onto their households
+        dij = np.sqrt(((pos[:, None] - pos[None]) ** 2).sum(axis=-1))
+        wandering = rng.random(n) < 0.5  # the others stay where they are and cannot interact
+        wanderer_ids = np.flatnonzero(wandering)
+
+        for g in [0.2, 1.0, 2.0]:
+            # with certain spread every susceptible wanderer interacting with an infectious one is infected
+            gij = np.where(agents.ethnicity[:, None] == agents.ethnicity[None, :], 1.0, g)
+            interacting = (dij / gij <= 1.5) & (agents.disease[None, :] == INF_SYMPTOMATIC) & wandering[None, :]
+            expected = interacting.any(axis=1) & (agents[:, A_DISEASE] == INF_SUSCEPTIBLE) & wandering
+
+            out = agents.copy()
+            num_new_inf = Camp.simulate_wander(out, wanderer_ids, CAMP_SIZE, g, 1.5, 1.0)
+            self.assertTrue(num_new_inf == expected.sum())
+            self.assertTrue(np.all((out[:, A_DISEASE] == INF_EXPOSED) == expected))
+            self.assertTrue(np.all((out[:, A_ACTIVITY] == ACTIVITY_WANDERING) == wandering))
+
 
 class CampTester(unittest.TestCase):
 
@@ -132,17 +235,20 @@ class CampTester(unittest.TestCase):
         n = self.camp.agents.shape[0]  # number of agents in the camp
         n_wander = 100  # number of agents to wander
         assert n >= n_wander
-        to_wander = self.camp.agents[random.sample(range(n), n_wander)]  # send agents wandering
+        wander_ids = np.array(random.sample(range(n), n_wander))  # send agents wandering
+        others = np.setdiff1d(np.arange(n), wander_ids)
+        before = self.camp.agents.copy()
 
         # Values before execution
-        pre_total_susc = np.count_nonzero(to_wander[:, A_DISEASE] == INF_SUSCEPTIBLE)
-        pre_total_exps = np.count_nonzero(to_wander[:, A_DISEASE] == INF_EXPOSED)
+        pre_total_susc = np.count_nonzero(self.camp.agents[wander_ids, A_DISEASE] == INF_SUSCEPTIBLE)
+        pre_total_exps = np.count_nonzero(self.camp.agents[wander_ids, A_DISEASE] == INF_EXPOSED)
 
         # Perform simulation
-        to_wander, num_new_inf = Moria.simulate_wander(to_wander, CAMP_SIZE,
-                                                       self.camp.params.relative_strength_of_interaction,
-                                                       self.camp.params.infection_radius * CAMP_SIZE,
-                                                       self.camp.params.prob_spread_wander)
+        num_new_inf = Moria.simulate_wander(self.camp.agents, wander_ids, CAMP_SIZE,
+                                            self.camp.params.relative_strength_of_interaction,
+                                            self.camp.params.infection_radius * CAMP_SIZE,
+                                            self.camp.params.prob_spread_wander)
+        to_wander = self.camp.agents[wander_ids]
 
         # Values after execution
         post_total_susc = np.count_nonzero(to_wander[:, A_DISEASE] == INF_SUSCEPTIBLE)
@@ -151,8 +257,8 @@ class CampTester(unittest.TestCase):
         # Test: Basic tests
         # Number of new infections must have bounds
         self.assertTrue(0 <= num_new_inf <= n_wander)
-        # Number of agents returned must match number of input agents
-        self.assertTrue(to_wander.shape[0] == n_wander)
+        # Agents who are not wandering must not change
+        self.assertTrue(np.all(self.camp.agents[others].to_matrix() == before[others].to_matrix()))
         # Simulate function could only do transmission of susceptible->exposed
         self.assertTrue(pre_total_susc == (post_total_susc + num_new_inf))
         # Number of exposed agents should not decrease
@@ -169,15 +275,18 @@ class CampTester(unittest.TestCase):
         n = self.camp.agents.shape[0]  # number of agents in the camp
         n_house = 100  # number of agents to send to household
         assert n >= n_house
-        to_house = self.camp.agents[random.sample(range(n), n_house)]  # send agents to households
+        house_ids = np.array(random.sample(range(n), n_house))  # send agents to households
+        others = np.setdiff1d(np.arange(n), house_ids)
+        before = self.camp.agents.copy()
 
         # Values before execution
-        pre_total_susc = np.count_nonzero(to_house[:, A_DISEASE] == INF_SUSCEPTIBLE)
-        pre_total_exps = np.count_nonzero(to_house[:, A_DISEASE] == INF_EXPOSED)
+        pre_total_susc = np.count_nonzero(self.camp.agents[house_ids, A_DISEASE] == INF_SUSCEPTIBLE)
+        pre_total_exps = np.count_nonzero(self.camp.agents[house_ids, A_DISEASE] == INF_EXPOSED)
 
         # Perform simulation
-        to_house, num_new_inf = Moria.simulate_households(to_house, self.camp.params.prob_spread_house,
-                                                          ACTIVITY_HOUSEHOLD)
+        num_new_inf = Moria.simulate_households(self.camp.agents, house_ids, self.camp.params.prob_spread_house,
+                                                ACTIVITY_HOUSEHOLD)
+        to_house = self.camp.agents[house_ids]
 
         # Values after execution
         post_total_susc = np.count_nonzero(to_house[:, A_DISEASE] == INF_SUSCEPTIBLE)
@@ -186,8 +295,8 @@ class CampTester(unittest.TestCase):
         # Test: Basic tests
         # Number of new infections must have bounds
         self.assertTrue(0 <= num_new_inf <= n_house)
-        # Number of agents returned must match number of input agents
-        self.assertTrue(to_house.shape[0] == n_house)
+        # Agents who are not going to their households must not change
+        self.assertTrue(np.all(self.camp.agents[others].to_matrix() == before[others].to_matrix()))
         # Simulate function could only do transmission of susceptible->exposed
         self.assertTrue(pre_total_susc == (post_total_susc + num_new_inf))
         # Number of exposed agents should not decrease
@@ -213,7 +322,8 @@ class CampTester(unittest.TestCase):
             _ = self.camp.simulate_queues(to_toilet_ids, "toilet", self.camp.toilets)
 
             t_queues = self.camp.agents[to_toilet_ids, A_TOILET].astype(np.int32)  # Id of the queue of each agent
-            t_queues_pos = self.camp.toilets[t_queues, :]  # Co-ordinates of the queue in the camp for each agent
+            # Co-ordinates of the queue in the camp for each agent, in the precision of the agent co-ordinates
+            t_queues_pos = self.camp.toilets[t_queues, :].astype(np.float32)
 
             # Run tests: `to_toilet_ids` agents should be sent to toilet queue
             self.assertTrue(np.all(self.camp.agents[to_toilet_ids, A_ACTIVITY] == ACTIVITY_TOILET),
@@ -228,3 +338,38 @@ class CampTester(unittest.TestCase):
             # Run test: no one should be still in queue
             num_in_toilet_queue = np.count_nonzero(self.camp.agents[:, A_ACTIVITY] == ACTIVITY_TOILET)
             self.assertTrue(num_in_toilet_queue == 0, "After dequeue everyone, still people's position shows in queue")
+
+    def test_household_index(self):
+        logger.info("Running test: test_household_index")
+        offsets, members = self.camp.household_offsets, self.camp.household_members
+
+        # Every agent is a member of exactly one household
+        self.assertTrue(offsets[-1] == self.camp.agents.shape[0])
+        self.assertTrue(np.all(np.sort(members) == np.arange(self.camp.agents.shape[0])))
+        for hh in range(self.camp.households.shape[0]):
+            hh_members = members[offsets[hh]:offsets[hh + 1]]
+            self.assertTrue(np.all(self.camp.agents[hh_members, A_HOUSEHOLD] == hh))
+            self.assertTrue(np.all(self.camp.agents[hh_members][:, [A_HOUSEHOLD_X, A_HOUSEHOLD_Y]] ==
+                                   self.camp.households[hh, 2:].astype(np.float32)))
+
+    def test_isolation(self):
+        logger.info("Running test: test_isolation")
+        agents = self.camp.agents.copy()
+        agents[:, A_ACTIVITY] = ACTIVITY_HOUSEHOLD
+        agents[:, A_DISEASE] = INF_SUSCEPTIBLE
+        symptomatic = random.sample(range(agents.shape[0]), 10)
+        agents[symptomatic, A_DISEASE] = INF_MILD
+
+        # Detecting everyone with symptoms quarantines exactly their households
+        agents = Moria.detect_and_isolate(agents, 1.0, self.camp.household_offsets, self.camp.household_members)
+        quarantined = agents[:, A_ACTIVITY] == ACTIVITY_QUARANTINED
+        self.assertTrue(np.all(quarantined == np.isin(agents[:, A_HOUSEHOLD], agents[symptomatic, A_HOUSEHOLD])))
+
+        # Households stay isolated while a member shows symptoms
+        agents[:, A_DAY_COUNTER] = 0
+        agents = Moria.check_and_de_isolate(agents, 0, self.camp.household_offsets, self.camp.household_members)
+        self.assertTrue(np.all((agents[:, A_ACTIVITY] == ACTIVITY_QUARANTINED) == quarantined))
+
+        agents[symptomatic, A_DISEASE] = INF_RECOVERED
+        agents = Moria.check_and_de_isolate(agents, 0, self.camp.household_offsets, self.camp.household_members)
+        self.assertTrue(np.all(agents[:, A_ACTIVITY] == ACTIVITY_HOUSEHOLD))
@@ -0,0 +1,59 @@
+from typing import Callable
+
+import numpy as np
+
+from ai4good.models.cm.initialise_parameters import Parameters
+from ai4good.utils.logger_util import get_logger
+
+logger = get_logger(__name__)
+
+# peak symptomatic, peak critical and total deaths, the outputs the report IQR bands are read from
+KEY_OUTPUTS = [('I', 'peak'), ('C', 'peak'), ('D', 'last')]
+
+
+def key_outputs(sols_raw: dict, params: Parameters) -> np.ndarray:
+    """
+    The KEY_OUTPUTS of every member of sols_raw in numbers of people, as a (member, output) array.
+    """
+    outputs = np.empty((len(sols_raw), len(KEY_OUTPUTS)))
+    for ii, sol in enumerate(sols_raw.values()):
+        for jj, (category, reduction) in enumerate(KEY_OUTPUTS):
+            values = sol['y_plot'][params.categories[category]['index']]
+            outputs[ii, jj] = values.max() if reduction == 'peak' else values[-1]
+    return outputs * params.population
+
+
+def quartiles_converged(previous: np.ndarray, current: np.ndarray, tolerance: float) -> bool:
+    # relative change of every quartile, with one person as the smallest scale so outputs near 0 can settle
+    return bool(np.all(np.abs(current - previous) <= tolerance * np.maximum(np.abs(current), 1)))
+
+
+def run_until_converged(run_batch: Callable, params: Parameters, max_iterations: int):
+    """
+    Runs the ensemble in batches of control_dict['adaptive_batch_size'] members, run_batch(first, n) simulating
+    members first to first + n - 1 and returning (sols_raw, config_dict) like simulate_over_parameter_range_parallel.
+    After each batch the running 25% and 75% quantiles of the key outputs are compared with the ones of the previous
+    batch, and the ensemble stops once none moved by more than control_dict['adaptive_tolerance'] (relative), or
+    after max_iterations members. Returns the merged (sols_raw, config_dict).
+    """
+    tolerance = params.control_dict['adaptive_tolerance']
+    batch_size = params.control_dict['adaptive_batch_size']
+    sols_raw, config_dict, outputs = {}, [], []
+    previous = None
+    first = 0
+    while first < max_iterations:
+        n = min(batch_size, max_iterations - first)
+        batch_sols, batch_config = run_batch(first, n)
+        sols_raw.update(batch_sols)
+        config_dict = None if batch_config is None else config_dict + batch_config
+        outputs.append(key_outputs(batch_sols, params))
+        first += n
+
+        current = np.quantile(np.concatenate(outputs), [.25, .75], axis=0)
+        if previous is not None and quartiles_converged(previous, current, tolerance):
+            logger.info(f"Key output quartiles converged after {first} of {max_iterations} members")
+            break
+        previous = current
+    else:
+        logger.info(f"Key output quartiles not converged within {max_iterations} members")
+    return sols_raw, config_dict
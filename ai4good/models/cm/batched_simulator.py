@@ -0,0 +1,249 @@
+import numpy as np
+import pandas as pd
+from scipy.integrate import ode
+
+from ai4good.models.cm import kernels
+from ai4good.models.cm.initialise_parameters import Parameters
+from ai4good.models.cm.simulator import Simulator, control_timeline, integrate_segments
+from ai4good.models.cm.trajectory_store import control_segments, trajectory_store
+from ai4good.utils.dask_utils import compute_members
+from ai4good.utils.fingerprint import fingerprint
+from ai4good.utils.logger_util import get_logger
+
+logger = get_logger(__name__)
+
+
+def ensemble_rates(generated_disease_vectors: pd.DataFrame, n_members: int, largest_eigenvalue) -> dict:
+    """
+    Per member disease rates for the first `n_members` rows of the generated disease vectors, computed the same way
+    as in Simulator.simulate_over_parameter_range_parallel
+    """
+    vectors = generated_disease_vectors.iloc[:n_members]
+    removal_rate = 1 / vectors.RemovalPeriod.to_numpy()
+    return {
+        'R0': vectors.R0.to_numpy(),
+        'beta': removal_rate * vectors.R0.to_numpy() / largest_eigenvalue,
+        'latentRate': 1 / vectors.LatentPeriod.to_numpy(),
+        'removalRate': removal_rate,
+        'hospRate': 1 / vectors.HospPeriod.to_numpy(),
+        'deathRateICU': 1 / vectors.DeathICUPeriod.to_numpy(),
+        'deathRateNoIcu': 1 / vectors.DeathNoICUPeriod.to_numpy(),
+    }
+
+
+class BatchedSimulator:
+    """
+    Integrates all ensemble members of the compartmental model as one system. The state is held as a
+    (iterations, ages, compartments) tensor and one right hand side evaluation advances every member, so the solver
+    is set up once per run instead of once per member. Results are returned in the same format as Simulator.
+    """
+
+    def __init__(self, params: Parameters):
+        self.params = params
+        population_frame = params.population_frame
+        self.age_categories = int(population_frame.shape[0])
+        self.symptomatic_prob = np.asarray(population_frame.p_symptomatic)
+        self.hospital_prob = np.asarray(population_frame.p_hosp_given_symptomatic)
+        self.critical_prob = np.asarray(population_frame.p_critical_given_hospitalised)
+
+        categories = params.categories
+        self.index_S = categories['S']['index']
+        self.index_E = categories['E']['index']
+        self.index_I = categories['I']['index']
+        self.index_A = categories['A']['index']
+        self.index_R = categories['R']['index']
+        self.index_H = categories['H']['index']
+        self.index_C = categories['C']['index']
+        self.index_D = categories['D']['index']
+        self.index_O = categories['O']['index']
+        self.index_Q = categories['Q']['index']
+        self.index_U = categories['U']['index']
+
+    def initial_state(self) -> np.array:
+        # same initial conditions as Simulator.run_model: one symptomatic and one asymptomatic case in the camp
+        seirvars = np.zeros(self.params.number_compartments)
+        seirvars[self.index_I] = 1 / self.params.population
+        seirvars[self.index_A] = 1 / self.params.population
+        seirvars[self.index_S] = 1 - seirvars.sum()
+        population_vector = self.params.population_frame.Population_structure.to_numpy()
+        return np.outer(population_vector / 100, seirvars)  # (ages, compartments)
+
+    def ode_system3d(self, t, y, flags, beta, latent_rate, removal_rate, hosp_rate, death_rate_icu, death_rate_no_icu):
+        """
+        Vectorized version of Simulator.ode_system2d. Rates are (iterations, 1) columns so they broadcast over ages,
+        flags are the controls in place (see kernels.control_flags).
+        """
+        params = self.params
+        control_dict = params.control_dict
+        remove_high_risk = control_dict['remove_high_risk']
+        icu_capacity = control_dict['ICU_capacity']['value']
+        control_factor, remove_symptomatic_rate, remove_high_risk_rate = flags
+
+        y3d = y.reshape(-1, self.age_categories, params.number_compartments)
+        dydt3d = np.zeros(y3d.shape)
+
+        S_vec = y3d[:, :, self.index_S]
+        I_vec = y3d[:, :, self.index_I]
+        A_vec = y3d[:, :, self.index_A]
+        H_vec = y3d[:, :, self.index_H]
+        C_vec = y3d[:, :, self.index_C]
+
+        E_latent = latent_rate * y3d[:, :, self.index_E]
+        I_removed = removal_rate * I_vec
+        A_removed = removal_rate * A_vec
+        Q_quarantined = params.quarant_rate * y3d[:, :, self.index_Q]
+
+        total_I = I_vec.sum(axis=1, keepdims=True)
+        total_H = H_vec.sum(axis=1, keepdims=True)
+
+        # removing symptomatic individuals, can't take more off site than there are
+        quarantine_sicks = (np.minimum(total_I, remove_symptomatic_rate) / total_I) * I_vec
+
+        # removing susceptible high risk individuals
+        first_high_risk_category_n = self.age_categories - remove_high_risk['n_categories_removed']
+        S_removal = S_vec[:, first_high_risk_category_n:].sum(axis=1, keepdims=True)
+        high_risk_people_removal_rates = np.zeros(S_vec.shape)
+        high_risk_people_removal_rates[:, first_high_risk_category_n:] = np.minimum(remove_high_risk_rate, S_removal)
+
+        # ICU beds allocated on a first come, first served basis based on the numbers in hospital
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hospitalized_on_icu = np.where(total_H > 0, icu_capacity / total_H * H_vec, icu_capacity)
+
+        infection_total = np.dot(I_vec, params.infection_matrix.T) + \
+            params.AsymptInfectiousFactor * np.dot(A_vec, params.infection_matrix.T)
+        new_infections = control_factor * beta * S_vec * infection_total
+        offsite = high_risk_people_removal_rates / S_removal * S_vec
+
+        deaths_on_icu = death_rate_icu * C_vec
+        needing_care = hosp_rate * self.critical_prob * H_vec
+        icu_cared = np.minimum(needing_care, hospitalized_on_icu - (C_vec - deaths_on_icu))
+        deaths_without_icu = death_rate_no_icu * y3d[:, :, self.index_U]
+
+        dydt3d[:, :, self.index_S] = - new_infections - offsite
+        dydt3d[:, :, self.index_E] = new_infections - E_latent
+        dydt3d[:, :, self.index_I] = (1 - self.symptomatic_prob) * E_latent - I_removed - quarantine_sicks
+        dydt3d[:, :, self.index_A] = self.symptomatic_prob * E_latent - A_removed
+        dydt3d[:, :, self.index_H] = (self.hospital_prob * I_removed - hosp_rate * H_vec
+                                      + death_rate_icu * (1 - params.death_prob_with_ICU) *
+                                      np.minimum(C_vec, hospitalized_on_icu)
+                                      + self.hospital_prob * Q_quarantined)
+        dydt3d[:, :, self.index_C] = icu_cared - deaths_on_icu
+        dydt3d[:, :, self.index_U] = needing_care - icu_cared - deaths_without_icu
+        dydt3d[:, :, self.index_R] = ((1 - self.hospital_prob) * I_removed + A_removed
+                                      + hosp_rate * (1 - self.critical_prob) * H_vec
+                                      + (1 - self.hospital_prob) * Q_quarantined)
+        dydt3d[:, :, self.index_D] = deaths_without_icu + params.death_prob_with_ICU * deaths_on_icu
+        dydt3d[:, :, self.index_O] = offsite
+        dydt3d[:, :, self.index_Q] = quarantine_sicks - Q_quarantined
+
+        return dydt3d.reshape(y.shape)
+
+    def run_ensemble(self, T_stop: int, rates: dict) -> dict:
+        """
+        Integrate all members described by `rates` (see ensemble_rates) up to `T_stop` days.
+
+        Returns
+        -------
+        out: dict with time vector 't', age structured states 'y' of shape (time, iterations, ages, compartments) and
+            summary states 'y_plot' of shape (time, iterations, categories)
+        """
+        n_members = len(rates['beta'])
+        y0 = np.broadcast_to(self.initial_state(), (n_members, self.age_categories, self.params.number_compartments))
+
+        member_rates = [np.asarray(rates[k], dtype=float).reshape(n_members, 1) for k in
+                        ['beta', 'latentRate', 'removalRate', 'hospRate', 'deathRateICU', 'deathRateNoIcu']]
+        controls = Simulator(self.params).compiled_controls()
+
+        def make_solver(start):
+            # vode controls the error over the whole state, so the step size follows the stiffest member and every
+            # member is integrated at least as accurately as in a separate solve
+            return ode(self.ode_system3d).set_f_params(kernels.control_flags(start, *controls), *member_rates)\
+                .set_integrator('vode', nsteps=2000, rtol=1e-6, atol=1e-12)
+
+        tim = np.linspace(0, T_stop, T_stop + 1)  # 1 time value per day
+        boundaries = control_timeline(self.params.control_dict, tim[0], tim[-1])
+        warm_start = self.params.control_dict['warm_start']
+        if warm_start == 'off':
+            y_out = integrate_segments(make_solver, y0.reshape(-1), tim, boundaries)
+        else:
+            store = trajectory_store(warm_start)
+            key = self.trajectory_key(member_rates)
+            segments = control_segments(lambda start: kernels.control_flags(start, *controls), boundaries)
+            y_out = self.integrate_from_branch(make_solver, y0.reshape(-1), tim, boundaries,
+                                              *store.branch_point(key, segments, tim))
+            store.add(key, segments, tim, y_out)
+        y_out = y_out.reshape((len(tim),) + y0.shape)
+
+        return {'y': y_out, 't': tim, 'y_plot': self.summarise(y_out)}
+
+    def trajectory_key(self, member_rates: list) -> str:
+        # everything the trajectories depend on apart from the timed controls, which are compared as control segments
+        params = self.params
+        return fingerprint(member_rates, params.infection_matrix, params.population_frame, params.population,
+                           params.control_dict['ICU_capacity'],
+                           params.control_dict['remove_high_risk']['n_categories_removed'], params.quarant_rate,
+                           params.AsymptInfectiousFactor, params.death_prob_with_ICU)
+
+    @staticmethod
+    def integrate_from_branch(make_solver, y0, tim, boundaries, branch_index, branch_states):
+        """
+        integrate_segments, taking the states up to tim[branch_index] from branch_states (the states of an earlier run
+        with the same controls up to then) and integrating only from there on
+        """
+        if branch_states is None:
+            return integrate_segments(make_solver, y0, tim, boundaries)
+        logger.info(f"Branching from a stored trajectory at t={tim[branch_index]}")
+        y_out = np.empty((len(tim), len(y0)))
+        y_out[:branch_index + 1] = branch_states.reshape(branch_index + 1, -1)
+        if branch_index < len(tim) - 1:
+            start = tim[branch_index]
+            later = [start] + [b for b in boundaries if b > start]
+            y_out[branch_index:] = integrate_segments(make_solver, y_out[branch_index], tim[branch_index:], later)
+        return y_out
+
+    def summarise(self, y_out: np.array) -> np.array:
+        # non age-structured categories, in the same layout as the 'y_plot' output of Simulator.run_model
+        categories = self.params.categories
+        y_plot = np.zeros(y_out.shape[:2] + (len(categories),))
+        for name in self.params.calculated_categories:
+            y_plot[:, :, categories[name]['index']] = y_out[:, :, :, categories[name]['index']].sum(axis=2)
+
+        for name in self.params.change_in_categories:  # daily change in
+            changed = y_plot[:, :, categories[name[-1]]['index']]
+            y_plot[1:, :, categories[name]['index']] = np.diff(changed, axis=0)
+
+        y_plot[:, :, categories['Ninf']['index']] = y_plot[:, :, categories['CE']['index']] + \
+            y_plot[:, :, categories['CI']['index']] + y_plot[:, :, categories['CA']['index']]
+        return y_plot
+
+    def simulate_over_parameter_range_parallel(self, numberOfIterations, t_stop, n_processes,
+                                               generated_disease_vectors):
+        n_members = min(numberOfIterations, len(generated_disease_vectors))
+        logger.info(f"Running batched simulation of {n_members} ensemble members")
+        rates = ensemble_rates(generated_disease_vectors, n_members, self.params.largest_eigenvalue)
+        control_dict = self.params.control_dict
+        if control_dict['scheduler'] == 'distributed':
+            # each task integrates a smaller batch of members
+            step = control_dict['members_per_task']
+            batches = [dict(T_stop=t_stop, rates={k: v[i:i + step] for k, v in rates.items()})
+                       for i in range(0, n_members, step)]
+            parts = compute_members(self, 'run_ensemble', batches, 'distributed', 1)
+            ensemble = {'t': parts[0]['t'],
+                        'y': np.concatenate([part['y'] for part in parts], axis=1),
+                        'y_plot': np.concatenate([part['y_plot'] for part in parts], axis=1)}
+        else:
+            ensemble = self.run_ensemble(t_stop, rates)
+
+        config_dict = []
+        sols_raw = {}
+        for ii in range(n_members):
+            dct = {k: rates[k][ii] for k in
+                   ['beta', 'latentRate', 'removalRate', 'hospRate', 'deathRateICU', 'deathRateNoIcu']}
+            config_dict.append(dct)
+            sols_raw[(rates['R0'][ii], dct['latentRate'], dct['removalRate'],
+                      dct['hospRate'], dct['deathRateICU'], dct['deathRateNoIcu'])] = {
+                'y': ensemble['y'][:, ii].reshape(len(ensemble['t']), -1).T,
+                't': ensemble['t'],
+                'y_plot': ensemble['y_plot'][:, ii].T
+            }
+        return sols_raw, config_dict
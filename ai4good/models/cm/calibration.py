@@ -0,0 +1,126 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from ai4good.models.cm.disease_sampler import DISEASE_PARAMETERS
+from ai4good.models.cm.initialise_parameters import Parameters
+from ai4good.models.cm.simulator import Simulator
+from ai4good.params.disease_params import covid_specific_parameters
+from ai4good.utils.dask_utils import compute_members
+from ai4good.utils.fingerprint import fingerprint
+from ai4good.utils.logger_util import get_logger
+
+logger = get_logger(__name__)
+
+# calibrated parameter: (lower, upper, resolution), candidates are rounded to the resolution so they can be cached
+CALIBRATED = {
+    'R0': (1, 10, 0.01),
+    'LatentPeriod': (1, 10, 0.01),
+    'RemovalPeriod': (1, 15, 0.01),
+    'HygieneFactor': (0.3, 1, 0.001),  # better_hygiene value, in effect during the hygiene timing of the profile
+}
+ELITE_FRACTION = 0.2
+
+
+class CandidateEvaluator:
+    """
+    Misfit of candidate parameter sets to observed counts, one Simulator.run_model per candidate. The disease
+    parameters which are not calibrated are kept at the means of their distributions.
+    """
+
+    def __init__(self, params: Parameters, observed: pd.DataFrame):
+        self.params = params
+        self.observed = observed
+        self.t_stop = int(np.ceil(observed['Time'].max()))
+        self.columns = [column for column in observed.columns if column != 'Time']
+        index_by_longname = {category['longname']: category['index'] for category in params.categories.values()}
+        self.rows = [index_by_longname[column] for column in self.columns]
+
+    def simulate(self, candidate: dict) -> dict:
+        params = copy.copy(self.params)
+        params.control_dict = dict(params.control_dict)
+        params.control_dict['better_hygiene'] = {**params.control_dict['better_hygiene'],
+                                                 'value': candidate['HygieneFactor']}
+        vector = disease_vector(candidate)
+        removal_rate = 1 / vector['RemovalPeriod']
+        # rates as in Simulator.simulate_over_parameter_range_parallel
+        return Simulator(params).run_model(
+            T_stop=self.t_stop, beta=removal_rate * vector['R0'] / params.largest_eigenvalue,
+            latent_rate=1 / vector['LatentPeriod'], removal_rate=removal_rate, hosp_rate=1 / vector['HospPeriod'],
+            death_rate_ICU=1 / vector['DeathICUPeriod'], death_rate_no_ICU=1 / vector['DeathNoICUPeriod'])
+
+    def loss(self, candidate: dict) -> float:
+        """Mean squared difference of log(1 + people) between the model and every observed count"""
+        sol = self.simulate(candidate)
+        times = self.observed['Time'].to_numpy()
+        modelled = np.array([np.interp(times, sol['t'], sol['y_plot'][row]) for row in self.rows]).T
+        observed = self.observed[self.columns].to_numpy(dtype=float)
+        errors = np.log1p(np.maximum(modelled * self.params.population, 0)) - np.log1p(observed)
+        return float(np.nanmean(errors ** 2))
+
+
+def disease_vector(candidate: dict) -> dict:
+    # generated_params columns of a candidate, the periods not calibrated at the means of their distributions
+    vector = {column: float(covid_specific_parameters[name]) for column, name in DISEASE_PARAMETERS.items()}
+    vector.update({column: candidate[column] for column in DISEASE_PARAMETERS if column in candidate})
+    return vector
+
+
+class Calibration:
+    """
+    Fits the CALIBRATED parameters to observed counts with the cross entropy method: every generation samples
+    candidates from a normal distribution truncated to the bounds, evaluates them as a batch (over the distributed
+    client with control_dict['scheduler'] == 'distributed'), and refits the distribution to the ELITE_FRACTION best.
+    Evaluated candidates are cached, so calling run again continues from the points already known.
+    """
+
+    def __init__(self, params: Parameters, observed: pd.DataFrame):
+        self.params = params
+        self.evaluator = CandidateEvaluator(params, observed)
+        self.names = list(CALIBRATED.keys())
+        self.lower, self.upper, self.resolution = np.array(list(CALIBRATED.values()), dtype=float).T
+        self.losses = {}  # fingerprint of a rounded candidate -> (candidate, loss)
+
+    def snap(self, x: np.ndarray) -> np.ndarray:
+        return np.clip(np.round(x / self.resolution) * self.resolution, self.lower, self.upper)
+
+    def evaluate(self, x: np.ndarray) -> np.ndarray:
+        candidates = [dict(zip(self.names, (float(value) for value in row))) for row in self.snap(x)]
+        keys = [fingerprint(candidate) for candidate in candidates]
+        missing = list({key: candidate for key, candidate in zip(keys, candidates) if key not in self.losses}.items())
+        control_dict = self.params.control_dict
+        losses = compute_members(self.evaluator, 'loss', [dict(candidate=candidate) for _, candidate in missing],
+                                 control_dict['scheduler'], control_dict['members_per_task'])
+        for (key, candidate), loss in zip(missing, losses):
+            self.losses[key] = (candidate, loss)
+        logger.info(f"Evaluated {len(missing)} candidates, {len(candidates) - len(missing)} found in the cache")
+        return np.array([self.losses[key][1] for key in keys])
+
+    def run(self, generations: int = 10, population: int = 40, seed=None) -> pd.DataFrame:
+        """
+        Returns the best n_elite candidates found as a generated_params style table (the disease parameters of
+        DISEASE_PARAMETERS) with the HygieneFactor and Loss of each, best first.
+        """
+        rng = np.random.default_rng(seed)
+        n_elite = max(2, int(population * ELITE_FRACTION))
+        mean = (self.lower + self.upper) / 2
+        std = (self.upper - self.lower) / 4
+        for generation in range(generations):
+            x = rng.normal(mean, std, (population, len(self.names)))
+            # resampled until inside the bounds, a truncated normal
+            outside = (x < self.lower) | (x > self.upper)
+            while outside.any():
+                x[outside] = rng.normal(np.broadcast_to(mean, x.shape)[outside], np.broadcast_to(std, x.shape)[outside])
+                outside = (x < self.lower) | (x > self.upper)
+            losses = self.evaluate(x)
+            elite = self.snap(x)[np.argsort(losses)[:n_elite]]
+            mean, std = elite.mean(axis=0), np.maximum(elite.std(axis=0), self.resolution)
+            logger.info(f"Calibration generation {generation + 1} of {generations}: best loss {losses.min():.4g}")
+        return self.fitted(n_elite)
+
+    def fitted(self, n: int) -> pd.DataFrame:
+        best = sorted(self.losses.values(), key=lambda value: value[1])[:n]
+        table = pd.DataFrame([{**disease_vector(candidate), 'HygieneFactor': candidate['HygieneFactor'],
+                               'Loss': loss} for candidate, loss in best])
+        return table
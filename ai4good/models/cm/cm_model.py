@@ -1,15 +1,19 @@
 from abc import ABCMeta, abstractmethod
 
+import numpy as np
 from typeguard import typechecked
 
-from ai4good.models.cm.seirsde import SEIRSDESolver
+from ai4good.models.cm.adaptive import run_until_converged
+from ai4good.models.cm.batched_simulator import BatchedSimulator
+from ai4good.models.cm.compact_report import CompactReport
+from ai4good.models.cm.member_cache import simulate_members
+from ai4good.models.cm.seirsde import BatchedSEIRSDESolver, SEIRSDESolver, noise_seed
 from ai4good.models.model import Model, ModelResult
 from ai4good.params.param_store import ParamStore
 from ai4good.models.cm.initialise_parameters import Parameters
-from ai4good.models.cm.simulator import Simulator, generate_csv
+from ai4good.models.cm.simulator import Simulator
+from ai4good.models.cm.summary_tables import summary_tables
 from ai4good.utils.logger_util import get_logger
-from ai4good.webapp.cm_model_report_utils import normalize_report, prevalence_age_table, prevalence_all_table, \
-    cumulative_all_table, cumulative_age_table
 
 logger = get_logger(__name__)
 
@@ -27,21 +31,11 @@ class AbstractCompartmentalModel(Model):
         config_dict, sols_raw = self.simulate(p)  # we are currently using sols_raw in results generating
         # Precompute some reports
         logger.info("Generating main report")
-        if config_dict is None:
-            report_raw = generate_csv(sols_raw, p, input_type='stochastic')
-        else:
-            report_raw = generate_csv(sols_raw, p, input_type='raw')
-
-        # report = normalize_report(report_raw, p)
-        #
-        # logger.info("Computing prevalence_age_table")
-        # prevalence_age = prevalence_age_table(report)
-        # logger.info("Computing prevalence_all_table")
-        # prevalence_all = prevalence_all_table(report)
-        # logger.info("Computing cumulative_all_table")
-        # cumulative_all = cumulative_all_table(report, p.population, p.camp_params)
-        # logger.info("Computing cumulative_age_table")
-        # cumulative_age = cumulative_age_table(report, p.camp_params)
+        # kept compact, ModelResult.get('report') gives the same DataFrame as generate_csv
+        report_raw = CompactReport.from_solutions(sols_raw, p, is_ordinary=config_dict is not None)
+
+        logger.info("Computing summary tables")
+        tables = summary_tables(report_raw, p)
 
         logger.info("Model result ready")
         return ModelResult(self.result_id(p), {
@@ -49,10 +43,7 @@ class AbstractCompartmentalModel(Model):
             'config_dict': config_dict,
             'params': p,
             'report': report_raw,
-            # 'prevalence_age': prevalence_age,
-            # 'prevalence_all': prevalence_all,
-            # 'cumulative_all': cumulative_all,
-            # 'cumulative_age': cumulative_age
+            **tables
         })
 
 
@@ -70,9 +61,20 @@ class CompartmentalModel(AbstractCompartmentalModel):
         return p.sha1_hash()
 
     def simulate(self, p):
-        sim = Simulator(p)
-        sols_raw, config_dict = sim.simulate_over_parameter_range_parallel(
-            p.control_dict['numberOfIterations'], p.control_dict['t_sim'], p.control_dict['nProcesses'], p.generated_disease_vectors)
+        if p.control_dict['ode_engine'] == 'batched':
+            sim = BatchedSimulator(p)
+        else:
+            sim = Simulator(p)
+
+        def run_batch(first, n):
+            vectors = p.generated_disease_vectors.iloc[first:first + n].reset_index(drop=True)
+            return simulate_members(sim, p, vectors)
+
+        max_iterations = min(p.control_dict['numberOfIterations'], len(p.generated_disease_vectors))
+        if p.control_dict['adaptive_tolerance'] is not None:
+            sols_raw, config_dict = run_until_converged(run_batch, p, max_iterations)
+        else:
+            sols_raw, config_dict = run_batch(0, max_iterations)
         return config_dict, sols_raw,
 
 @typechecked
@@ -89,8 +91,20 @@ class CompartmentalModelStochastic(AbstractCompartmentalModel):
         return p.sha1_hash()
 
     def simulate(self, p):
-        sim = SEIRSDESolver(p)
-        sols_raw, config_dict = sim.simulate_over_parameter_range_parallel(
-            p.control_dict['numberOfIterations'], p.control_dict['t_sim'],  p.control_dict['nProcesses'], p.control_dict['random_seed'])
+        if p.control_dict['ode_engine'] == 'batched':
+            sim = BatchedSEIRSDESolver(p)
+        else:
+            sim = SEIRSDESolver(p)
+        if p.control_dict['adaptive_tolerance'] is not None:
+            # drawn once, so the batches continue the same iteration streams when no seed is given
+            random_seed = np.random.SeedSequence(noise_seed(p.control_dict)).entropy
+
+            def run_batch(first, n):
+                return sim.simulate_over_parameter_range_parallel(n, p.control_dict['t_sim'],
+                                                                  p.control_dict['nProcesses'], random_seed, first)
+            sols_raw, config_dict = run_until_converged(run_batch, p, p.control_dict['numberOfIterations'])
+        else:
+            sols_raw, config_dict = sim.simulate_over_parameter_range_parallel(
+                p.control_dict['numberOfIterations'], p.control_dict['t_sim'],  p.control_dict['nProcesses'], noise_seed(p.control_dict))
         return config_dict, sols_raw
 
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from ai4good.models.cm.initialise_parameters import Parameters
+from ai4good.models.cm.simulator import report_columns
+from ai4good.models.model import LazyResult
+
+
+class CompactReport(LazyResult):
+    """
+    Raw ensemble report of the compartmental model in compact form: a float32 (member, time, variable) array, the
+    time vector, a table with one row of parameters per member and the column schema. The member parameters and the
+    time are not repeated on every row, materialize() rebuilds the DataFrame generate_csv returns.
+    """
+
+    def __init__(self, values: np.ndarray, time: np.ndarray, member_params: pd.DataFrame,
+                 age_columns: list, summary_columns: list):
+        self.values = values
+        self.time = time
+        self.member_params = member_params
+        self.age_columns = age_columns
+        self.summary_columns = summary_columns
+
+    @staticmethod
+    def from_solutions(sols_raw: dict, params: Parameters, is_ordinary: bool) -> 'CompactReport':
+        category_map = {str(params.categories[key]['index']): key for key in params.categories.keys()}
+        age_columns, summary_columns, key_columns = report_columns(category_map, params, params.population_frame,
+                                                                   is_ordinary)
+        t_sim = params.control_dict['t_sim'] + 1
+        values = np.empty((len(sols_raw), t_sim, len(age_columns) + len(summary_columns)), dtype=np.float32)
+        for ii, value in enumerate(sols_raw.values()):
+            values[ii, :, :len(age_columns)] = value['y'].T
+            values[ii, :, len(age_columns):] = value['y_plot'].T
+        time = next(iter(sols_raw.values()))['t'] if sols_raw else np.arange(t_sim)
+        # sols_raw keys are the member parameters for the ordinary model and the iteration for the stochastic one
+        keys = np.array(list(sols_raw.keys()), dtype=float).reshape(len(sols_raw), len(key_columns))
+        member_params = pd.DataFrame(keys, columns=key_columns)
+        return CompactReport(values, np.asarray(time, dtype=float), member_params, age_columns, summary_columns)
+
+    @property
+    def key_columns(self) -> list:
+        return list(self.member_params.columns)
+
+    @property
+    def columns(self) -> list:
+        return self.age_columns + ['Time'] + self.summary_columns + self.key_columns
+
+    def materialize(self) -> pd.DataFrame:
+        n_members, n_times, n_variables = self.values.shape
+        n_age = len(self.age_columns)
+        # filled as (columns, rows) so the frame takes the block without copying, see generate_csv_raw
+        block = np.empty((len(self.columns), n_members * n_times))
+        for ii in range(n_members):
+            rows = slice(ii * n_times, (ii + 1) * n_times)
+            block[:n_age, rows] = self.values[ii, :, :n_age].T
+            block[n_age + 1:n_age + 1 + n_variables - n_age, rows] = self.values[ii, :, n_age:].T
+        block[n_age] = np.tile(self.time, n_members)
+        block[n_age + 1 + len(self.summary_columns):] = np.repeat(self.member_params.to_numpy(), n_times, axis=0).T
+        return pd.DataFrame(block.T, columns=self.columns, copy=False)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from ai4good.params.disease_params import covid_specific_parameters
+
+# column of the disease vectors: mean of its normal distribution, as in generate_disease_params_ranges
+DISEASE_PARAMETERS = {
+    'R0': 'R0_medium',
+    'LatentPeriod': 'Latent_period',
+    'RemovalPeriod': 'Infectious_period',
+    'HospPeriod': 'Hosp_period',
+    'DeathICUPeriod': 'Death_period_withICU',
+    'DeathNoICUPeriod': 'Death_period',
+}
+PARAMETER_SD = 1
+DESIGN_SEED = 42
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+
+
+def latin_hypercube(n: int, d: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    n points of a Latin hypercube in [0, 1)^d: every dimension has exactly one point in each of its n strata.
+    """
+    u = (np.arange(n)[:, None] + rng.random((n, d))) / n
+    for jj in range(d):
+        u[:, jj] = u[rng.permutation(n), jj]
+    return u
+
+
+def halton(n: int, d: int) -> np.ndarray:
+    """
+    The first n points of the d dimensional Halton sequence, starting at index 1 to leave out the origin. Every
+    prefix of the sequence is evenly spread, so the design can be cut at any ensemble size.
+    """
+    indices = np.arange(1, n + 1)
+    u = np.zeros((n, d))
+    for jj, base in enumerate(PRIMES[:d]):
+        remaining = indices.copy()
+        scale = 1.
+        while np.any(remaining > 0):
+            scale /= base
+            u[:, jj] += scale * (remaining % base)
+            remaining //= base
+    return u
+
+
+def sample_disease_vectors(sampler: str, n: int, seed=DESIGN_SEED) -> pd.DataFrame:
+    """
+    n disease parameter vectors with the columns of generated_params.csv, from a 'latin-hypercube' or 'halton' design
+    over the same normal distributions. The csv drops the rows with a negative parameter, here every distribution is
+    truncated at 0 instead, which is the same distribution for independent parameters.
+    """
+    if sampler == 'latin-hypercube':
+        u = latin_hypercube(n, len(DISEASE_PARAMETERS), np.random.default_rng(seed))
+    elif sampler == 'halton':
+        u = halton(n, len(DISEASE_PARAMETERS))
+    else:
+        raise ValueError(f"Unknown disease parameter sampler {sampler}")
+
+    means = np.array([covid_specific_parameters[name] for name in DISEASE_PARAMETERS.values()], dtype=float)
+    lower = norm.cdf(0, means, PARAMETER_SD)
+    values = norm.ppf(lower + u * (1 - lower), means, PARAMETER_SD)
+    return pd.DataFrame(values, columns=list(DISEASE_PARAMETERS.keys()))
@@ -0,0 +1,213 @@
+import json
+
+import numpy as np
+import pandas as pd
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+
+from ai4good.models.cm.adaptive import key_outputs
+from ai4good.models.cm.cm_model import CompartmentalModel
+from ai4good.models.cm.disease_sampler import DESIGN_SEED, latin_hypercube
+from ai4good.models.cm.initialise_parameters import ENSEMBLE_CONTROLS, EXECUTION_CONTROLS, Parameters
+from ai4good.models.cm.summary_tables import format_range
+from ai4good.models.model_registry import create_params
+from ai4good.models.model_result_store import ModelResultStore
+from ai4good.params.param_store import ParamStore
+from ai4good.utils.fingerprint import fingerprint
+from ai4good.utils.logger_util import get_logger
+
+logger = get_logger(__name__)
+
+EMULATOR_MODEL_ID = 'cm-emulator'
+# controls the emulator takes as inputs, the other parameters of a run are fixed for an emulator
+EMULATED_CONTROLS = ['ICU_capacity', 'better_hygiene', 'remove_symptomatic', 'remove_high_risk']
+# input: (lower, upper) of the training design, capacities and rates in people, timings in days
+FEATURE_BOUNDS = {
+    'ICU capacity': (0, 100),
+    'Hygiene factor': (0.3, 1),
+    'Hygiene start': (0, 200),
+    'Hygiene end': (0, 200),
+    'Symptomatic removal rate': (0, 100),
+    'Symptomatic removal start': (0, 200),
+    'Symptomatic removal end': (0, 200),
+    'High risk removal rate': (0, 100),
+    'High risk removal start': (0, 200),
+    'High risk removal end': (0, 200),
+}
+TIME_FEATURES = [ii for ii, name in enumerate(FEATURE_BOUNDS) if name.endswith(('start', 'end'))]
+# in the order of adaptive.KEY_OUTPUTS
+OUTPUT_NAMES = ['Peak symptomatic', 'Peak critical', 'Deaths']
+QUANTILES = [.25, .75]
+INACTIVE_FRACTION = 0.25
+# predictive standard deviation of log(1 + people) above which a prediction is flagged, about 20%
+UNCERTAIN_LOG_STD = 0.2
+
+
+def control_features(params: Parameters) -> np.ndarray:
+    """
+    The emulated controls of params as a vector with the entries of FEATURE_BOUNDS. Timings are clipped to the
+    simulation and a control which is never in place gets the neutral value and no timing, so controls with the same
+    effect have the same features.
+    """
+    control_dict = params.control_dict
+    t_sim = control_dict['t_sim']
+
+    def control(name, value, neutral):
+        start, end = np.clip(control_dict[name]['timing'] or [0, 0], 0, t_sim)
+        return [value, start, end] if end > start else [neutral, 0, 0]
+
+    population = params.population
+    return np.array([control_dict['ICU_capacity']['value'] * population,
+                     *control('better_hygiene', control_dict['better_hygiene']['value'], 1),
+                     *control('remove_symptomatic', control_dict['remove_symptomatic']['rate'] * population, 0),
+                     *control('remove_high_risk', control_dict['remove_high_risk']['rate'] * population, 0)],
+                    dtype=float)
+
+
+def control_overrides(features: np.ndarray, params: Parameters) -> dict:
+    """control_dict overrides giving a run with params the emulated controls of the feature vector"""
+    icu, hygiene, hygiene_start, hygiene_end, symptomatic, symptomatic_start, symptomatic_end, high_risk, \
+        high_risk_start, high_risk_end = [float(feature) for feature in features]
+    population = params.population
+
+    def timing(start, end):
+        return [int(start), int(end)]
+
+    return {
+        'ICU_capacity': {'value': icu / population},
+        'better_hygiene': {'timing': timing(hygiene_start, hygiene_end), 'value': hygiene},
+        'remove_symptomatic': {'timing': timing(symptomatic_start, symptomatic_end), 'rate': symptomatic / population},
+        'remove_high_risk': {'timing': timing(high_risk_start, high_risk_end), 'rate': high_risk / population,
+                             'n_categories_removed': params.control_dict['remove_high_risk']['n_categories_removed']},
+    }
+
+
+def context_key(params: Parameters) -> str:
+    # everything an emulator is specific to: the parameters of the run apart from the emulated and ensemble controls
+    excluded = EMULATED_CONTROLS + EXECUTION_CONTROLS + ENSEMBLE_CONTROLS
+    return fingerprint({k: v for k, v in params.control_dict.items() if k not in excluded},
+                       params.infection_matrix, params.population_frame, params.population, params.camp,
+                       params.country, params.calculated_categories)
+
+
+def output_quartiles(sols_raw: dict, params: Parameters) -> np.ndarray:
+    # 25% and 75% quantiles over the ensemble of every key output, as [output 25%, output 75%, ...]
+    return np.quantile(key_outputs(sols_raw, params), QUANTILES, axis=0).T.ravel()
+
+
+def quartile_table(quartiles: np.ndarray) -> pd.DataFrame:
+    quartiles = np.asarray(quartiles).reshape(len(OUTPUT_NAMES), len(QUANTILES))
+    return pd.DataFrame({'25%': quartiles[:, 0], '75%': quartiles[:, 1],
+                         'IQR': [format_range(lower, upper) for lower, upper in quartiles]}, index=OUTPUT_NAMES)
+
+
+class CMEmulator:
+    """
+    Gaussian process emulator of the compartmental model: predicts the 25% and 75% quantiles of peak symptomatic,
+    peak critical and deaths from the emulated controls, for the fixed camp and other parameters of context_key. One
+    process per output quantile on log(1 + people), with inputs scaled to the unit box of FEATURE_BOUNDS.
+    """
+
+    def __init__(self, context: str):
+        self.context = context
+        bounds = np.array(list(FEATURE_BOUNDS.values()), dtype=float)
+        self.lower, self.upper = bounds[:, 0], bounds[:, 1]
+        self.processes = []
+
+    def scale(self, features: np.ndarray) -> np.ndarray:
+        return (np.atleast_2d(features) - self.lower) / (self.upper - self.lower)
+
+    def fit(self, features: np.ndarray, quartiles: np.ndarray) -> 'CMEmulator':
+        x = self.scale(features)
+        y = np.log1p(np.maximum(quartiles, 0))
+        self.processes = []
+        for jj in range(y.shape[1]):
+            # Matern rather than RBF, the outputs have kinks where a control starts to overlap the epidemic
+            kernel = ConstantKernel(1.0) * Matern(length_scale=np.ones(x.shape[1]), length_scale_bounds=(1e-2, 1e2),
+                                                  nu=2.5) + WhiteKernel(1e-4, noise_level_bounds=(1e-8, 1e-1))
+            gp = GaussianProcessRegressor(kernel=kernel, normalize_y=True, n_restarts_optimizer=2,
+                                          random_state=DESIGN_SEED)
+            self.processes.append(gp.fit(x, y[:, jj]))
+        return self
+
+    def in_distribution(self, params: Parameters) -> bool:
+        features = control_features(params)
+        return context_key(params) == self.context and \
+            bool(np.all((features >= self.lower) & (features <= self.upper)))
+
+    def predict(self, params: Parameters) -> dict:
+        """
+        Predicted quartiles of the key outputs for params, see predict_or_run for the result format. Only meaningful
+        when in_distribution(params).
+        """
+        x = self.scale(control_features(params))
+        means, stds = zip(*[gp.predict(x, return_std=True) for gp in self.processes])
+        stds = np.concatenate(stds)
+        return {'quartiles': quartile_table(np.expm1(np.concatenate(means))), 'emulated': True,
+                'uncertain': bool(np.any(stds > UNCERTAIN_LOG_STD)), 'result': None}
+
+
+def train_emulator(ps: ParamStore, user_input_parameters: str, profile: str = 'baseline', n_runs: int = 100,
+                   overrides: dict = None, seed=DESIGN_SEED) -> CMEmulator:
+    """
+    Runs CompartmentalModel at n_runs points of a Latin hypercube over FEATURE_BOUNDS, with the camp of
+    user_input_parameters and the other parameters of the profile and overrides (e.g. a smaller numberOfIterations or
+    the batched engine), and fits an emulator to the key output quartiles.
+    """
+    overrides = {} if overrides is None else overrides
+    base = create_params(ps, CompartmentalModel.ID, profile, user_input_parameters, json.dumps(overrides))
+    model = CompartmentalModel(ps)
+    rng = np.random.default_rng(seed)
+    lower, upper = np.array(list(FEATURE_BOUNDS.values()), dtype=float).T
+    design = lower + latin_hypercube(n_runs, len(FEATURE_BOUNDS), rng) * (upper - lower)
+    design[:, TIME_FEATURES] = np.floor(design[:, TIME_FEATURES])  # timings are whole days
+    for start in TIME_FEATURES[::2]:  # (start, end) pairs
+        design[:, start:start + 2] = np.sort(design[:, start:start + 2], axis=1)
+        # profiles often leave a control out, so a quarter of the runs have it out too
+        inactive = rng.random(n_runs) < INACTIVE_FRACTION
+        design[inactive, start + 1] = design[inactive, start]
+
+    features, quartiles = [], []
+    for ii, point in enumerate(design):
+        logger.info(f"Emulator training run {ii + 1} of {n_runs}")
+        p = create_params(ps, CompartmentalModel.ID, profile, user_input_parameters,
+                          json.dumps({**overrides, **control_overrides(point, base)}))
+        _, sols_raw = model.simulate(p)
+        features.append(control_features(p))
+        quartiles.append(output_quartiles(sols_raw, p))
+    return CMEmulator(context_key(base)).fit(np.array(features), np.array(quartiles))
+
+
+def store_emulator(rs: ModelResultStore, emulator: CMEmulator):
+    rs.store(EMULATOR_MODEL_ID, emulator.context, emulator)
+
+
+def load_emulator(rs: ModelResultStore, params: Parameters):
+    # the emulator trained for the camp and fixed parameters of params, None if there is none
+    if rs.exists(EMULATOR_MODEL_ID, context_key(params)):
+        return rs.load(EMULATOR_MODEL_ID, context_key(params))
+    return None
+
+
+def predict_or_run(emulator, model: CompartmentalModel, params: Parameters) -> dict:
+    """
+    Key output quartiles for params: the emulator prediction when params is within what it was trained on, a real
+    run of the model otherwise (or without an emulator).
+
+    Returns
+    -------
+    dict with 'quartiles' (DataFrame of the 25%, 75% and formatted IQR of every output, in people), 'emulated',
+    'uncertain' (emulator prediction with a large predictive spread) and 'result' (ModelResult of a real run, or None)
+    """
+    if emulator is not None and emulator.in_distribution(params):
+        return emulator.predict(params)
+    logger.info("Controls outside of the emulator training, running the model")
+    result = model.run(params)
+    # the summary columns of the report, one block of t_sim + 1 rows per member
+    report = result.get('report')
+    categories = sorted(params.categories.values(), key=lambda category: category['index'])
+    summary = report[[category['longname'] for category in categories]].to_numpy()
+    summary = summary.reshape(-1, params.control_dict['t_sim'] + 1, len(categories))
+    sols_raw = {ii: {'y_plot': summary[ii].T} for ii in range(summary.shape[0])}
+    return {'quartiles': quartile_table(output_quartiles(sols_raw, params)), 'emulated': False,
+            'uncertain': False, 'result': result}
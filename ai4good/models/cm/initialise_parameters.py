@@ -1,13 +1,26 @@
 import numpy as np
 import pandas as pd
+import copy
 import json
-import hashlib
+from functools import lru_cache
 from ai4good.params.param_store import ParamStore
 from ai4good.utils import path_utils as pu
+from ai4good.utils.file_cache import file_version, read_csv_cached
+from ai4good.utils.fingerprint import fingerprint
+from ai4good.models.cm.disease_sampler import DESIGN_SEED, sample_disease_vectors
 from ai4good.models.cm import longname, shortname, colour, index, fill_colour
 from ai4good.params.disease_params import covid_specific_parameters
 from ai4good.params.model_control_params import model_config_cm
 
+# control_dict entries which only change how a run is executed, so they are left out of the result hash
+EXECUTION_CONTROLS = ['nProcesses', 'ode_engine', 'ode_solver', 'scheduler', 'members_per_task', 'warm_start',
+                      'member_cache']
+# control_dict entries which only choose the members of the ensemble, left out of the member hash
+ENSEMBLE_CONTROLS = ['numberOfIterations', 'adaptive_tolerance', 'adaptive_batch_size', 'random_seed',
+                     'disease_sampler', 'disease_design_size', 'antithetic_noise', 'common_noise']
+CATEGORIES = pd.DataFrame([longname, shortname, colour, index, fill_colour],
+                          index=['longname', 'shortname', 'colour', 'index', 'fill_colour']).to_dict()
+
 
 class Parameters:
     def __init__(self, ps: ParamStore, user_input_parameters: str, profile: pd.DataFrame, profile_override_dict={}):
@@ -50,23 +63,22 @@ class Parameters:
 
         self.calculated_categories = ['S','E','I','A','R','H','C','D','O','Q','U']
         self.change_in_categories = ['C'+category for category in self.calculated_categories]
-        categories_dicts = [longname,shortname,colour,index,fill_colour]
-        categories_df = pd.DataFrame(categories_dicts, index =['longname', 'shortname','colour','index','fill_colour'])
-        self.categories: dict = categories_df.to_dict()
+        self.categories: dict = copy.deepcopy(CATEGORIES)
 
         self.population_frame, self.population = self.prepare_population_frame()
 
         self.control_dict, self.icu_count = self.load_control_dict(profile, profile_override_dict)
 
         self.infection_matrix, self.im_beta_list, self.largest_eigenvalue = self.generate_infection_matrix()
-        self.generated_disease_vectors = self.ps.get_generated_disease_param_vectors()
+        self.generated_disease_vectors = self.load_disease_vectors()
 
     def csv_name(self) -> str:
         """
         csv naming pattern for the comparment model is currently: 
         better_hygiene_{startTime}_{finishTime}_{Value}-ICU_capacity_{Value}-remove_symptomatic_{startTime}_{finishTime}_{Rate}-shielding_{OnorOff}-remove_high_risk_{StartTime}_{FinishTime}_{Rate}_{RemoveCategories}.csv
         """
-        filtered_control_dict = {i: self.control_dict[i] for i in self.control_dict if ((i != 'nProcesses') and (i != 'numberOfIterations') and (i!='t_sim'))}
+        filtered_control_dict = {i: self.control_dict[i] for i in self.control_dict
+                                 if isinstance(self.control_dict[i], dict) and i not in EXECUTION_CONTROLS}
         #here after the filtering the dictionary should be a dict of dict
         name_list = []
         for key,value_dict in filtered_control_dict.items():
@@ -91,29 +103,40 @@ class Parameters:
         return _csv_name
 
     def sha1_hash(self) -> str:
-        hash_params = [
-            {i: self.control_dict[i] for i in self.control_dict if i != 'nProcesses'},
-            self.infection_matrix.tolist(),
-            self.im_beta_list.tolist(),
+        return fingerprint(
+            {i: self.control_dict[i] for i in self.control_dict if i not in EXECUTION_CONTROLS},
+            self.infection_matrix,
+            self.im_beta_list,
+            self.largest_eigenvalue,
+            self.generated_disease_vectors,
+            self.population_frame,
+            self.population,
+            self.camp,
+            self.country,
+            self.calculated_categories,
+        )
+
+    def member_hash(self) -> str:
+        # sha1_hash without the ensemble members, the hash a single member is cached under with its disease vector
+        return fingerprint(
+            {i: self.control_dict[i] for i in self.control_dict
+             if i not in EXECUTION_CONTROLS and i not in ENSEMBLE_CONTROLS},
+            self.infection_matrix,
+            self.im_beta_list,
             self.largest_eigenvalue,
-            self.generated_disease_vectors.to_dict('records'),
-            self.population_frame.to_dict('records'),
+            self.population_frame,
             self.population,
             self.camp,
             self.country,
             self.calculated_categories,
-        ]
-        serialized_params = json.dumps(hash_params, sort_keys=True)
-        hash_object = hashlib.sha1(serialized_params.encode('UTF-8'))
-        _hash = hash_object.hexdigest()
-        return _hash
+        )
 
     def load_control_dict(self, profile, profile_override_dict):
 
-        def get_values(df, p_name):
-            val_rows = df[df['Parameter'] == p_name]
+        def get_values(rows, p_name):
+            val_rows = [row for row in rows if row['Parameter'] == p_name]
             assert len(val_rows) == 1
-            val_row = val_rows.iloc[0]
+            val_row = val_rows[0]
             st = val_row['Start Time']
             et = val_row['End Time']
             _v = val_row['Value']
@@ -130,7 +153,7 @@ class Parameters:
         def str2bool(v):
             return v.lower() in ("yes", "true", "t", "1")
 
-        profile_copy = profile.copy()
+        profile_copy = profile.to_dict('records')  # looked up once per parameter, a list is faster than the frame
         dct = {}
         p, v, t = get_values(profile_copy, 'better_hygiene')
         dct[p] = {
@@ -163,6 +186,18 @@ class Parameters:
         add_int_scalar(profile_copy, 'numberOfIterations', dct)
         add_int_scalar(profile_copy, 'nProcesses', dct)
         dct['random_seed'] = None
+        dct['ode_engine'] = model_config_cm['ode_engine']
+        dct['ode_solver'] = model_config_cm['ode_solver']
+        dct['scheduler'] = model_config_cm['scheduler']
+        dct['members_per_task'] = model_config_cm['members_per_task']
+        dct['adaptive_tolerance'] = model_config_cm['adaptive_tolerance']
+        dct['adaptive_batch_size'] = model_config_cm['adaptive_batch_size']
+        dct['disease_sampler'] = model_config_cm['disease_sampler']
+        dct['disease_design_size'] = model_config_cm['disease_design_size']
+        dct['warm_start'] = model_config_cm['warm_start']
+        dct['member_cache'] = model_config_cm['member_cache']
+        dct['antithetic_noise'] = model_config_cm['antithetic_noise']
+        dct['common_noise'] = model_config_cm['common_noise']
 
         for k, d in dct.items():
             if k in profile_override_dict.keys():
@@ -170,6 +205,14 @@ class Parameters:
 
         return dct, icu_capacity
 
+    def load_disease_vectors(self) -> pd.DataFrame:
+        sampler = self.control_dict['disease_sampler']
+        if sampler == 'file':
+            return self.ps.get_generated_disease_param_vectors()
+        size = self.control_dict['disease_design_size'] or self.control_dict['numberOfIterations']
+        seed = self.control_dict['random_seed']
+        return sample_disease_vectors(sampler, size, DESIGN_SEED if seed is None else seed)
+
     def prepare_population_frame(self):
         age0to5 = float(self.user_input['age-population-0-5'])
         age6to9 = float(self.user_input['age-population-6-9'])
@@ -190,39 +233,61 @@ class Parameters:
         return population_frame, population_size
 
     def generate_infection_matrix(self):
-        infection_matrix = self.generate_contact_matrix(self.age_limits)
-        assert infection_matrix.shape[0] == infection_matrix.shape[1]
-        next_generation_matrix = np.matmul(0.01 * np.diag(self.population_frame.Population_structure), infection_matrix)
-        largest_eigenvalue = max(np.linalg.eig(next_generation_matrix)[0])  # max eigenvalue
+        contact_matrix_path = pu.params_path(f'contact_matrices/{self.country}.csv')
+        # memoized, the copies keep later changes to the matrix out of the cache
+        infection_matrix, beta_list, largest_eigenvalue = _infection_matrix(
+            contact_matrix_path, file_version(contact_matrix_path), tuple(self.age_limits),
+            tuple(self.population_frame.Population_structure), self.beta_list[0], self.beta_list[2],
+            self.control_dict['shielding']['used'], self.shield_increase, self.shield_decrease)
+        return infection_matrix.copy(), beta_list.copy(), largest_eigenvalue
 
-        beta_list = np.linspace(self.beta_list[0], self.beta_list[2], 20)
-        beta_list = np.real((1 / largest_eigenvalue) * beta_list)  # in case eigenvalue imaginary
+    def generate_contact_matrix(self, age_limits: np.array):
+        contact_matrix = read_csv_cached(pu.params_path(f'contact_matrices/{self.country}.csv')).to_numpy()
+        return contact_matrix_by_age(contact_matrix, self.population_frame['Population_structure'].to_numpy(),
+                                     age_limits)
 
-        if self.control_dict['shielding']['used']:  # increase contact within group and decrease between groups
-            divider = -1  # determines which groups separated. -1 means only oldest group separated from the rest
 
-            infection_matrix[:divider, :divider] = self.shield_increase * infection_matrix[:divider, :divider]
-            infection_matrix[:divider, divider:] = self.shield_decrease * infection_matrix[:divider, divider:]
-            infection_matrix[divider:, :divider] = self.shield_decrease * infection_matrix[divider:, :divider]
-            infection_matrix[divider:, divider] = self.shield_increase * infection_matrix[divider:, divider:]
+@lru_cache(maxsize=256)
+def _infection_matrix(contact_matrix_path, contact_matrix_version, age_limits, population_structure, beta_low,
+                      beta_high, shielding, shield_increase, shield_decrease):
+    # contact_matrix_version is only part of the key, so the cache entry is replaced when the file changes
+    contact_matrix = read_csv_cached(contact_matrix_path).to_numpy()
+    population_structure = np.asarray(population_structure)
+    infection_matrix = contact_matrix_by_age(contact_matrix, population_structure, np.asarray(age_limits))
+    assert infection_matrix.shape[0] == infection_matrix.shape[1]
+    next_generation_matrix = np.matmul(0.01 * np.diag(population_structure), infection_matrix)
+    largest_eigenvalue = max(np.linalg.eig(next_generation_matrix)[0])  # max eigenvalue
 
-        return infection_matrix, beta_list, largest_eigenvalue
+    beta_list = np.linspace(beta_low, beta_high, 20)
+    beta_list = np.real((1 / largest_eigenvalue) * beta_list)  # in case eigenvalue imaginary
 
-    def generate_contact_matrix(self, age_limits: np.array):
-        contact_matrix_path = pu.params_path(f'contact_matrices/{self.country}.csv')
-        contact_matrix = pd.read_csv(contact_matrix_path).to_numpy()
-        population_array = self.population_frame['Population_structure'].to_numpy()
-        n_categories = len(age_limits) - 1
-        ind_limits = np.array(age_limits / 5, dtype=int)
-        p = np.zeros(16)
-        for i in range(n_categories):
-            p[ind_limits[i]: ind_limits[i + 1]] = population_array[i] / (ind_limits[i + 1] - ind_limits[i])
-        transformed_matrix = np.zeros((n_categories, n_categories))
-        for i in range(n_categories):
-            for j in range(n_categories):
-                sump = sum(p[ind_limits[i]: ind_limits[i + 1]])
-                b = contact_matrix[ind_limits[i]: ind_limits[i + 1], ind_limits[j]: ind_limits[j + 1]] * np.array(
-                    p[ind_limits[i]: ind_limits[i + 1]]).transpose()
-                v1 = b.sum() / sump
-                transformed_matrix[i, j] = v1
-        return transformed_matrix
+    if shielding:  # increase contact within group and decrease between groups
+        divider = -1  # determines which groups separated. -1 means only oldest group separated from the rest
+
+        infection_matrix[:divider, :divider] = shield_increase * infection_matrix[:divider, :divider]
+        infection_matrix[:divider, divider:] = shield_decrease * infection_matrix[:divider, divider:]
+        infection_matrix[divider:, :divider] = shield_decrease * infection_matrix[divider:, :divider]
+        infection_matrix[divider:, divider] = shield_increase * infection_matrix[divider:, divider:]
+
+    return infection_matrix, beta_list, largest_eigenvalue
+
+
+def contact_matrix_by_age(contact_matrix: np.array, population_array: np.array, age_limits: np.array) -> np.array:
+    """
+    Average contacts between the age groups bounded by age_limits, from the contact matrix in 5 year bands. Contacts
+    of a group are weighted by the population of its bands, the population of a group being spread evenly over them.
+    """
+    n_categories = len(age_limits) - 1
+    ind_limits = np.array(age_limits / 5, dtype=int)
+    width = ind_limits[1] - ind_limits[0]
+    # every group spans the same number of bands (the row weights would not broadcast over the block otherwise)
+    assert np.all(np.diff(ind_limits) == width)
+    p = np.zeros(16)
+    p[ind_limits[0]:ind_limits[-1]] = np.repeat(population_array[:n_categories] / width, width)
+    bands = slice(ind_limits[0], ind_limits[-1])
+    weighted = contact_matrix[bands, bands] * p[bands, np.newaxis]
+    # (group, group, band pair) blocks, band pairs column by column: the order numpy sums a block of the column-major
+    # matrix pandas reads, so the result does not change by a rounding error
+    blocks = weighted.reshape(n_categories, width, n_categories, width).transpose(0, 2, 3, 1)\
+        .reshape(n_categories, n_categories, width * width)
+    return blocks.sum(axis=2) / p[bands].reshape(n_categories, width).sum(axis=1)[:, np.newaxis]
@@ -0,0 +1,231 @@
+import numba as nb
+import numpy as np
+
+from ai4good.models.cm import index
+
+# Compartment indices are module level constants so numba compiles them into the kernels
+NC = 11  # number of compartments, state is laid out as y[age * NC + compartment]
+S = index['S']
+E = index['E']
+I = index['I']
+A = index['A']
+R = index['R']
+H = index['H']
+C = index['C']
+D = index['D']
+O = index['O']
+Q = index['Q']
+U = index['U']
+
+
+@nb.njit
+def in_window(t, timing):
+    # compiled version of simulator.timing_function, timing holds [start, end, start, end, ...]
+    for ii in range(len(timing) // 2):
+        if timing[2 * ii] <= t < timing[2 * ii + 1]:
+            return True
+    return False
+
+
+@nb.njit
+def control_flags(t, hygiene_timing, hygiene_value, symptomatic_timing, symptomatic_rate, high_risk_timing,
+                  high_risk_rate):
+    """
+    Value of the time dependent controls at time t: hygiene factor on infections, cap on the symptomatic removal rate
+    and cap on the high risk removal rate (0 when the control is not in place)
+    """
+    control_factor = hygiene_value if in_window(t, hygiene_timing) else 1.0
+    remove_symptomatic_rate = symptomatic_rate if in_window(t, symptomatic_timing) else 0.0
+    remove_high_risk_rate = high_risk_rate if in_window(t, high_risk_timing) else 0.0
+    return control_factor, remove_symptomatic_rate, remove_high_risk_rate
+
+
+@nb.njit
+def ode_rhs(y, infection_matrix, symptomatic_prob, hospital_prob, critical_prob,
+            beta, latent_rate, removal_rate, hosp_rate, death_rate_icu, death_rate_no_icu,
+            quarant_rate, asympt_factor, death_prob_with_icu, icu_capacity, first_high_risk,
+            control_factor, remove_symptomatic_rate, remove_high_risk_rate):
+    """
+    Right hand side of the compartmental model, same equations as Simulator.ode_system2d with the controls already
+    resolved for the current time (see control_flags)
+    """
+    n_ages = len(symptomatic_prob)
+    dydt = np.zeros(y.shape)
+
+    total_I = 0.0
+    total_H = 0.0
+    S_removal = 0.0
+    for a in range(n_ages):
+        total_I += y[a * NC + I]
+        total_H += y[a * NC + H]
+        if a >= first_high_risk:
+            S_removal += y[a * NC + S]
+
+    # can't take more off site than there are
+    quarantine_rate = min(total_I, remove_symptomatic_rate)
+    high_risk_rate = min(remove_high_risk_rate, S_removal)
+
+    for a in range(n_ages):
+        k = a * NC
+        infection_total = 0.0
+        for b in range(n_ages):
+            infection_total += infection_matrix[a, b] * (y[b * NC + I] + asympt_factor * y[b * NC + A])
+        new_infections = control_factor * beta * y[k + S] * infection_total
+
+        offsite = 0.0
+        if a >= first_high_risk and high_risk_rate > 0:
+            offsite = high_risk_rate / S_removal * y[k + S]
+        quarantine_sicks = 0.0
+        if quarantine_rate > 0:
+            quarantine_sicks = quarantine_rate / total_I * y[k + I]
+
+        # ICU beds allocated on a first come, first served basis based on the numbers in hospital
+        if total_H > 0:
+            hospitalized_on_icu = icu_capacity / total_H * y[k + H]
+        else:
+            hospitalized_on_icu = icu_capacity
+
+        E_latent = latent_rate * y[k + E]
+        I_removed = removal_rate * y[k + I]
+        A_removed = removal_rate * y[k + A]
+        Q_quarantined = quarant_rate * y[k + Q]
+        deaths_on_icu = death_rate_icu * y[k + C]
+        needing_care = hosp_rate * critical_prob[a] * y[k + H]
+        icu_cared = min(needing_care, hospitalized_on_icu - (y[k + C] - deaths_on_icu))
+        deaths_without_icu = death_rate_no_icu * y[k + U]
+
+        dydt[k + S] = - new_infections - offsite
+        dydt[k + E] = new_infections - E_latent
+        dydt[k + I] = (1 - symptomatic_prob[a]) * E_latent - I_removed - quarantine_sicks
+        dydt[k + A] = symptomatic_prob[a] * E_latent - A_removed
+        dydt[k + H] = (hospital_prob[a] * I_removed - hosp_rate * y[k + H]
+                       + death_rate_icu * (1 - death_prob_with_icu) * min(y[k + C], hospitalized_on_icu)
+                       + hospital_prob[a] * Q_quarantined)
+        dydt[k + C] = icu_cared - deaths_on_icu
+        dydt[k + U] = needing_care - icu_cared - deaths_without_icu
+        dydt[k + R] = ((1 - hospital_prob[a]) * I_removed + A_removed
+                       + hosp_rate * (1 - critical_prob[a]) * y[k + H] + (1 - hospital_prob[a]) * Q_quarantined)
+        dydt[k + D] = deaths_without_icu + death_prob_with_icu * deaths_on_icu
+        dydt[k + O] = offsite
+        dydt[k + Q] = quarantine_sicks - Q_quarantined
+    return dydt
+
+
+@nb.njit
+def ode_jacobian(y, infection_matrix, symptomatic_prob, hospital_prob, critical_prob,
+                 beta, latent_rate, removal_rate, hosp_rate, death_rate_icu, death_rate_no_icu,
+                 quarant_rate, asympt_factor, death_prob_with_icu, icu_capacity, first_high_risk,
+                 control_factor, remove_symptomatic_rate, remove_high_risk_rate):
+    """
+    Analytic Jacobian d(ode_rhs)/dy, jac[i, j] = d dydt[i] / d y[j]. Where the equations take a minimum the derivative
+    of the active branch is used.
+    """
+    n_ages = len(symptomatic_prob)
+    n = len(y)
+    jac = np.zeros((n, n))
+
+    total_I = 0.0
+    total_H = 0.0
+    S_removal = 0.0
+    for a in range(n_ages):
+        total_I += y[a * NC + I]
+        total_H += y[a * NC + H]
+        if a >= first_high_risk:
+            S_removal += y[a * NC + S]
+
+    for a in range(n_ages):
+        k = a * NC
+
+        # new infections, S -> E
+        infection_total = 0.0
+        for b in range(n_ages):
+            infection_total += infection_matrix[a, b] * (y[b * NC + I] + asympt_factor * y[b * NC + A])
+        rate = control_factor * beta
+        jac[k + S, k + S] -= rate * infection_total
+        jac[k + E, k + S] += rate * infection_total
+        for b in range(n_ages):
+            d_inf = rate * y[k + S] * infection_matrix[a, b]
+            jac[k + S, b * NC + I] -= d_inf
+            jac[k + E, b * NC + I] += d_inf
+            jac[k + S, b * NC + A] -= d_inf * asympt_factor
+            jac[k + E, b * NC + A] += d_inf * asympt_factor
+
+        # offsite, S -> O
+        if a >= first_high_risk and remove_high_risk_rate > 0 and S_removal > 0:
+            if remove_high_risk_rate < S_removal:
+                for b in range(first_high_risk, n_ages):
+                    d_off = - remove_high_risk_rate * y[k + S] / S_removal ** 2
+                    if b == a:
+                        d_off += remove_high_risk_rate / S_removal
+                    jac[k + S, b * NC + S] -= d_off
+                    jac[k + O, b * NC + S] += d_off
+            else:
+                jac[k + S, k + S] -= 1
+                jac[k + O, k + S] += 1
+
+        # quarantine, I -> Q
+        if remove_symptomatic_rate > 0 and total_I > 0:
+            if remove_symptomatic_rate < total_I:
+                for b in range(n_ages):
+                    d_quar = - remove_symptomatic_rate * y[k + I] / total_I ** 2
+                    if b == a:
+                        d_quar += remove_symptomatic_rate / total_I
+                    jac[k + I, b * NC + I] -= d_quar
+                    jac[k + Q, b * NC + I] += d_quar
+            else:
+                jac[k + I, k + I] -= 1
+                jac[k + Q, k + I] += 1
+
+        # linear transitions
+        jac[k + E, k + E] -= latent_rate
+        jac[k + I, k + E] += (1 - symptomatic_prob[a]) * latent_rate
+        jac[k + A, k + E] += symptomatic_prob[a] * latent_rate
+        jac[k + I, k + I] -= removal_rate
+        jac[k + H, k + I] += hospital_prob[a] * removal_rate
+        jac[k + R, k + I] += (1 - hospital_prob[a]) * removal_rate
+        jac[k + A, k + A] -= removal_rate
+        jac[k + R, k + A] += removal_rate
+        jac[k + H, k + H] -= hosp_rate
+        jac[k + R, k + H] += hosp_rate * (1 - critical_prob[a])
+        jac[k + H, k + Q] += hospital_prob[a] * quarant_rate
+        jac[k + R, k + Q] += (1 - hospital_prob[a]) * quarant_rate
+        jac[k + Q, k + Q] -= quarant_rate
+        jac[k + C, k + C] -= death_rate_icu
+        jac[k + D, k + C] += death_prob_with_icu * death_rate_icu
+        jac[k + U, k + U] -= death_rate_no_icu
+        jac[k + D, k + U] += death_rate_no_icu
+
+        # ICU: beds available to this age group depend on the whole hospital population
+        if total_H > 0:
+            hospitalized_on_icu = icu_capacity / total_H * y[k + H]
+        else:
+            hospitalized_on_icu = icu_capacity
+
+        # recoveries from ICU back to H
+        recovery = death_rate_icu * (1 - death_prob_with_icu)
+        if y[k + C] <= hospitalized_on_icu:
+            jac[k + H, k + C] += recovery
+        elif total_H > 0:
+            for b in range(n_ages):
+                d_icu = - icu_capacity * y[k + H] / total_H ** 2
+                if b == a:
+                    d_icu += icu_capacity / total_H
+                jac[k + H, b * NC + H] += recovery * d_icu
+
+        # ICU admissions, U receives whoever needs care but does not get it
+        needing_care = hosp_rate * critical_prob[a] * y[k + H]
+        jac[k + U, k + H] += hosp_rate * critical_prob[a]
+        if needing_care <= hospitalized_on_icu - (1 - death_rate_icu) * y[k + C]:
+            jac[k + C, k + H] += hosp_rate * critical_prob[a]
+            jac[k + U, k + H] -= hosp_rate * critical_prob[a]
+        else:
+            jac[k + C, k + C] -= 1 - death_rate_icu
+            jac[k + U, k + C] += 1 - death_rate_icu
+            if total_H > 0:
+                for b in range(n_ages):
+                    d_icu = - icu_capacity * y[k + H] / total_H ** 2
+                    if b == a:
+                        d_icu += icu_capacity / total_H
+                    jac[k + C, b * NC + H] += d_icu
+                    jac[k + U, b * NC + H] -= d_icu
+    return jac
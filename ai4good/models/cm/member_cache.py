@@ -0,0 +1,111 @@
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from ai4good.models.cm.disease_sampler import DISEASE_PARAMETERS
+from ai4good.models.cm.initialise_parameters import Parameters
+from ai4good.models.model_result_store import ModelResultStore, SimpleModelResultStore
+from ai4good.utils.fingerprint import fingerprint
+from ai4good.utils.logger_util import get_logger
+
+logger = get_logger(__name__)
+
+MEMBER_MODEL_ID = 'cm-member'
+MAX_MEMBERS = 2000  # kept in memory, the least recently used are dropped first
+
+
+class MemberCache:
+    """
+    Results of single ensemble members of the compartmental model, keyed by the fingerprint of the run without the
+    ensemble size (Parameters.member_hash) and the fingerprint of the member's disease parameter vector. With a
+    ModelResultStore the members are also kept for other processes.
+    """
+
+    def __init__(self, rs: ModelResultStore = None):
+        self.rs = rs
+        self._lock = threading.Lock()
+        self._members = OrderedDict()  # (run key, member key) -> (sols_raw key, solution, config_dict entry)
+
+    def load(self, run_key: str, member_key: str):
+        with self._lock:
+            member = self._members.get((run_key, member_key))
+            if member is not None:
+                self._members.move_to_end((run_key, member_key))
+                return member
+        if self.rs is not None and self.rs.exists(MEMBER_MODEL_ID, f'{run_key}_{member_key}'):
+            try:
+                member = self.rs.load(MEMBER_MODEL_ID, f'{run_key}_{member_key}')
+            except (OSError, EOFError, pickle.UnpicklingError):
+                logger.warning(f"Skipping unreadable member {member_key}")
+                return None
+            self._remember(run_key, member_key, member)
+        return member
+
+    def store(self, run_key: str, member_key: str, member: tuple):
+        self._remember(run_key, member_key, member)
+        if self.rs is not None:
+            self.rs.store(MEMBER_MODEL_ID, f'{run_key}_{member_key}', member)
+
+    def _remember(self, run_key, member_key, member):
+        with self._lock:
+            self._members[(run_key, member_key)] = member
+            self._members.move_to_end((run_key, member_key))
+            while len(self._members) > MAX_MEMBERS:
+                self._members.popitem(last=False)
+
+
+_caches = {}
+
+
+def member_cache(mode: str) -> MemberCache:
+    """
+    The process wide cache of the 'memory' or 'store' member cache mode, 'store' also keeps the members in the model
+    result store.
+    """
+    if mode not in _caches:
+        if mode == 'memory':
+            _caches[mode] = MemberCache()
+        elif mode == 'store':
+            _caches[mode] = MemberCache(SimpleModelResultStore())
+        else:
+            raise ValueError(f"Unknown member cache mode {mode}")
+    return _caches[mode]
+
+
+def simulate_members(sim, params: Parameters, vectors: pd.DataFrame):
+    """
+    sim.simulate_over_parameter_range_parallel for one member per row of vectors, computing only the members missing
+    from the member cache of control_dict['member_cache'] and caching those. Returns (sols_raw, config_dict) in the
+    order of the rows.
+    """
+    control_dict = params.control_dict
+    if control_dict['member_cache'] == 'off':
+        return sim.simulate_over_parameter_range_parallel(len(vectors), control_dict['t_sim'],
+                                                          control_dict['nProcesses'], vectors)
+    cache = member_cache(control_dict['member_cache'])
+    run_key = params.member_hash()
+    member_keys = [fingerprint(row) for row in vectors[list(DISEASE_PARAMETERS.keys())].to_numpy()]
+    members = {member_key: cache.load(run_key, member_key) for member_key in member_keys}
+    missing, missing_keys = [], set()  # first row of every missing member, a repeated vector is computed once
+    for ii, member_key in enumerate(member_keys):
+        if members[member_key] is None and member_key not in missing_keys:
+            missing.append(ii)
+            missing_keys.add(member_key)
+    logger.info(f"{len(member_keys) - len(missing)} of {len(member_keys)} ensemble members found in the member cache")
+
+    if missing:
+        sols_raw, config_dict = sim.simulate_over_parameter_range_parallel(
+            len(missing), control_dict['t_sim'], control_dict['nProcesses'],
+            vectors.iloc[missing].reset_index(drop=True))
+        for ii, (key, sol), dct in zip(missing, sols_raw.items(), config_dict):
+            members[member_keys[ii]] = (key, sol, dct)
+            cache.store(run_key, member_keys[ii], (key, sol, dct))
+
+    sols_raw, config_dict = {}, []
+    for member_key in member_keys:
+        key, sol, dct = members[member_key]
+        sols_raw[key] = sol
+        config_dict.append(dct)
+    return sols_raw, config_dict
@@ -1,18 +1,23 @@
 #from ai4good.models.cm.initialise_parameters import params, control_data, categories, calculated_categories, change_in_categories
 
 import logging
-import statistics
 import warnings
 from math import ceil, floor
 
-import dask
 import numpy as np
-from dask.diagnostics import ProgressBar
 import sdeint
 
+from ai4good.models.cm import kernels
+from ai4good.models.cm.batched_simulator import BatchedSimulator
 from ai4good.models.cm.initialise_parameters import Parameters
+from ai4good.models.cm.simulator import TIMED_CONTROLS, Simulator, control_timeline
+from ai4good.utils.dask_utils import compute_members
 
 AGE_SEP = ': '  # separate compartment and age in column name
+EM_STEPS_PER_DAY = 16  # Euler-Maruyama is first order, this is about as accurate as daily sdeint steps
+NOISE_CHUNK_STEPS = 64  # Wiener increments drawn at a time by the batched solver
+# seed of the iterations of runs with common_noise and no random_seed, so the profiles of a comparison share noise
+COMMON_NOISE_SEED = 2020
 
 def timing_function(t,time_vector):
     for ii in range(ceil(len(time_vector)/2)):
@@ -21,6 +26,65 @@ def timing_function(t,time_vector):
     # if wasn't in any of these time interval
     return False
 
+
+def equally_spaced_pieces(points):
+    # split increasing time points into runs of equally spaced steps which share their end points
+    steps = np.diff(points)
+    pieces = []
+    begin = 0
+    for i in range(1, len(steps)):
+        if not np.isclose(steps[i], steps[i - 1]):
+            pieces.append(points[begin:i + 1])
+            begin = i
+    pieces.append(points[begin:])
+    return pieces
+
+
+def iteration_seeds(random_seed, numberOfIterations, first_iteration=0):
+    """
+    One independent SeedSequence per iteration, spawned from random_seed (fresh entropy if it is None), for iterations
+    first_iteration onwards. Iteration ii gets the same stream however the iterations are split between processes or
+    runs, so seeded ensembles are reproducible.
+    """
+    root = np.random.SeedSequence(random_seed)
+    # the children SeedSequence.spawn would give, without having to spawn the earlier iterations first
+    return [np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (ii,), pool_size=root.pool_size)
+            for ii in range(first_iteration, first_iteration + numberOfIterations)]
+
+
+def iteration_noise(random_seed, numberOfIterations, first_iteration=0, antithetic=False):
+    """
+    Seeds (see iteration_seeds) and antithetic flags of iterations first_iteration onwards. With antithetic the
+    iterations come in pairs 2k, 2k + 1 which share the stream of seed k, the second with its Wiener increments
+    negated, so the pair's first order noise cancels in ensemble statistics.
+    """
+    iterations = range(first_iteration, first_iteration + numberOfIterations)
+    if not antithetic:
+        return iteration_seeds(random_seed, numberOfIterations, first_iteration), [False] * numberOfIterations
+    first_pair = first_iteration // 2
+    pairs = iteration_seeds(random_seed, (first_iteration + numberOfIterations + 1) // 2 - first_pair, first_pair)
+    return [pairs[ii // 2 - first_pair] for ii in iterations], [ii % 2 == 1 for ii in iterations]
+
+
+def noise_seed(control_dict):
+    # random_seed of a run, the common seed for common_noise runs without one
+    if control_dict['random_seed'] is None and control_dict['common_noise']:
+        return COMMON_NOISE_SEED
+    return control_dict['random_seed']
+
+
+class NegatedGenerator:
+    """The normal draws of sdeint from a numpy Generator with their signs flipped, giving the antithetic path -W"""
+
+    def __init__(self, generator: np.random.Generator):
+        self.generator = generator
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        return 2 * np.asarray(loc) - self.generator.normal(loc, scale, size)
+
+    def standard_normal(self, size=None):
+        return -self.generator.standard_normal(size)
+
 ##
 # -----------------------------------------------------------------------------------
 ##
@@ -81,10 +145,17 @@ class SEIRSDESolver:
         self.y0 = y1.T.reshape(self.params.number_compartments*self.age_categories)
         self.sigma = np.full((self.y0.shape[0], 1), 0.1)
         self.driftOnly = False;
+        self.segment_controls = None  # controls in place on the segment being integrated, see run_model
         self.zero_diffusion = np.zeros((self.y0.shape[0], self.stoc_vars_num))
         # self.iteration=0
 
 
+    def control_active(self, t, name):
+        # run_model integrates segments on which the controls are fixed, otherwise look up the control window
+        if self.segment_controls is not None:
+            return self.segment_controls[name]
+        return timing_function(t, self.params.control_dict[name]['timing'])
+
     def sde_drift(self, y, t):
 
         ##
@@ -116,13 +187,13 @@ class SEIRSDESolver:
         total_H = sum(H_vec)
 
         # better hygiene
-        if timing_function(t, self.better_hygiene['timing']):  # control in place
+        if self.control_active(t, 'better_hygiene'):  # control in place
             control_factor = self.better_hygiene['value']
         else:
             control_factor = 1
 
         # removing symptomatic individuals
-        if timing_function(t, self.remove_symptomatic['timing']):  # control in place
+        if self.control_active(t, 'remove_symptomatic'):  # control in place
             remove_symptomatic_rate = min(total_I, self.remove_symptomatic['rate'])  # if total_I too small then can't take this many off site at once
         else:
             remove_symptomatic_rate = 0
@@ -136,7 +207,7 @@ class SEIRSDESolver:
         # removing susceptible high risk individuals
         # these are moved into O ('offsite')
         high_risk_people_removal_rates = np.zeros(self.age_categories);
-        if timing_function(t, self.remove_high_risk['timing']):
+        if self.control_active(t, 'remove_high_risk'):
             high_risk_people_removal_rates[first_high_risk_category_n:] = min(self.remove_high_risk['rate'],
                                       S_removal)  # only removing high risk (within time control window). Can't remove more than we have
 
@@ -242,7 +313,7 @@ class SEIRSDESolver:
         total_H = sum(H_vec)
 
         # better hygiene
-        if timing_function(t, self.better_hygiene['timing']):  # control in place
+        if self.control_active(t, 'better_hygiene'):  # control in place
             control_factor = self.better_hygiene['value']
         else:
             control_factor = 1
@@ -255,7 +326,7 @@ class SEIRSDESolver:
         # removing susceptible high risk individuals
         # these are moved into O ('offsite')
         high_risk_people_removal_rates = np.zeros(self.age_categories);
-        if timing_function(t, self.remove_high_risk['timing']):
+        if self.control_active(t, 'remove_high_risk'):
             high_risk_people_removal_rates[first_high_risk_category_n:] = min(self.remove_high_risk['rate'],
                                       S_removal)  # only removing high risk (within time control window). Can't remove more than we have
 
@@ -327,14 +398,17 @@ class SEIRSDESolver:
             dgdt2d[:, i] = dgdt3d[i].T.reshape(y.shape)
         return dgdt2d
 
-    def run_model(self, tspan, random_seed=None, driftOnly=False):
+    def run_model(self, tspan, random_seed=None, driftOnly=False, antithetic=False):
+        """
+        Integrate one iteration over tspan. random_seed (an int or a SeedSequence, see iteration_seeds) seeds the
+        generator the Wiener increments are drawn from, the global numpy random state is not used. antithetic negates
+        the increments.
+        """
         self.driftOnly = driftOnly
 
-        if random_seed:
-            print("Set random seed: " + str(random_seed))
-            np.random.seed(random_seed)
         warnings.simplefilter("ignore")
-        result = sdeint.itoint(self.sde_drift, self.sde_diffusion, self.y0, tspan)
+        generator = np.random.default_rng(random_seed)
+        result = self.integrate_segments(tspan, NegatedGenerator(generator) if antithetic else generator)
 
         y_plot = np.zeros((len(tspan), len(self.params.categories.keys()) ))
         for name in self.params.calculated_categories:
@@ -355,49 +429,238 @@ class SEIRSDESolver:
 
         return {'y': result.T,'t': tspan, 'y_plot': y_plot.T}
 
+    def integrate_segments(self, tspan, generator):
+        """
+        Integrate over tspan one control segment at a time, so the drift and diffusion are smooth within each call to
+        sdeint. Segment boundaries which are not in tspan are added as extra steps and left out of the result.
+
+        The increments and iterated integrals of the whole days of tspan are drawn up front, so the noise of a day is
+        the same whichever control boundaries split the integration (common random numbers across profiles). Pieces
+        which are not whole days draw their own.
+        """
+        boundaries = control_timeline(self.params.control_dict, tspan[0], tspan[-1])
+        first_day = floor(tspan[0])
+        days = ceil(tspan[-1]) - first_day
+        daily_dW = sdeint.deltaW(days, self.stoc_vars_num, 1.0, generator)
+        _, daily_I = sdeint.Ikpw(daily_dW, 1.0, generator=generator)
+        result = [self.y0[np.newaxis, :]]
+        y = self.y0
+        try:
+            for start, end in zip(boundaries[:-1], boundaries[1:]):
+                self.segment_controls = {name: timing_function(start, self.params.control_dict[name]['timing'])
+                                         for name in TIMED_CONTROLS}
+                inner = tspan[(tspan > start) & (tspan < end)]
+                segment_tspan = np.concatenate([[start], inner, [end]])
+                # sdeint only takes equally spaced steps, so a boundary between two days is integrated separately
+                for piece in equally_spaced_pieces(segment_tspan):
+                    day = piece[0] - first_day
+                    if len(piece) > 1 and np.allclose(np.diff(piece), 1) and day == round(day):
+                        days_of_piece = slice(int(day), int(day) + len(piece) - 1)
+                        # sdeint.itoint integrates with itoSRI2 too
+                        solution = sdeint.itoSRI2(self.sde_drift, self.sde_diffusion, y, piece,
+                                                  dW=daily_dW[days_of_piece], I=daily_I[days_of_piece])
+                    else:
+                        solution = sdeint.itoint(self.sde_drift, self.sde_diffusion, y, piece, generator=generator)
+                    y = solution[-1]
+                    result.append(solution[1:][np.isin(piece[1:], tspan)])
+        finally:
+            self.segment_controls = None
+        return np.concatenate(result)
+
 #--------------------------------------------------------------------
 
-    def simulate_over_parameter_range_parallel(self, numberOfIterations, t_stop, n_processes, random_seed=None):
+    def simulate_over_parameter_range_parallel(self, numberOfIterations, t_stop, n_processes, random_seed=None,
+                                               first_iteration=0):
         logging.info(f"Running parallel simulation with {n_processes} processes")
-        lazy_sols = []
         sols_raw = {}
         tspan = np.linspace(0,t_stop, t_stop+1) # 1 time value per day
-        for ii in range(numberOfIterations):
-            lazy_result = dask.delayed(self.run_model)(tspan, random_seed)
-            lazy_sols.append(lazy_result)
+        control_dict = self.params.control_dict
+        seeds, antithetic = iteration_noise(random_seed, numberOfIterations, first_iteration,
+                                            control_dict['antithetic_noise'])
+        member_kwargs = [dict(tspan=tspan, random_seed=seed, antithetic=negated)
+                         for seed, negated in zip(seeds, antithetic)]
 
-        #with dask.config.set(scheduler='processes', num_workers=n_processes): --Does not work with Dask Distributed
-        with dask.config.set(scheduler='single-threaded', num_workers=1):
-            with ProgressBar():
-                sols = dask.compute(*lazy_sols)
+        sols = compute_members(self, 'run_model', member_kwargs,
+                               control_dict['scheduler'], control_dict['members_per_task'])
 
         for ii in range(numberOfIterations):
-            sols_raw[ii] = sols[ii]
+            sols_raw[first_iteration + ii] = sols[ii]
 
-        [y_U95, y_UQ, y_LQ, y_L95, y_median] = self.generate_percentiles(sols)
-        # standard run
-        StandardSol = [self.run_model(tspan, random_seed, True)]
-
-        # return sols_raw, StandardSol, [y_U95, y_UQ, y_LQ, y_L95, y_median], None
+        # percentiles and the drift only run are not used by the reports, see generate_percentiles and standard_run
         return sols_raw, None
 
+    def standard_run(self, tspan):
+        # deterministic counterpart of the iterations: the drift integrated without noise
+        return self.run_model(tspan, driftOnly=True)
+
     def generate_percentiles(self, sols):
-        n_time_points = len(sols[0]['t'])
+        """
+        97.5, 75, 25 and 2.5 percentiles and median over the iterations in sols of every summary category, as
+        [y_U95, y_UQ, y_LQ, y_L95, y_median] arrays of shape (categories, time)
+        """
+        y_plot = np.stack([sol['y_plot'] for sol in sols])  # (iterations, categories, time)
+        y_U95, y_UQ, y_LQ, y_L95, y_median = np.percentile(y_plot, [97.5, 75, 25, 2.5, 50], axis=0)
+        return [y_U95, y_UQ, y_LQ, y_L95, y_median]
+
+
+class BatchedSEIRSDESolver(SEIRSDESolver):
+    """
+    Integrates all iterations of the stochastic compartmental model together with the Euler-Maruyama scheme. The state
+    is held as an (iterations, ages, compartments) tensor, the drift is BatchedSimulator.ode_system3d and every step
+    draws one (iterations, noise sources) Wiener increment, so a step costs a handful of array operations whatever the
+    number of iterations. Results are returned in the same format as SEIRSDESolver.
+    """
 
-        y_plot = np.zeros((len(self.params.categories.keys()), len(sols) , n_time_points ))
+    def __init__(self, params: Parameters):
+        SEIRSDESolver.__init__(self, params)
+        self.batched_simulator = BatchedSimulator(params)
+        self.controls = Simulator(params).compiled_controls()
+
+    def sde_diffusion3d(self, y3d, control_factor):
+        """
+        Vectorized version of sde_diffusion, returns the (iterations, ages, compartments, noise sources) diffusion
+        tensor for the (iterations, ages, compartments) state
+        """
+        params = self.params
+        categories = params.categories
+        index_S = categories['S']['index']
+        index_E = categories['E']['index']
+        index_I = categories['I']['index']
+        index_A = categories['A']['index']
+        index_R = categories['R']['index']
+        index_H = categories['H']['index']
+        index_C = categories['C']['index']
+        index_D = categories['D']['index']
+        index_U = categories['U']['index']
+        dgdt4d = np.zeros(y3d.shape + (self.stoc_vars_num,))
+
+        S_vec = y3d[:, :, index_S]
+        I_vec = y3d[:, :, index_I]
+        A_vec = y3d[:, :, index_A]
+        H_vec = y3d[:, :, index_H]
+        C_vec = y3d[:, :, index_C]
+
+        E_latent = self.latent_rate_sigma * y3d[:, :, index_E]
+        I_removed = self.removal_rate_sigma * I_vec
+        A_removed = self.removal_rate_sigma * A_vec
 
-        for k, sol in enumerate(sols):
-            sol['y'] = np.asarray(sol['y'])
-            for name in self.params.categories.keys():
-                y_plot[self.params.categories[name]['index'],k,:] = sol['y_plot'][self.params.categories[name]['index']]
+        total_H = H_vec.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hospitalized_on_icu = np.where(total_H > 0, self.icu_capacity['value'] / total_H * H_vec,
+                                           self.icu_capacity['value'])
 
-        y_L95, y_U95, y_LQ, y_UQ, y_median = [np.zeros((len(self.params.categories.keys()),n_time_points)) for i in range(5)]
+        infection_total = np.dot(I_vec, self.infection_matrix.T) + \
+            params.AsymptInfectiousFactor * np.dot(A_vec, self.infection_matrix.T)
+        new_infections = control_factor * self.beta_sigma * S_vec * infection_total
 
-        for name in self.params.categories.keys():
-            y_L95[self.params.categories[name]['index'],:] = np.asarray([ np.percentile(y_plot[self.params.categories[name]['index'],:,i],2.5) for i in range(n_time_points) ])
-            y_LQ[self.params.categories[name]['index'],:] = np.asarray([ np.percentile(y_plot[self.params.categories[name]['index'],:,i],25) for i in range(n_time_points) ])
-            y_UQ[self.params.categories[name]['index'],:] = np.asarray([ np.percentile(y_plot[self.params.categories[name]['index'],:,i],75) for i in range(n_time_points) ])
-            y_U95[self.params.categories[name]['index'],:] = np.asarray([ np.percentile(y_plot[self.params.categories[name]['index'],:,i],97.5) for i in range(n_time_points) ])
+        deaths_on_icu = self.death_rate_icu_sigma * C_vec
+        needing_care = self.hosp_rate_sigma * self.critical_prob * H_vec
+        # the ICU terms only carry noise while there are beds for everyone needing care
+        icu_available = needing_care < hospitalized_on_icu - (C_vec - deaths_on_icu)
+        deaths_without_icu = self.death_rate_no_icu_sigma * y3d[:, :, index_U]
+
+        beta = dgdt4d[..., self.index_beta]
+        beta[:, :, index_S] = -new_infections
+        beta[:, :, index_E] = new_infections
+
+        latent = dgdt4d[..., self.index_latent]
+        latent[:, :, index_E] = -E_latent
+        latent[:, :, index_I] = (1 - self.symptomatic_prob) * E_latent
+        latent[:, :, index_A] = self.symptomatic_prob * E_latent
+
+        removal = dgdt4d[..., self.index_removal]
+        removal[:, :, index_I] = -I_removed
+        removal[:, :, index_A] = -A_removed
+        removal[:, :, index_H] = self.hospital_prob * I_removed
+        removal[:, :, index_R] = (1 - self.hospital_prob) * I_removed + A_removed
+
+        hosp = dgdt4d[..., self.index_hosp]
+        hosp[:, :, index_H] = self.hosp_rate_sigma * H_vec
+        hosp[:, :, index_C] = np.where(icu_available, needing_care, 0)
+        hosp[:, :, index_U] = np.where(icu_available, needing_care, 0)
+        hosp[:, :, index_R] = self.hosp_rate * (1 - self.critical_prob) * H_vec
+
+        death_icu = dgdt4d[..., self.index_death_icu]
+        death_icu[:, :, index_H] = self.death_rate_icu_sigma * (1 - params.death_prob_with_ICU) * \
+            np.minimum(C_vec, hospitalized_on_icu)
+        death_icu[:, :, index_C] = np.where(icu_available, -deaths_on_icu, 0)
+        death_icu[:, :, index_U] = np.where(icu_available, -deaths_on_icu, 0)
+        death_icu[:, :, index_D] = params.death_prob_with_ICU * deaths_on_icu
+
+        death_no_icu = dgdt4d[..., self.index_death_no_icu]
+        death_no_icu[:, :, index_U] = -deaths_without_icu
+        death_no_icu[:, :, index_D] = deaths_without_icu
+
+        return dgdt4d
+
+    def run_ensemble(self, tspan, seeds, driftOnly=False, antithetic=None) -> dict:
+        """
+        Integrate one iteration per entry of `seeds` (see iteration_seeds) over tspan with Euler-Maruyama steps of at
+        most 1/EM_STEPS_PER_DAY days. Control segment boundaries are always step boundaries, so the controls are fixed
+        during each step. Each iteration draws its Wiener increments from its own seed, so an iteration does not
+        depend on which others are in the same batch. The increments of iterations flagged in `antithetic` are
+        negated.
+
+        Returns
+        -------
+        out: dict with time vector 't', age structured states 'y' of shape (time, iterations, ages, compartments) and
+            summary states 'y_plot' of shape (time, iterations, categories)
+        """
+        n_members = len(seeds)
+        boundaries = control_timeline(self.params.control_dict, tspan[0], tspan[-1])
+        points = np.union1d(tspan, boundaries)
+        steps = np.concatenate([np.linspace(start, end, max(1, ceil((end - start) * EM_STEPS_PER_DAY - 1e-9)) + 1)[:-1]
+                                for start, end in zip(points[:-1], points[1:])] + [points[-1:]])
+        y = np.tile(self.y0.reshape(self.age_categories, self.params.number_compartments), (n_members, 1, 1))
+        rates = (self.beta, self.latent_rate, self.removal_rate, self.hosp_rate, self.death_rate_icu,
+                 self.death_rate_no_icu)
+
+        if not driftOnly:
+            # each iteration draws from its own stream, NOISE_CHUNK_STEPS steps at a time
+            generators = [np.random.default_rng(seed) for seed in seeds]
+            signs = np.where(np.asarray(antithetic, dtype=bool), -1.0, 1.0) if antithetic is not None else None
+
+        y_out = np.empty((len(tspan),) + y.shape)
+        y_out[0] = y
+        out_index = 1
+        for step, (t, t_next) in enumerate(zip(steps[:-1], steps[1:])):
+            dt = t_next - t
+            flags = kernels.control_flags(t, *self.controls)
+            dy = self.batched_simulator.ode_system3d(t, y.reshape(-1), flags, *rates).reshape(y.shape) * dt
+            if not driftOnly:
+                if step % NOISE_CHUNK_STEPS == 0:
+                    # (iterations, chunk steps, noise sources) standard normals, in the order of a single draw
+                    chunk = (min(NOISE_CHUNK_STEPS, len(steps) - 1 - step), self.stoc_vars_num)
+                    noise = np.stack([generator.standard_normal(chunk) for generator in generators])
+                    if signs is not None:
+                        noise *= signs[:, None, None]
+                dW = noise[:, step % NOISE_CHUNK_STEPS] * np.sqrt(dt)
+                dy += np.einsum('iack,ik->iac', self.sde_diffusion3d(y, flags[0]), dW)
+            y = y + dy
+            if out_index < len(tspan) and np.isclose(t_next, tspan[out_index]):
+                y_out[out_index] = y
+                out_index += 1
+
+        return {'y': y_out, 't': tspan, 'y_plot': self.batched_simulator.summarise(y_out)}
+
+    def simulate_over_parameter_range_parallel(self, numberOfIterations, t_stop, n_processes, random_seed=None,
+                                               first_iteration=0):
+        logging.info(f"Running batched stochastic simulation of {numberOfIterations} iterations")
+        tspan = np.linspace(0, t_stop, t_stop + 1)  # 1 time value per day
+        control_dict = self.params.control_dict
+        if control_dict['scheduler'] == 'distributed':
+            step = control_dict['members_per_task']
+        else:
+            step = numberOfIterations
+        seeds, antithetic = iteration_noise(random_seed, numberOfIterations, first_iteration,
+                                            control_dict['antithetic_noise'])
+        batches = [dict(tspan=tspan, seeds=seeds[i:i + step], antithetic=antithetic[i:i + step])
+                   for i in range(0, numberOfIterations, step)]
+        parts = compute_members(self, 'run_ensemble', batches, control_dict['scheduler'], 1)
+        y_out = np.concatenate([part['y'] for part in parts], axis=1)
+        y_plot = np.concatenate([part['y_plot'] for part in parts], axis=1)
 
-            y_median[self.params.categories[name]['index'],:] = np.asarray([statistics.median(y_plot[self.params.categories[name]['index'],:,i]) for i in range(n_time_points) ])
-        return [y_U95, y_UQ, y_LQ, y_L95, y_median]
+        sols_raw = {}
+        for ii in range(numberOfIterations):
+            sols_raw[first_iteration + ii] = {'y': y_out[:, ii].reshape(len(tspan), -1).T, 't': tspan, 'y_plot': y_plot[:, ii].T}
+        return sols_raw, None
@@ -3,15 +3,15 @@
 import statistics
 from math import ceil, floor
 
-import dask
 import numpy as np
 import pandas as pd
-from dask.diagnostics import ProgressBar
 from distributed import Variable
 from scipy.integrate import ode
 from tqdm import tqdm
 
+from ai4good.models.cm import kernels
 from ai4good.models.cm.initialise_parameters import Parameters
+from ai4good.utils.dask_utils import compute_members
 from ai4good.utils.logger_util import get_logger
 
 logger = get_logger(__name__)
@@ -25,6 +25,57 @@ def timing_function(t,time_vector):
     # if wasn't in any of these time interval
     return False
 
+
+TIMED_CONTROLS = ['better_hygiene', 'remove_symptomatic', 'remove_high_risk']  # controls switched on by 'timing'
+
+
+def control_timeline(control_dict, t_start, t_stop):
+    """
+    Boundaries of the intervals between t_start and t_stop on which none of the timed controls switches on or off
+    """
+    boundaries = {t_start, t_stop}
+    for name in TIMED_CONTROLS:
+        boundaries.update(b for b in control_dict[name]['timing'] if t_start < b < t_stop)
+    return sorted(boundaries)
+
+
+def integrate_segments(make_solver, y0, tim, boundaries):
+    """
+    Integrate from tim[0] to tim[-1], restarting the solver at each boundary so that it only ever sees a smooth right
+    hand side. make_solver(start) returns a scipy ode for the segment beginning at `start`.
+
+    Returns
+    -------
+    y_out: states at times tim, shape (len(tim), len(y0))
+    """
+    y_out = np.zeros((len(tim), len(y0)))
+    y_out[0] = y0
+    y = y0
+    i = 1
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        sol = make_solver(start)
+        sol.set_initial_value(y, start)
+        while i < len(tim) and tim[i] <= end:
+            sol.integrate(tim[i])
+            if not sol.successful():
+                raise RuntimeError('ode solver unsuccessful')
+            y_out[i] = sol.y
+            i += 1
+        if sol.t < end:
+            sol.integrate(end)
+            if not sol.successful():
+                raise RuntimeError('ode solver unsuccessful')
+        y = sol.y
+    return y_out
+
+
+def compiled_rhs(t, y, flags, model_args):
+    return kernels.ode_rhs(y, *model_args, *flags)
+
+
+def compiled_jacobian(t, y, flags, model_args):
+    return kernels.ode_jacobian(y, *model_args, *flags)
+
 ##
 # -----------------------------------------------------------------------------------
 ##
@@ -161,6 +212,16 @@ class Simulator:
 
         return dydt2d.T.reshape(y.shape)
 
+    def compiled_controls(self):
+        # time dependent controls in the form taken by kernels.control_flags
+        control_dict = self.params.control_dict
+        better_hygiene = control_dict['better_hygiene']
+        remove_symptomatic = control_dict['remove_symptomatic']
+        remove_high_risk = control_dict['remove_high_risk']
+        return (np.asarray(better_hygiene['timing'], dtype=float), float(better_hygiene['value']),
+                np.asarray(remove_symptomatic['timing'], dtype=float), float(remove_symptomatic['rate']),
+                np.asarray(remove_high_risk['timing'], dtype=float), float(remove_high_risk['rate']))
+
     def run_model(self, T_stop, beta, latent_rate=None, removal_rate=None, hosp_rate=None, death_rate_ICU=None, death_rate_no_ICU=None):
         population = self.params.population
         population_frame = self.params.population_frame
@@ -195,33 +256,32 @@ class Simulator:
         hospital_prob = np.asarray(population_frame.p_hosp_given_symptomatic)
         critical_prob = np.asarray(population_frame.p_critical_given_hospitalised)
 
-        sol = ode(self.ode_system2d).set_f_params(
+        controls = self.compiled_controls()
+        model_args = (
             self.params.infection_matrix,
-            age_categories,
             symptomatic_prob,
             hospital_prob,
             critical_prob,
-            beta, # params
-            latent_rate,removal_rate,hosp_rate,death_rate_ICU,death_rate_no_ICU, # more params
-            control_dict['better_hygiene'],control_dict['remove_symptomatic'],control_dict['remove_high_risk'],control_dict['ICU_capacity']
-        ).set_integrator('vode',nsteps=2000)
+            float(beta), # params
+            float(latent_rate),float(removal_rate),float(hosp_rate),float(death_rate_ICU),float(death_rate_no_ICU), # more params
+            float(self.params.quarant_rate), float(self.params.AsymptInfectiousFactor),
+            float(self.params.death_prob_with_ICU), float(control_dict['ICU_capacity']['value']),
+            age_categories - control_dict['remove_high_risk']['n_categories_removed']
+        )
 
+        def make_solver(start):
+            # controls are constant on the segment, so resolve them once here instead of on every rhs call
+            flags = kernels.control_flags(start, *controls)
+            if control_dict['ode_solver'] == 'bdf':
+                # stiff solver using the analytic Jacobian instead of finite differences
+                return ode(compiled_rhs, compiled_jacobian).set_f_params(flags, model_args)\
+                    .set_jac_params(flags, model_args)\
+                    .set_integrator('vode', method='bdf', with_jacobian=True, nsteps=2000)
+            return ode(compiled_rhs).set_f_params(flags, model_args).set_integrator('vode',nsteps=2000)
 
         tim = np.linspace(0,T_stop, T_stop+1) # 1 time value per day
 
-        sol.set_initial_value(y0,tim[0])
-
-        y_out = np.zeros((len(y0),len(tim)))
-
-        i2 = 0
-        y_out[:,0] = sol.y
-        for t in tim[1:]:
-                if sol.successful():
-                    sol.integrate(t)
-                    i2=i2+1
-                    y_out[:,i2] = sol.y
-                else:
-                    raise RuntimeError('ode solver unsuccessful')
+        y_out = integrate_segments(make_solver, y0, tim, control_timeline(control_dict, tim[0], tim[-1])).T
 
         y_plot = np.zeros((len(self.params.categories.keys()), len(tim) ))
         for name in self.params.calculated_categories:
@@ -306,7 +366,7 @@ class Simulator:
 
     def simulate_over_parameter_range_parallel(self, numberOfIterations, t_stop, n_processes, generated_disease_vectors):
         logger.info(f"Running parallel simulation with {n_processes} processes")
-        lazy_sols = []
+        member_kwargs = []
         config_dict = []
         sols_raw = {}
 
@@ -320,15 +380,13 @@ class Simulator:
             deathRateICU   = 1/generated_disease_vectors.DeathICUPeriod[ii]
             deathRateNoIcu = 1/generated_disease_vectors.DeathNoICUPeriod[ii]
 
-            lazy_result = dask.delayed(self.run_model)(T_stop=t_stop, beta=beta,
-                                    latent_rate=latentRate,
-                                    removal_rate=removalRate,
-                                    hosp_rate=hospRate,
-                                    death_rate_ICU=deathRateICU,
-                                    death_rate_no_ICU=deathRateNoIcu
-                                    )
-            lazy_sols.append(lazy_result)
-            #sols.append(result)
+            member_kwargs.append(dict(T_stop=t_stop, beta=beta,
+                                      latent_rate=latentRate,
+                                      removal_rate=removalRate,
+                                      hosp_rate=hospRate,
+                                      death_rate_ICU=deathRateICU,
+                                      death_rate_no_ICU=deathRateNoIcu
+                                      ))
 
             Dict = dict(beta       = beta,
                     latentRate     = latentRate,
@@ -339,10 +397,9 @@ class Simulator:
                     )
             config_dict.append(Dict)
 
-        #with dask.config.set(scheduler='processes', num_workers=n_processes): --Does not work with Dask Distributed
-        with dask.config.set(scheduler='single-threaded', num_workers=1):
-            with ProgressBar():
-                sols = dask.compute(*lazy_sols)
+        control_dict = self.params.control_dict
+        sols = compute_members(self, 'run_model', member_kwargs,
+                               control_dict['scheduler'], control_dict['members_per_task'])
 
         for ii in range(min(numberOfIterations, len(generated_disease_vectors))):
             dct = config_dict[ii]
@@ -412,53 +469,49 @@ def generate_csv(data_to_save, params: Parameters,  input_type=None, time_vec=No
     return solution_csv
 
 
-def generate_csv_raw(category_map, data_to_save, params, population_frame, is_ordinary):
-    # setup column names
-    number_categories_with_age = params.number_compartments * population_frame.shape[0]
-    col_names = []
+def report_columns(category_map, params, population_frame, is_ordinary):
+    """
+    Column names of the raw report: age structured columns, summary columns and the columns identifying the ensemble
+    member. The report has the 'Time' column between the age structured and the summary columns.
+    """
+    age_columns = []
     for j in range(population_frame.shape[0]):
         for i in range(params.number_compartments):
-            col_names.append(
+            age_columns.append(
                 params.categories[category_map[str(i)]]['longname'] + AGE_SEP + str(population_frame.Age.values[j]))
-    col_names.append('Time')
-    number_of_categories = len(params.categories)
-    for j in range(number_of_categories):  # params.number_compartments
-        col_names.append(params.categories[category_map[str(j)]]['longname'])
+    summary_columns = []
+    for j in range(len(params.categories)):  # params.number_compartments
+        summary_columns.append(params.categories[category_map[str(j)]]['longname'])
     if is_ordinary:
-        col_names.append('R0')
-        col_names.append('latentRate')
-        col_names.append('removalRate')
-        col_names.append('hospRate')
-        col_names.append('deathRateICU')
-        col_names.append('deathRateNoIcu')
+        key_columns = ['R0', 'latentRate', 'removalRate', 'hospRate', 'deathRateICU', 'deathRateNoIcu']
     else:
-        col_names.append('iteration')
+        key_columns = ['iteration']
+    return age_columns, summary_columns, key_columns
+
+
+def generate_csv_raw(category_map, data_to_save, params, population_frame, is_ordinary):
+    # setup column names
+    age_columns, summary_columns, key_columns = report_columns(category_map, params, population_frame, is_ordinary)
+    col_names = age_columns + ['Time'] + summary_columns + key_columns
+    number_categories_with_age = len(age_columns)
+    number_of_categories = len(summary_columns)
 
     t_sim = params.control_dict['t_sim'] + 1
-    initdata = np.zeros((len(data_to_save) * t_sim, len(col_names)))
-    final_frame = pd.DataFrame(initdata, columns=col_names)
-    idx = 0
-    idxnxt = t_sim
-    for key, value in tqdm(data_to_save.items()):
-        csv_sol = np.transpose(value['y'])  # age structured
-        final_frame.iloc[idx:idxnxt, 0:number_categories_with_age] = csv_sol
-
-        lastrow = idxnxt-1
-        final_frame.loc[idx:lastrow, 'Time'] = value['t']
-        final_frame.iloc[idx:idxnxt, number_categories_with_age + 1:number_categories_with_age + 1 + number_of_categories] = value['y_plot'].T  # summary/non age-structured
-
-        if is_ordinary:
-            (R0, latentRate, removalRate, hospRate, deathRateICU, deathRateNoIcu) = key
-            final_frame.loc[idx:lastrow, 'R0'] = [R0] * t_sim
-            final_frame.loc[idx:lastrow, 'latentRate'] = [latentRate] * t_sim
-            final_frame.loc[idx:lastrow, 'removalRate'] = [removalRate] * t_sim
-            final_frame.loc[idx:lastrow, 'hospRate'] = [hospRate] * t_sim
-            final_frame.loc[idx:lastrow, 'deathRateICU'] = [deathRateICU] * t_sim
-            final_frame.loc[idx:lastrow, 'deathRateNoIcu'] = [deathRateNoIcu] * t_sim
-        else:
-            final_frame.loc[idx:lastrow, 'iteration'] = [key] * t_sim
-        idx += t_sim
-        idxnxt += t_sim
-    solution_csv = final_frame
+    n_rows = len(data_to_save) * t_sim
+    # pandas keeps a 2d float block as (columns, rows), so filling that layout and handing over its transpose builds
+    # the frame without copying or any per member DataFrame indexing
+    block = np.empty((len(col_names), n_rows))
+    time_column = number_categories_with_age
+    for ii, value in enumerate(data_to_save.values()):
+        rows = slice(ii * t_sim, (ii + 1) * t_sim)
+        block[:number_categories_with_age, rows] = value['y']  # age structured
+        block[time_column, rows] = value['t']
+        block[time_column + 1:time_column + 1 + number_of_categories, rows] = value['y_plot']  # summary/non age-structured
+
+    # sols_raw keys are the member parameters for the ordinary model and the iteration for the stochastic one
+    key_values = np.array(list(data_to_save.keys()), dtype=float).reshape(len(data_to_save), len(key_columns))
+    block[time_column + 1 + number_of_categories:, :] = np.repeat(key_values, t_sim, axis=0).T
+
+    solution_csv = pd.DataFrame(block.T, columns=col_names, copy=False)
     # this is our dataframe to be saved
     return solution_csv
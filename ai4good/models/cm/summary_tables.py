@@ -0,0 +1,132 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from ai4good.models.cm.compact_report import CompactReport
+from ai4good.models.cm.initialise_parameters import Parameters
+from ai4good.models.cm.simulator import AGE_SEP
+from ai4good.webapp.cm_model_report_utils import DIGIT_SEP
+
+AGE_LABELS = ['all ages', '<9 years', '10-19 years', '20-29 years', '30-39 years', '40-49 years', '50-59 years',
+              '60-69 years', '70+ years']
+MONTHS = {'First month': 30, 'First three months': 90, 'First six months': 180}
+
+
+def summary_tables(report: CompactReport, params: Parameters) -> dict:
+    """
+    The prevalence_all, prevalence_age, cumulative_all and cumulative_age tables of cm_model_report_utils, computed
+    directly on the (member, time, variable) tensor of the report instead of grouping the normalized DataFrame by
+    member. Quantiles, rounding and ordering follow the DataFrame versions so the tables are the same.
+    """
+    reducer = _Reducer(report, params.population)
+    return {
+        'prevalence_all': reducer.prevalence_all(),
+        'prevalence_age': reducer.prevalence_age(),
+        'cumulative_all': reducer.cumulative_all(params.population_frame),
+        'cumulative_age': reducer.cumulative_age(params.population_frame),
+    }
+
+
+def _iqr(values: np.ndarray) -> list:
+    # 25% to 75% range over members (axis 0) of every column, formatted like get_quantile_report
+    quantiles = np.quantile(values, [.25, .75], axis=0)
+    return [format_range(lower, upper) for lower, upper in zip(*quantiles)]
+
+
+def format_range(lower, upper) -> str:
+    """lower and upper rounded to whole people and joined like the IQR cells of the summary tables"""
+    if np.isnan(lower) or np.isnan(upper):  # e.g. a month beyond the end of the simulation
+        return 'n/a'
+    return DIGIT_SEP.join([str(int(round(lower))), str(int(round(upper)))])
+
+
+def _ordered(columns, groups):
+    # sorted columns collected group by group, the order used for the age breakdown tables
+    sorted_columns = sorted(columns)
+    return sum([[column for column in sorted_columns if group in column] for group in groups], [])
+
+
+class _Reducer:
+
+    def __init__(self, report: CompactReport, population):
+        self.values = report.values
+        self.time = report.time
+        self.population = population
+        self.columns = report.age_columns + report.summary_columns
+        self.column_index = {column: ii for ii, column in enumerate(self.columns)}
+
+    def people(self, columns, times=slice(None)) -> np.ndarray:
+        # (member, time, column) in numbers of people, as in normalize_report
+        x = self.values[:, :, [self.column_index[column] for column in columns]][:, times]
+        return x.astype(float) * self.population
+
+    def peaks(self, columns):
+        x = self.people(columns)
+        peak_days = self.time[np.argmax(x, axis=1)]  # first time of the maximum, like idxmax
+        return peak_days, x.max(axis=1)
+
+    def prevalence_all(self) -> pd.DataFrame:
+        table_columns = {'Infected (symptomatic)': 'Prevalence of Symptomatic Cases',
+                         'Hospitalised': 'Hospitalisation Demand',
+                         'Critical': 'Critical Care Demand', 'Change in Deaths': 'Prevalence of Deaths'}
+        peak_days, peak_numbers = self.peaks(list(table_columns.keys()))
+        return pd.DataFrame({'Outcome': list(table_columns.values()),
+                             'Peak Day IQR': _iqr(peak_days),
+                             'Peak Number IQR': _iqr(peak_numbers)})
+
+    def prevalence_age(self) -> pd.DataFrame:
+        groups = ['Infected (symptomatic)', 'Hospitalised', 'Critical']
+        columns = [column for column in self.columns if re.match(r'Infected \(symptomatic\)|Hospitalised|Critical',
+                                                                 column)]
+        peak_days, peak_numbers = self.peaks(_ordered(columns, groups))
+        arrays = [np.array(['Incident Cases'] * 9 + ['Hospital Demand'] * 9 + ['Critical Demand'] * 9),
+                  np.array(AGE_LABELS * 3)]
+        return pd.DataFrame({'Peak Day, IQR': _iqr(peak_days), 'Peak Number, IQR': _iqr(peak_numbers)},
+                            index=pd.MultiIndex.from_arrays(arrays))
+
+    def cumulative_all(self, population_frame: pd.DataFrame) -> pd.DataFrame:
+        susceptible_columns = [f'Susceptible{AGE_SEP}{age}' for age in population_frame['Age']]
+        susceptible = self.people(susceptible_columns, -1)
+        initial = self.population * population_frame['Population_structure'].values / 100
+        symptomatic = ((initial - susceptible) * population_frame['p_symptomatic'].values).sum(axis=1)
+        cumulative = np.stack([symptomatic,
+                               self.people(['Hospitalised'])[:, :, 0].sum(axis=1),
+                               self.people(['Critical'])[:, :, 0].sum(axis=1),
+                               self.people(['Deaths'], -1)[:, 0]], axis=1)
+        return pd.DataFrame.from_dict({
+            'Totals': ['Symptomatic Cases', 'Hospital Person-Days', 'Critical Person-days', 'Deaths'],
+            'Counts': _iqr(cumulative)})
+
+    def cumulative_age(self, population_frame: pd.DataFrame) -> pd.DataFrame:
+        select_columns = [column for column in self.columns if column.startswith(('Susceptible:', 'Deaths'))]
+        accumulate_columns = [column for column in self.columns if column.startswith(('Hospitalised', 'Critical'))]
+        # symptomatic cases are the susceptibles lost, weighted by the probability of symptoms of the age group
+        multipliers = np.array([
+            -population_frame['p_symptomatic'].values[[age in column for age in population_frame['Age']]][0]
+            if 'Susceptible:' in column else 1 for column in select_columns])
+        susceptible_age_columns = [column for column in select_columns if 'Susceptible:' in column]
+        ordered = _ordered(select_columns + ['Susceptible'] + accumulate_columns,
+                           ['Susceptible', 'Hospitalised', 'Critical', 'Deaths'])
+
+        counts = {}
+        for label, month in MONTHS.items():
+            rows = np.nonzero(self.time <= month)[0]
+            if len(rows) > month:
+                # change over the month, as diff(periods=month) on the rows up to the end of the month
+                change = self.people(select_columns, rows[-1]) - self.people(select_columns, rows[-1 - month])
+            else:
+                change = np.full((self.values.shape[0], len(select_columns)), np.nan)
+            selected = np.quantile(change * multipliers, [.25, .75], axis=0)
+            accumulated = np.quantile(self.people(accumulate_columns, rows).sum(axis=1), [.25, .75], axis=0)
+
+            quantiles = dict(zip(select_columns, selected.T))
+            quantiles.update(zip(accumulate_columns, accumulated.T))
+            quantiles['Susceptible'] = sum(quantiles[column] for column in susceptible_age_columns)
+            counts[label] = [format_range(*quantiles[column]) for column in ordered]
+
+        arrays = [np.array(['Symptomatic Cases'] * 9 + ['Hospital Person-Days'] * 9 + ['Critical Person-days'] * 9 +
+                           ['Deaths'] * 9),
+                  np.array(AGE_LABELS * 4)]
+        return pd.DataFrame(data=counts, index=arrays)
+
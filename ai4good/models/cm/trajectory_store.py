@@ -0,0 +1,171 @@
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ai4good.models.model_result_store import ModelResultStore, SimpleModelResultStore
+from ai4good.utils.fingerprint import fingerprint
+from ai4good.utils.logger_util import get_logger
+
+logger = get_logger(__name__)
+
+TRAJECTORY_MODEL_ID = 'cm-trajectory'
+INDEX_MODEL_ID = 'cm-trajectory-index'
+MAX_TRAJECTORY_BYTES = 256 * 2 ** 20  # kept in memory, the oldest are dropped first
+MAX_STORED_TRAJECTORY_BYTES = 2 ** 30  # kept in the result store, the oldest are removed first
+
+
+def control_segments(flags_at, boundaries) -> list:
+    """
+    The controls of a run as [(start, flags)], one entry per stretch of time with constant flags. flags_at(start)
+    gives the flags the solver uses on the segment starting at start (see kernels.control_flags).
+    """
+    segments = []
+    for start in boundaries[:-1]:
+        flags = tuple(float(flag) for flag in flags_at(start))
+        if not segments or segments[-1][1] != flags:
+            segments.append((float(start), flags))
+    return segments
+
+
+def divergence_time(segments: list, other_segments: list) -> float:
+    # first time the two runs have different controls in place, inf if they never do
+    starts = sorted({start for start, _ in segments} | {start for start, _ in other_segments})
+    for t in starts:
+        if _flags_at(segments, t) != _flags_at(other_segments, t):
+            return t
+    return np.inf
+
+
+def _flags_at(segments, t):
+    flags = None
+    for start, segment_flags in segments:
+        if start <= t:
+            flags = segment_flags
+    return flags
+
+
+class TrajectoryStore:
+    """
+    Checkpoints of past batched ensemble runs, so a run whose controls only differ from an earlier one after some
+    time t can take the states up to t from it and integrate from there. A run is checkpointed at the starts of its
+    control segments after the first, the only times another run can branch from it, and only its daily states up to
+    the last of them are kept. Runs are grouped by a key covering everything but the timed controls (see
+    BatchedSimulator.trajectory_key), within a group the controls are compared as control_segments. With a
+    ModelResultStore the checkpoints are also shared with other processes.
+    """
+
+    def __init__(self, rs: ModelResultStore = None):
+        self.rs = rs
+        self._lock = threading.Lock()
+        self._trajectories = OrderedDict()  # (key, segments fingerprint) -> (segments, tim, y_out)
+        self._nbytes = 0
+
+    def branch_point(self, key: str, segments: list, tim: np.ndarray):
+        """
+        Index i of the latest checkpoint day in tim up to which a stored run has the same controls, with its states
+        for tim[:i + 1], or (0, None) if none shares more than the initial state.
+        """
+        best_index, best = 0, None
+        for other_segments, other_tim, load_states in self._candidates(key):
+            if other_tim[0] != tim[0]:
+                continue
+            shared = divergence_time(segments, other_segments)
+            for start, _ in other_segments[1:]:
+                index = np.searchsorted(tim, start)
+                if start > shared or index >= len(other_tim) or index >= len(tim) or tim[index] != start:
+                    continue
+                if index > best_index and np.array_equal(tim[:index + 1], other_tim[:index + 1]):
+                    best_index, best = index, load_states
+        if best is None:
+            return 0, None
+        try:
+            return best_index, best()[:best_index + 1]
+        except (OSError, EOFError, pickle.UnpicklingError):
+            logger.warning("Stored trajectory could not be read, integrating from the start")
+            return 0, None
+
+    def add(self, key: str, segments: list, tim: np.ndarray, y_out: np.ndarray):
+        # the states up to the last checkpoint, runs with a single control segment have none
+        checkpoints = [np.searchsorted(tim, start) for start, _ in segments[1:] if start in tim]
+        if not checkpoints:
+            return
+        n = max(checkpoints) + 1
+        tim, y_out = tim[:n], np.array(y_out[:n])
+        segments_id = fingerprint(segments)
+        with self._lock:
+            if (key, segments_id) in self._trajectories:
+                self._nbytes -= self._trajectories[(key, segments_id)][2].nbytes
+            self._trajectories[(key, segments_id)] = (segments, tim, y_out)
+            self._trajectories.move_to_end((key, segments_id))
+            self._nbytes += y_out.nbytes
+            while self._nbytes > MAX_TRAJECTORY_BYTES:
+                _, (_, _, dropped) = self._trajectories.popitem(last=False)
+                self._nbytes -= dropped.nbytes
+        if self.rs is not None:
+            result_id = f'{key}_{segments_id}'
+            if not self.rs.exists(INDEX_MODEL_ID, result_id):
+                # the index entry is written last, so a listed trajectory is complete
+                self.rs.store(TRAJECTORY_MODEL_ID, result_id, y_out)
+                self.rs.store(INDEX_MODEL_ID, result_id, (segments, tim, y_out.nbytes, time.time()))
+                self._evict_stored()
+
+    def _evict_stored(self):
+        # removes the oldest stored trajectories until they take at most MAX_STORED_TRAJECTORY_BYTES
+        stored = []
+        for f in self.rs.list(INDEX_MODEL_ID):
+            result_id = re.search(f'{INDEX_MODEL_ID}_(\\w+)\\.pkl$', f).group(1)
+            try:
+                _, _, nbytes, created = self.rs.load(INDEX_MODEL_ID, result_id)
+            except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+                continue
+            stored.append((created, nbytes, result_id))
+        total = sum(nbytes for _, nbytes, _ in stored)
+        for _, nbytes, result_id in sorted(stored):
+            if total <= MAX_STORED_TRAJECTORY_BYTES:
+                break
+            # the index entry goes first, so no other process starts loading a trajectory being removed
+            self.rs.remove(INDEX_MODEL_ID, result_id)
+            self.rs.remove(TRAJECTORY_MODEL_ID, result_id)
+            total -= nbytes
+
+    def _candidates(self, key: str):
+        with self._lock:
+            in_memory = {segments_id: value for (k, segments_id), value in self._trajectories.items() if k == key}
+        # (segments, tim, function loading the states), the states of stored runs are only loaded when used
+        for segments, tim, y_out in in_memory.values():
+            yield segments, tim, lambda y_out=y_out: y_out
+        if self.rs is None:
+            return
+        for f in self.rs.list(f'{INDEX_MODEL_ID}_{key}'):
+            segments_id = ModelResultStore.result_id_from_file_name(f, f'{INDEX_MODEL_ID}_{key}')
+            if segments_id in in_memory:
+                continue
+            result_id = f'{key}_{segments_id}'
+            try:
+                segments, tim, _, _ = self.rs.load(INDEX_MODEL_ID, result_id)
+            except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+                logger.warning(f"Skipping unreadable trajectory {segments_id}")
+                continue
+            yield segments, tim, lambda result_id=result_id: self.rs.load(TRAJECTORY_MODEL_ID, result_id)
+
+
+_stores = {}
+
+
+def trajectory_store(warm_start: str) -> TrajectoryStore:
+    """
+    The process wide store of the 'memory' or 'store' warm start mode, 'store' also keeps the trajectories in the
+    model result store.
+    """
+    if warm_start not in _stores:
+        if warm_start == 'memory':
+            _stores[warm_start] = TrajectoryStore()
+        elif warm_start == 'store':
+            _stores[warm_start] = TrajectoryStore(SimpleModelResultStore())
+        else:
+            raise ValueError(f"Unknown warm start mode {warm_start}")
+    return _stores[warm_start]
@@ -4,6 +4,14 @@ from abc import ABC, abstractmethod
 from ai4good.params.param_store import ParamStore
 
 
+class LazyResult(ABC):
+    """Result entry kept in a compact form, ModelResult.get returns the materialized value"""
+
+    @abstractmethod
+    def materialize(self) -> Any:
+        pass
+
+
 @typechecked
 class ModelResult:
 
@@ -13,7 +21,10 @@ class ModelResult:
         self.result_data = result_data
 
     def get(self, key: str):
-        return self.result_data[key]
+        value = self.result_data[key]
+        if isinstance(value, LazyResult):
+            return value.materialize()
+        return value
 
 
 @typechecked
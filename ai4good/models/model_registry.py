@@ -40,14 +40,14 @@ def create_params(ps, _model, _profile, user_input_parameters, overrides=None):
             type(_profile) is str) else _profile
         if len(profile_df) == 0:
             raise ValueError('Unknown profile: ' + _profile)
-        return ABMParameters(ps, camp, profile_df, override_dct)
+        return ABMParameters(ps, json.loads(user_input_parameters)['name-camp'], profile_df, override_dct)
     elif _model == NetworkModel.ID:
         override_dct = {} if overrides is None else json.loads(overrides)
         profile_df = ps.get_params(_model, _profile) if (
                 type(_profile) is str) else _profile
         if len(profile_df) == 0:
             raise ValueError('Unknown profile: ' + _profile)
-        return NMParameters(ps, camp, profile_df, override_dct)
+        return NMParameters(ps, json.loads(user_input_parameters)['name-camp'], profile_df, override_dct)
     else:
         raise RuntimeError('Unsupported model: '+_model)
 
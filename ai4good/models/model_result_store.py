@@ -25,6 +25,10 @@ class ModelResultStore(ABC):
     def list(self, model_id: str) -> List[str]:
         pass
 
+    @abstractmethod
+    def remove(self, model_id: str, result_id: str):
+        pass
+
     @abstractmethod
     def remove_all(self, model_id: str):
         pass
@@ -59,6 +63,11 @@ class SimpleModelResultStore(ModelResultStore):
     def list(self, model_id: str) -> List[str]:
         return pu.list_models(f"{model_id}_*")
 
+    def remove(self, model_id: str, result_id: str):
+        p = self._path(f"{model_id}_{result_id}.pkl")
+        if os.path.exists(p):
+            os.remove(p)
+
     def remove_all(self, model_id: str):
         files = pu.list_models(f"{model_id}_*")
         for f in files:
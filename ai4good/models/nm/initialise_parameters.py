@@ -2,8 +2,6 @@
 This file sets up the parameters for NM models
 """
 
-import hashlib
-import json
 import pandas as pd
 import numpy as np
 
@@ -14,6 +12,7 @@ from seirsplus.utilities import gamma_dist
 from ai4good.models.nm.utils.network_utils import create_grid, get_values_per_node
 from ai4good.models.nm.utils.stats_utils import sample_population
 from ai4good.params.param_store import ParamStore
+from ai4good.utils.fingerprint import fingerprint
 
 
 class Parameters:
@@ -373,12 +372,8 @@ class Parameters:
         self.beta_q = self.beta * (self.reduction_rate / self.R0_mean)
 
     def sha1_hash(self) -> str:
-        hash_params = [
+        return fingerprint(
             self.total_population,
             self.camp,
             self.profile_hash
-        ]
-        serialized_params = json.dumps(hash_params, sort_keys=True)
-        hash_object = hashlib.sha1(serialized_params.encode("UTF-8"))
-        _hash = hash_object.hexdigest()
-        return _hash
+        )
@@ -3,4 +3,31 @@ model_config_cm = {
     "shielding_increase_within_group": 2,
     "default_quarantine_period": 5,
     "better_hygiene_infection_scale": 0.7,
-}
\ No newline at end of file
+    # 'members' integrates each ensemble member separately, 'batched' integrates the whole ensemble as one system
+    # (Euler-Maruyama over all iterations for the stochastic model)
+    "ode_engine": "members",
+    # 'adams' is the default non-stiff vode method, 'bdf' is the stiff method using the analytic Jacobian
+    "ode_solver": "adams",
+    # 'distributed' spreads the ensemble members of a run over the active dask cluster, members_per_task at a time
+    "scheduler": "single-threaded",
+    "members_per_task": 10,
+    # None runs numberOfIterations members, a relative tolerance runs them adaptive_batch_size at a time and stops once
+    # the IQR of peak symptomatic, peak critical and deaths changes less than it (numberOfIterations is then the maximum)
+    "adaptive_tolerance": None,
+    "adaptive_batch_size": 10,
+    # 'file' takes the disease parameter vectors from generated_params.csv, 'latin-hypercube' or 'halton' sample
+    # disease_design_size of them (numberOfIterations if None) over the same distributions
+    "disease_sampler": "file",
+    "disease_design_size": None,
+    # batched ODE runs only: 'memory' or 'store' (also kept with the model results, for other processes) reuse the daily
+    # states of an earlier run with the same parameters up to the first time their timed controls differ
+    "warm_start": "off",
+    # 'memory' or 'store' (also kept with the model results) cache the ordinary model's ensemble members by their
+    # disease parameter vector, so a larger ensemble of the same run only computes the new members
+    "member_cache": "off",
+    # stochastic model only: antithetic_noise runs the iterations in pairs with opposite Wiener increments, common_noise
+    # gives runs without a random_seed the same noise streams, so the profiles of a comparison differ only by their
+    # controls
+    "antithetic_noise": False,
+    "common_noise": False,
+}
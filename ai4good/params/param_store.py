@@ -5,6 +5,7 @@ from typing import List, Dict, Any
 from abc import ABC, abstractmethod
 import pandas as pd
 import ai4good.utils.path_utils as pu
+from ai4good.utils.file_cache import read_csv_cached
 
 
 @typechecked
@@ -129,4 +130,4 @@ class SimpleParamStore(ParamStore):
 
     @staticmethod
     def _read_csv(name: str) -> pd.DataFrame:
-        return pd.read_csv(pu.params_path(name))
+        return read_csv_cached(pu.params_path(name))
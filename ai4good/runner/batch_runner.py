@@ -0,0 +1,138 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, NamedTuple, Optional
+
+from ai4good.models.model import ModelResult
+from ai4good.models.model_registry import create_params, get_models
+from ai4good.params.param_store import ParamStore, SimpleParamStore
+from ai4good.runner.facade import Facade
+from ai4good.utils.dask_utils import active_client
+from ai4good.utils.logger_util import get_logger
+
+logger = get_logger(__name__)
+
+AGE_GROUPS = ['0-9', '10-19', '20-29', '30-39', '40-49', '50-59', '60-69', '70+']
+
+
+class BatchJob(NamedTuple):
+    model: str
+    profile: str
+    camp: str
+    user_input: str
+    overrides: Optional[str]
+    result_id: str
+
+
+def camp_user_input(ps: ParamStore, camp: str) -> str:
+    """
+    User input JSON of a camp of camp_params.csv, in the format of the input pages with the population of every age
+    group (0-9 split equally between the 0-5 and 6-9 fields).
+    """
+    camp_params = ps.get_camp_params(camp)
+    if len(camp_params) == 0:
+        raise ValueError('Unknown camp: ' + camp)
+    population = float(camp_params.Total_population.dropna().iloc[0])
+    share = camp_params.set_index('Age').Population_structure / 100
+    ages = {f'age-population-{age}': population * share[age] for age in AGE_GROUPS[1:]}
+    country = str(camp_params.Country.iloc[0])
+    return json.dumps({'name-camp': camp, 'location': country, 'country-dropdown': country,
+                       'total-population': int(population), 'age-population-0-5': population * share['0-9'] / 2,
+                       'age-population-6-9': population * share['0-9'] / 2, **ages})
+
+
+def expand_jobs(ps: ParamStore, model: str, profiles: List[str], camps: List[str],
+                overrides: str = None) -> List[BatchJob]:
+    """
+    One job per camp and profile, without the jobs which have the result id of an earlier one (the same parameters,
+    e.g. a profile which only repeats another).
+    """
+    _mdl = get_models()[model](ps)
+    jobs, result_ids = [], set()
+    for camp in camps:
+        user_input = camp_user_input(ps, camp)
+        for profile in profiles:
+            result_id = _mdl.result_id(create_params(ps, model, profile, user_input, overrides))
+            if result_id in result_ids:
+                logger.info('Skipping %s profile for %s, same result as an earlier job', profile, camp)
+                continue
+            result_ids.add(result_id)
+            jobs.append(BatchJob(model, profile, camp, user_input, overrides, result_id))
+    return jobs
+
+
+def run_job(job: BatchJob) -> ModelResult:
+    # runs in the worker process, which has its own parameter store
+    ps = SimpleParamStore()
+    _mdl = get_models()[job.model](ps)
+    return _mdl.run(create_params(ps, job.model, job.profile, job.user_input, job.overrides))
+
+
+def run_batch(facade: Facade, jobs: List[BatchJob], max_workers: int = None, load_from_cache: bool = True,
+              save_to_cache: bool = True, on_result=None) -> dict:
+    """
+    Runs the jobs with at most max_workers at a time, on the active distributed client if there is one and on a
+    local process pool otherwise (max_workers defaults to the client's threads or the number of cores). Jobs already
+    in facade.rs are skipped when load_from_cache, results are stored through facade.rs by this process when
+    save_to_cache and passed to on_result(job, result) if given.
+
+    Returns
+    -------
+    dict of result id -> 'cached', 'done' or the error of the job
+    """
+    status = {}
+    pending = []
+    for job in jobs:
+        if load_from_cache and facade.rs.exists(job.model, job.result_id):
+            status[job.result_id] = 'cached'
+        else:
+            pending.append(job)
+    logger.info('Batch of %d jobs, %d found in the model result cache', len(jobs), len(jobs) - len(pending))
+    if not pending:
+        return status
+
+    with active_client() as client:
+        if client is not None:
+            max_workers = max_workers or sum(client.nthreads().values())
+            executor = client.get_executor(pure=False)
+        else:
+            max_workers = max_workers or os.cpu_count()
+            executor = ProcessPoolExecutor(max_workers)
+        with executor:
+            _run_pending(executor, facade, pending, max_workers, save_to_cache, on_result, status)
+    return status
+
+
+def _run_pending(executor, facade, pending, max_workers, save_to_cache, on_result, status):
+    start = time.time()
+    job_time = 0.
+    queue = list(reversed(pending))
+    running = {}  # future -> (job, submit time)
+    while queue or running:
+        while queue and len(running) < max_workers:
+            job = queue.pop()
+            running[executor.submit(run_job, job)] = (job, time.time())
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+            job, submitted = running.pop(future)
+            job_time += time.time() - submitted
+            try:
+                mr = future.result()
+            except Exception as e:
+                logger.exception('%s profile for %s failed', job.profile, job.camp)
+                status[job.result_id] = repr(e)
+                continue
+            if save_to_cache:
+                facade.rs.store(job.model, job.result_id, mr)
+            if on_result is not None:
+                on_result(job, mr)
+            status[job.result_id] = 'done'
+        done = len(pending) - len(queue) - len(running)
+        elapsed = time.time() - start
+        remaining = elapsed / done * (len(pending) - done) if done else float('nan')
+        logger.info('Batch progress: %d of %d run (%d failed), %d running, %.0fs elapsed, about %.0fs left',
+                    done, len(pending), sum(s not in ('cached', 'done') for s in status.values()), len(running),
+                    elapsed, remaining)
+    elapsed = time.time() - start
+    logger.info('Batch finished in %.0fs, %.0fs of job time on %d workers', elapsed, job_time, max_workers)
@@ -2,6 +2,7 @@ import argparse
 from typeguard import typechecked
 from ai4good.models.model import Model, ModelResult
 from ai4good.models.model_registry import get_models, create_params
+from ai4good.runner.batch_runner import camp_user_input, expand_jobs, run_batch
 from ai4good.runner.facade import Facade
 from ai4good.utils.logger_util import get_logger
 import ai4good.utils.path_utils as pu
@@ -119,31 +120,28 @@ if __name__ == '__main__':
     parser.add_argument('--show_plots', dest='show_plots', action='store_true', help='Show plots', default=False)
     parser.add_argument('--save_report', dest='save_report', action='store_true', help='Save model report', default=False)
     parser.add_argument('--profile_overrides', type=str, help='Model specific profile overrides as JSON', default=None)
+    parser.add_argument('--batch', action='store_true', default=False,
+                        help='Run the camp and profile combinations concurrently, on the dask client if there is one')
+    parser.add_argument('--max_workers', type=int, default=None,
+                        help='Batch jobs running at the same time, by default the number of cores or dask threads')
     args = parser.parse_args()
 
     model = args.model
     assert model in facade.ps.get_models()
-    if args.run_all_profiles:
-        for profile in facade.ps.get_profiles(model):
-            if args.run_all_camps:
-                for camp in facade.ps.get_camps():
-                    run_model(model, profile, camp, args.load_from_cache, args.save_to_cache, args.save_plots,
-                              args.show_plots, args.save_report, args.profile_overrides)
-            else:
-                run_model(model, profile, args.camp, args.load_from_cache, args.save_to_cache, args.save_plots,
-                          args.show_plots, args.save_report, args.profile_overrides)
+    profiles = facade.ps.get_profiles(model) if args.run_all_profiles else \
+        [facade.ps.get_profiles(model)[0] if args.profile is None else args.profile]
+    camps = facade.ps.get_camps() if args.run_all_camps else [args.camp]
+    if args.batch:
+        jobs = expand_jobs(facade.ps, model, profiles, camps, args.profile_overrides)
+        on_result = (lambda job, mr: save_report(mr, job.result_id)) if args.save_report else None
+        status = run_batch(facade, jobs, args.max_workers, args.load_from_cache, args.save_to_cache, on_result)
+        failed = [rid for rid, s in status.items() if s not in ('cached', 'done')]
+        if failed:
+            logger.error('%d of %d batch jobs failed: %s', len(failed), len(jobs), failed)
     else:
-        if args.profile is None:
-            profile = facade.ps.get_profiles(model)[0]
-        else:
-            profile = args.profile
-
-        if args.run_all_camps:
-            for camp in facade.ps.get_camps():
-                run_model(model, profile, camp, args.load_from_cache, args.save_to_cache, args.save_plots,
-                          args.show_plots, args.save_report, args.profile_overrides)
-        else:
-            run_model(model, profile, args.camp, args.load_from_cache, args.save_to_cache,
-                      args.save_plots, args.show_plots, args.save_report, args.profile_overrides)
+        for profile in profiles:
+            for camp in camps:
+                run_model(model, profile, camp_user_input(facade.ps, camp), args.load_from_cache, args.save_to_cache,
+                          args.save_plots, args.show_plots, args.save_report, args.profile_overrides)
 
     logger.info('Model Runner finished normally')
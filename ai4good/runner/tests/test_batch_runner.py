@@ -0,0 +1,65 @@
+import json
+import unittest
+from typing import Any, List
+from ai4good.models.cm.cm_model import CompartmentalModel
+from ai4good.models.model_registry import create_params
+from ai4good.models.model_result_store import ModelResultStore
+from ai4good.runner.batch_runner import camp_user_input, expand_jobs, run_batch
+from ai4good.runner.facade import Facade
+
+OVERRIDES = '{"numberOfIterations": 2, "t_sim": 50}'
+
+
+class DictResultStore(ModelResultStore):
+    def __init__(self):
+        self.objects = {}
+
+    def store(self, model_id: str, result_id: str, obj: Any):
+        self.objects[(model_id, result_id)] = obj
+
+    def load(self, model_id: str, result_id: str) -> Any:
+        return self.objects[(model_id, result_id)]
+
+    def exists(self, model_id: str, result_id: str) -> bool:
+        return (model_id, result_id) in self.objects
+
+    def list(self, model_id: str) -> List[str]:
+        return [result_id for model, result_id in self.objects if model == model_id]
+
+    def remove(self, model_id: str, result_id: str):
+        self.objects.pop((model_id, result_id), None)
+
+    def remove_all(self, model_id: str):
+        self.objects = {key: obj for key, obj in self.objects.items() if key[0] != model_id}
+
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self) -> None:
+        self.facade = Facade(Facade.simple().ps, DictResultStore())
+
+    def test_camp_user_input(self):
+        user_input = json.loads(camp_user_input(self.facade.ps, 'Moria'))
+        self.assertEqual(user_input['name-camp'], 'Moria')
+        self.assertEqual(user_input['total-population'], 18700)
+        p = create_params(self.facade.ps, CompartmentalModel.ID, 'baseline', camp_user_input(self.facade.ps, 'Moria'))
+        self.assertEqual(p.country, 'Greece')
+        self.assertAlmostEqual(p.population_frame.Population_structure.sum(), 100, delta=0.1)
+        with self.assertRaises(ValueError):
+            camp_user_input(self.facade.ps, 'Unknown')
+
+    def test_run_batch(self):
+        jobs = expand_jobs(self.facade.ps, CompartmentalModel.ID, ['baseline', 'custom', 'baseline'],
+                           self.facade.ps.get_camps(), OVERRIDES)
+        # the repeated profile has the result id of the first one
+        self.assertEqual(len(jobs), 2 * len(self.facade.ps.get_camps()))
+        self.assertEqual(len({job.result_id for job in jobs}), len(jobs))
+
+        reported = []
+        status = run_batch(self.facade, jobs[:3], max_workers=2, on_result=lambda job, mr: reported.append(job))
+        self.assertEqual(status, {job.result_id: 'done' for job in jobs[:3]})
+        self.assertCountEqual(reported, jobs[:3])
+        for job in jobs[:3]:
+            self.assertEqual(self.facade.rs.load(job.model, job.result_id).rid, job.result_id)
+
+        status = run_batch(self.facade, jobs, max_workers=2)
+        self.assertEqual([status[job.result_id] for job in jobs], ['cached'] * 3 + ['done'] * (len(jobs) - 3))
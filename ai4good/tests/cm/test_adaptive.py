@@ -0,0 +1,70 @@
+import json
+import unittest
+import numpy as np
+from ai4good.models.cm.adaptive import key_outputs, quartiles_converged, run_until_converged
+from ai4good.models.cm.batched_simulator import BatchedSimulator
+from ai4good.models.cm.cm_model import CompartmentalModelStochastic
+from ai4good.models.cm.seirsde import BatchedSEIRSDESolver
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+
+class AdaptiveEnsembleTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.facade = Facade.simple()
+
+    def create_params(self, model, overrides):
+        return create_params(self.facade.ps, model, 'custom', user_input_params, json.dumps(overrides))
+
+    def test_quartiles_converged(self):
+        previous = np.array([[100., 0.2], [200., 0.4]])
+        self.assertTrue(quartiles_converged(previous, previous * 1.005, 0.01))
+        self.assertFalse(quartiles_converged(previous, previous * 1.05, 0.01))
+        # below one person the change is measured against one person
+        self.assertTrue(quartiles_converged(previous, previous + [[0, 0.005], [0, 0.005]], 0.01))
+
+    def test_stops_when_converged(self):
+        p = self.create_params('compartmental-model', {"numberOfIterations": 40, "ode_engine": "batched",
+                                                        "adaptive_tolerance": 1e9, "adaptive_batch_size": 5})
+        sim = BatchedSimulator(p)
+        calls = []
+
+        def run_batch(first, n):
+            calls.append((first, n))
+            vectors = p.generated_disease_vectors.iloc[first:first + n].reset_index(drop=True)
+            return sim.simulate_over_parameter_range_parallel(n, p.control_dict['t_sim'], 1, vectors)
+
+        sols_raw, config_dict = run_until_converged(run_batch, p, 40)
+        # a huge tolerance converges as soon as there are two batches to compare
+        self.assertEqual(calls, [(0, 5), (5, 5)])
+        self.assertEqual(len(sols_raw), 10)
+        self.assertEqual(len(config_dict), 10)
+
+        expected, _ = sim.simulate_over_parameter_range_parallel(10, p.control_dict['t_sim'], 1,
+                                                                 p.generated_disease_vectors)
+        self.assertEqual(list(sols_raw.keys()), list(expected.keys()))
+        # the batched integrator shares its step control between the members, so only within the solver tolerance
+        np.testing.assert_allclose(key_outputs(sols_raw, p), key_outputs(expected, p), rtol=1e-4)
+
+    def test_stops_at_maximum(self):
+        p = self.create_params('compartmental-model-stochastic', {"numberOfIterations": 7, "ode_engine": "batched",
+                                                                   "adaptive_tolerance": 0.,
+                                                                   "adaptive_batch_size": 3, "random_seed": 5})
+        config_dict, sols_raw = CompartmentalModelStochastic(self.facade.ps).simulate(p)
+        self.assertIsNone(config_dict)
+        self.assertEqual(list(sols_raw.keys()), list(range(7)))
+
+        # the batches continue the iteration streams of a single run with the same seed
+        expected, _ = BatchedSEIRSDESolver(p).simulate_over_parameter_range_parallel(7, p.control_dict['t_sim'], 1, 5)
+        np.testing.assert_allclose(key_outputs(sols_raw, p), key_outputs(expected, p), atol=1e-9)
+
+    def test_key_outputs(self):
+        p = self.create_params('compartmental-model', {"numberOfIterations": 3, "ode_engine": "batched"})
+        sols_raw, _ = BatchedSimulator(p).simulate_over_parameter_range_parallel(3, p.control_dict['t_sim'], 1,
+                                                                                p.generated_disease_vectors)
+        outputs = key_outputs(sols_raw, p)
+        self.assertEqual(outputs.shape, (3, 3))
+        sol = next(iter(sols_raw.values()))
+        self.assertAlmostEqual(outputs[0, 0], sol['y_plot'][p.categories['I']['index']].max() * p.population)
+        self.assertAlmostEqual(outputs[0, 2], sol['y_plot'][p.categories['D']['index']][-1] * p.population)
@@ -0,0 +1,113 @@
+import json
+import unittest
+import warnings
+from unittest import mock
+import numpy as np
+from ai4good.models.cm import kernels, seirsde
+from ai4good.models.cm.seirsde import COMMON_NOISE_SEED, BatchedSEIRSDESolver, SEIRSDESolver, iteration_noise, \
+    iteration_seeds, noise_seed
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+
+class BatchedSEIRSDESolverTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.params = create_params(Facade.simple().ps, 'compartmental-model-stochastic', 'custom', user_input_params,
+                                    json.dumps({"numberOfIterations": 6, "ode_engine": "batched"}))
+        self.solver = BatchedSEIRSDESolver(self.params)
+        self.tspan = np.linspace(0, 200, 201)
+
+    def test_diffusion_matches_member_solver(self):
+        member_solver = SEIRSDESolver(self.params)
+        y = np.random.RandomState(0).rand(4, len(self.solver.y0)) * 0.01
+        for t in [0., 50., 150.]:
+            control_factor = kernels.control_flags(t, *self.solver.controls)[0]
+            diffusion = self.solver.sde_diffusion3d(y.reshape(4, self.solver.age_categories, -1), control_factor)
+            for ii in range(4):
+                np.testing.assert_allclose(diffusion[ii].reshape(len(self.solver.y0), -1),
+                                           member_solver.sde_diffusion(y[ii], t))
+
+    def test_drift_only_matches_member_solver(self):
+        warnings.simplefilter("ignore")
+        expected = SEIRSDESolver(self.params).run_model(self.tspan, driftOnly=True)
+        actual = self.solver.run_ensemble(self.tspan, iteration_seeds(None, 2), driftOnly=True)
+        self.assertEqual(actual['y'].shape[:2], (len(self.tspan), 2))
+        for ii in range(2):
+            # the schemes differ, both are within about a hundred people of the exact drift solution
+            self.assertLess(np.abs(actual['y'][:, ii].reshape(len(self.tspan), -1).T - expected['y']).max()
+                            * self.params.population, 100)
+            self.assertLess(np.abs(actual['y_plot'][:, ii].T - expected['y_plot']).max() * self.params.population,
+                            100)
+
+    def test_ensemble(self):
+        sols_raw, config_dict = self.solver.simulate_over_parameter_range_parallel(6, 200, 1, random_seed=3)
+        self.assertIsNone(config_dict)
+        self.assertEqual(list(sols_raw.keys()), list(range(6)))
+        for sol in sols_raw.values():
+            self.assertEqual(sol['y'].shape, (len(self.solver.y0), len(self.tspan)))
+            self.assertEqual(sol['y_plot'].shape, (len(self.params.categories), len(self.tspan)))
+            np.testing.assert_array_equal(sol['y'][:, 0], self.solver.y0)
+            self.assertTrue(np.all(np.isfinite(sol['y'])))
+        # iterations are different realisations, the same seed gives the same ensemble
+        self.assertFalse(np.allclose(sols_raw[0]['y'], sols_raw[1]['y']))
+        again, _ = self.solver.simulate_over_parameter_range_parallel(6, 200, 1, random_seed=3)
+        for ii in range(6):
+            np.testing.assert_array_equal(sols_raw[ii]['y'], again[ii]['y'])
+
+    def test_iterations_independent_of_batches(self):
+        seeds = iteration_seeds(5, 4)
+        together = self.solver.run_ensemble(self.tspan, seeds)
+        apart = [self.solver.run_ensemble(self.tspan, seeds[:1]), self.solver.run_ensemble(self.tspan, seeds[1:])]
+        # same noise, only the rounding of the batched matrix products differs
+        np.testing.assert_allclose(together['y'], np.concatenate([part['y'] for part in apart], axis=1),
+                                   rtol=0, atol=1e-12)
+
+    def test_noise_chunks(self):
+        seeds = iteration_seeds(5, 2)
+        expected = self.solver.run_ensemble(self.tspan, seeds, antithetic=[False, True])
+        # the increments are drawn in the order of a single draw per iteration, whatever the chunk size
+        with mock.patch.object(seirsde, 'NOISE_CHUNK_STEPS', 5):
+            actual = self.solver.run_ensemble(self.tspan, seeds, antithetic=[False, True])
+        np.testing.assert_array_equal(actual['y'], expected['y'])
+
+    def test_iteration_noise(self):
+        seeds, antithetic = iteration_noise(5, 6, antithetic=True)
+        self.assertEqual(antithetic, [False, True] * 3)
+        pairs = iteration_seeds(5, 3)
+        for ii, seed in enumerate(seeds):
+            self.assertEqual(seed.spawn_key, pairs[ii // 2].spawn_key)
+        # the pairs do not depend on how the iterations are split between batches
+        later, later_antithetic = iteration_noise(5, 4, first_iteration=3, antithetic=True)
+        self.assertEqual([seed.spawn_key for seed in later], [seed.spawn_key for seed in seeds[3:]] +
+                         [iteration_seeds(5, 1, 3)[0].spawn_key])
+        self.assertEqual(later_antithetic, [True, False, True, False])
+        seeds, antithetic = iteration_noise(5, 3)
+        self.assertEqual(len({seed.spawn_key for seed in seeds}), 3)
+        self.assertFalse(any(antithetic))
+
+        control_dict = dict(self.params.control_dict, random_seed=None, common_noise=True)
+        self.assertEqual(noise_seed(control_dict), COMMON_NOISE_SEED)
+        self.assertEqual(noise_seed(dict(control_dict, random_seed=7)), 7)
+        self.assertIsNone(noise_seed(dict(control_dict, common_noise=False)))
+
+    def test_antithetic_ensemble(self):
+        seeds = iteration_seeds(5, 1) * 2
+        pair = self.solver.run_ensemble(self.tspan, seeds, antithetic=[False, True])
+        drift = self.solver.run_ensemble(self.tspan, seeds[:1], driftOnly=True)
+        # opposite noise, the pair's mean is closer to the drift than either iteration
+        first_day = pair['y'][1].reshape(2, -1)
+        errors = np.abs(first_day - drift['y'][1].reshape(1, -1)).sum(axis=1)
+        self.assertLess(np.abs(first_day.mean(axis=0) - drift['y'][1].ravel()).sum(), errors.min() / 10)
+        negated = self.solver.run_ensemble(self.tspan, seeds[:1], antithetic=[True])
+        np.testing.assert_allclose(negated['y'][:, 0], pair['y'][:, 1], rtol=0, atol=1e-12)
+
+    def test_common_noise_across_segments(self):
+        warnings.simplefilter("ignore")
+        solver = SEIRSDESolver(self.params)
+        expected = solver.run_model(self.tspan, random_seed=3)
+        # the same hygiene control as two windows splits the integration at day 50, the noise of every day is kept
+        self.params.control_dict['better_hygiene'] = dict(self.params.control_dict['better_hygiene'],
+                                                          timing=[0, 50, 50, 200])
+        actual = SEIRSDESolver(self.params).run_model(self.tspan, random_seed=3)
+        np.testing.assert_allclose(actual['y'], expected['y'], rtol=1e-9, atol=1e-12)
@@ -0,0 +1,40 @@
+import json
+import unittest
+import numpy as np
+from ai4good.models.cm.batched_simulator import BatchedSimulator
+from ai4good.models.cm.simulator import Simulator
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+
+class BatchedSimulatorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        facade = Facade.simple()
+        self.params = create_params(facade.ps, 'compartmental-model', 'custom', user_input_params,
+                                    json.dumps({"numberOfIterations": 4, "ode_engine": "batched"}))
+
+    def test_engine_control(self):
+        self.assertEqual(self.params.control_dict['ode_engine'], 'batched')
+        # execution controls do not change the result id
+        members = create_params(Facade.simple().ps, 'compartmental-model', 'custom', user_input_params,
+                                json.dumps({"numberOfIterations": 4}))
+        self.assertEqual(members.control_dict['ode_engine'], 'members')
+        self.assertEqual(self.params.sha1_hash(), members.sha1_hash())
+
+    def test_matches_member_solver(self):
+        p = self.params
+        t_stop = p.control_dict['t_sim']
+        expected, expected_config = Simulator(p).simulate_over_parameter_range_parallel(
+            4, t_stop, 1, p.generated_disease_vectors)
+        actual, actual_config = BatchedSimulator(p).simulate_over_parameter_range_parallel(
+            4, t_stop, 1, p.generated_disease_vectors)
+
+        self.assertEqual(list(expected.keys()), list(actual.keys()))
+        self.assertEqual(len(expected_config), len(actual_config))
+        for key in expected:
+            np.testing.assert_array_equal(expected[key]['t'], actual[key]['t'])
+            for output in ['y', 'y_plot']:
+                self.assertEqual(expected[key][output].shape, actual[key][output].shape)
+                # agree to within one person
+                self.assertLess(np.abs(expected[key][output] - actual[key][output]).max() * p.population, 1)
@@ -0,0 +1,43 @@
+import unittest
+import warnings
+import numpy as np
+import pandas as pd
+from ai4good.models.cm.calibration import CALIBRATED, Calibration, CandidateEvaluator
+from ai4good.models.cm.disease_sampler import DISEASE_PARAMETERS
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+TRUTH = {'R0': 3.2, 'LatentPeriod': 4.5, 'RemovalPeriod': 6.0, 'HygieneFactor': 0.6}
+
+
+class CalibrationTest(unittest.TestCase):
+    def setUp(self) -> None:
+        warnings.simplefilter("ignore")
+        ps = Facade.simple().ps
+        self.p = create_params(ps, 'compartmental-model', 'better_hygiene_three_month', user_input_params)
+        # observed counts every other day, generated by the model with known parameters
+        sol = CandidateEvaluator(self.p, pd.DataFrame({'Time': [0, 120]})).simulate(TRUTH)
+        days = np.arange(0, 121, 2)
+        self.observed = pd.DataFrame({'Time': days, **{
+            self.p.categories[category]['longname']: np.round(
+                sol['y_plot'][self.p.categories[category]['index']][days] * self.p.population)
+            for category in ['I', 'H', 'D']}})
+
+    def test_calibration(self):
+        calibration = Calibration(self.p, self.observed)
+        truth_loss, = calibration.evaluate(np.array([list(TRUTH.values())]))
+        midpoint_loss, = calibration.evaluate(np.mean([calibration.lower, calibration.upper], axis=0)[None, :])
+
+        fitted = calibration.run(generations=8, population=30, seed=0)
+        self.assertEqual(list(fitted.columns), list(DISEASE_PARAMETERS.keys()) + ['HygieneFactor', 'Loss'])
+        self.assertTrue(fitted['Loss'].is_monotonic_increasing)
+        # the observations are rounded to whole people, so the known parameters do not fit exactly either
+        self.assertLess(fitted['Loss'].iloc[0], truth_loss + 0.05)
+        self.assertLess(fitted['Loss'].iloc[0], midpoint_loss / 10)
+        for name, (lower, upper, _) in CALIBRATED.items():
+            self.assertTrue(fitted[name].between(lower, upper).all())
+
+        with self.assertLogs('ai4good.models.cm.calibration', 'INFO') as logs:
+            calibration.evaluate(np.array([list(TRUTH.values())]))
+        self.assertIn('Evaluated 0 candidates, 1 found in the cache', '\n'.join(logs.output))
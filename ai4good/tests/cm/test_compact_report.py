@@ -0,0 +1,51 @@
+import json
+import pickle
+import unittest
+import numpy as np
+import pandas as pd
+from ai4good.models.cm.compact_report import CompactReport
+from ai4good.models.cm.simulator import generate_csv
+from ai4good.models.model import ModelResult
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+
+class CompactReportTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.params = create_params(Facade.simple().ps, 'compartmental-model', 'custom', user_input_params,
+                                    json.dumps({"numberOfIterations": 3}))
+        t_sim = self.params.control_dict['t_sim'] + 1
+        n_age = self.params.number_compartments * self.params.population_frame.shape[0]
+        rng = np.random.RandomState(0)
+        members = [{'y': rng.rand(n_age, t_sim), 't': np.arange(t_sim, dtype=float),
+                    'y_plot': rng.rand(len(self.params.categories), t_sim)} for _ in range(3)]
+        self.sols_raw = {tuple(rng.rand(6)): member for member in members}
+        self.sols_stochastic = dict(enumerate(members))
+
+    def check(self, sols, input_type):
+        expected = generate_csv(sols, self.params, input_type=input_type)
+        compact = CompactReport.from_solutions(sols, self.params, is_ordinary=input_type == 'raw')
+        self.assertEqual(compact.values.dtype, np.float32)
+        n_variables = len(expected.columns) - 1 - len(compact.key_columns)
+        self.assertEqual(compact.values.shape, (3, len(compact.time), n_variables))
+        self.assertEqual(len(compact.member_params), 3)
+
+        actual = ModelResult('rid', {'report': compact}).get('report')
+        pd.testing.assert_index_equal(expected.columns, actual.columns)
+        np.testing.assert_allclose(actual.values, expected.values, rtol=1e-6)
+        # member parameters and time are exact
+        key_columns = ['Time'] + compact.key_columns
+        pd.testing.assert_frame_equal(expected[key_columns], actual[key_columns], check_exact=True)
+
+        self.assertLess(len(pickle.dumps(compact)) * 2, len(pickle.dumps(expected)))
+
+    def test_raw(self):
+        self.check(self.sols_raw, 'raw')
+
+    def test_stochastic(self):
+        self.check(self.sols_stochastic, 'stochastic')
+
+    def test_model_result_passes_other_values(self):
+        frame = pd.DataFrame({'a': [1.0]})
+        self.assertIs(ModelResult('rid', {'report': frame}).get('report'), frame)
@@ -0,0 +1,46 @@
+import json
+import unittest
+import numpy as np
+from ai4good.models.cm.disease_sampler import DISEASE_PARAMETERS, halton, latin_hypercube, sample_disease_vectors
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+
+class DiseaseSamplerTest(unittest.TestCase):
+    def test_latin_hypercube_strata(self):
+        u = latin_hypercube(20, 3, np.random.default_rng(0))
+        for jj in range(3):
+            # exactly one point in each of the 20 strata of every dimension
+            self.assertEqual(sorted(np.floor(u[:, jj] * 20).astype(int)), list(range(20)))
+
+    def test_halton(self):
+        u = halton(4, 2)
+        np.testing.assert_allclose(u[:, 0], [1 / 2, 1 / 4, 3 / 4, 1 / 8])
+        np.testing.assert_allclose(u[:, 1], [1 / 3, 2 / 3, 1 / 9, 4 / 9])
+
+    def test_sample_disease_vectors(self):
+        for sampler in ['latin-hypercube', 'halton']:
+            vectors = sample_disease_vectors(sampler, 200)
+            self.assertEqual(list(vectors.columns), list(DISEASE_PARAMETERS.keys()))
+            self.assertEqual(len(vectors), 200)
+            self.assertTrue((vectors.to_numpy() > 0).all())
+            self.assertAlmostEqual(vectors.R0.median(), 4, delta=0.1)
+        self.assertTrue(sample_disease_vectors('latin-hypercube', 10, 3).equals(
+            sample_disease_vectors('latin-hypercube', 10, 3)))
+        with self.assertRaises(ValueError):
+            sample_disease_vectors('sobol', 10)
+
+    def test_parameters_design(self):
+        ps = Facade.simple().ps
+        p = create_params(ps, 'compartmental-model', 'custom', user_input_params,
+                          json.dumps({"numberOfIterations": 30, "disease_sampler": "latin-hypercube"}))
+        self.assertEqual(len(p.generated_disease_vectors), 30)
+        p = create_params(ps, 'compartmental-model', 'custom', user_input_params,
+                          json.dumps({"numberOfIterations": 30, "disease_sampler": "halton",
+                                      "disease_design_size": 50}))
+        self.assertEqual(len(p.generated_disease_vectors), 50)
+        file_params = create_params(ps, 'compartmental-model', 'custom', user_input_params,
+                                    json.dumps({"numberOfIterations": 30}))
+        self.assertEqual(len(file_params.generated_disease_vectors), len(ps.get_generated_disease_param_vectors()))
+        self.assertNotEqual(p.sha1_hash(), file_params.sha1_hash())
@@ -0,0 +1,71 @@
+import json
+import unittest
+import numpy as np
+from distributed import Client, LocalCluster
+from ai4good.models.cm.batched_simulator import BatchedSimulator
+from ai4good.models.cm.simulator import Simulator
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+from ai4good.utils.dask_utils import compute_members
+
+
+def simulate(params):
+    # runs the ensemble from inside a task, the way the webapp runs models
+    return Simulator(params).simulate_over_parameter_range_parallel(
+        5, params.control_dict['t_sim'], 1, params.generated_disease_vectors)
+
+
+class Squares:
+    def square(self, x):
+        return x ** 2
+
+
+class DistributedEnsembleTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.cluster = LocalCluster(n_workers=2, threads_per_worker=1, dashboard_address=None)
+        cls.client = Client(cls.cluster)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.client.close()
+        cls.cluster.close()
+
+    def setUp(self) -> None:
+        self.params = create_params(Facade.simple().ps, 'compartmental-model', 'custom', user_input_params,
+                                    json.dumps({"numberOfIterations": 5}))
+        self.params.control_dict['members_per_task'] = 2
+
+    def run_ensemble(self, simulator_class, scheduler):
+        self.params.control_dict['scheduler'] = scheduler
+        return simulator_class(self.params).simulate_over_parameter_range_parallel(
+            5, self.params.control_dict['t_sim'], 1, self.params.generated_disease_vectors)
+
+    def assert_same_ensemble(self, expected, actual, atol=0):
+        expected_sols, expected_config = expected
+        actual_sols, actual_config = actual
+        self.assertEqual(expected_config, actual_config)
+        self.assertEqual(list(expected_sols.keys()), list(actual_sols.keys()))
+        for key in expected_sols:
+            for output in ['y', 't', 'y_plot']:
+                np.testing.assert_allclose(expected_sols[key][output], actual_sols[key][output], rtol=0, atol=atol)
+
+    def test_compute_members_order(self):
+        member_kwargs = [dict(x=i) for i in range(7)]
+        for scheduler in ['single-threaded', 'distributed']:
+            self.assertEqual(compute_members(Squares(), 'square', member_kwargs, scheduler, 3), [i ** 2 for i in range(7)])
+
+    def test_simulator(self):
+        self.assert_same_ensemble(self.run_ensemble(Simulator, 'single-threaded'),
+                                  self.run_ensemble(Simulator, 'distributed'))
+
+    def test_batched_simulator(self):
+        # the solver steps depend on which members are batched together, so only agree to within one person
+        self.assert_same_ensemble(self.run_ensemble(BatchedSimulator, 'single-threaded'),
+                                  self.run_ensemble(BatchedSimulator, 'distributed'), atol=1 / self.params.population)
+
+    def test_from_worker(self):
+        expected = self.run_ensemble(Simulator, 'single-threaded')
+        self.params.control_dict['scheduler'] = 'distributed'
+        self.assert_same_ensemble(expected, self.client.submit(simulate, self.params).result())
@@ -0,0 +1,60 @@
+import json
+import unittest
+import warnings
+import numpy as np
+from ai4good.models.cm.cm_model import CompartmentalModel
+from ai4good.models.cm.emulator import FEATURE_BOUNDS, control_features, control_overrides, output_quartiles, \
+    predict_or_run, train_emulator
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+OVERRIDES = {"numberOfIterations": 3, "ode_engine": "batched", "t_sim": 100}
+
+
+class EmulatorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        warnings.simplefilter("ignore")
+        self.ps = Facade.simple().ps
+
+    def create_params(self, profile, overrides=None):
+        return create_params(self.ps, 'compartmental-model', profile, user_input_params,
+                             json.dumps({**OVERRIDES, **(overrides or {})}))
+
+    def test_control_features(self):
+        p = self.create_params('baseline')
+        # no control in place: ICU beds, then neutral hygiene and removal rates without timing
+        np.testing.assert_allclose(control_features(p), [6, 1, 0, 0, 0, 0, 0, 0, 0, 0])
+        features = control_features(self.create_params('combined_hygiene_symptomatic_high_risk'))
+        np.testing.assert_allclose(features, [6, 0.7, 0, 60, 5, 0, 30, 5, 0, 30])
+
+        round_trip = self.create_params('baseline', control_overrides(features, p))
+        np.testing.assert_allclose(control_features(round_trip), features)
+        self.assertEqual(len(features), len(FEATURE_BOUNDS))
+
+    def test_predict_or_run(self):
+        emulator = train_emulator(self.ps, user_input_params, 'baseline', 12, OVERRIDES)
+        model = CompartmentalModel(self.ps)
+
+        p = self.create_params('better_hygiene_one_month')
+        self.assertTrue(emulator.in_distribution(p))
+        prediction = predict_or_run(emulator, model, p)
+        self.assertTrue(prediction['emulated'])
+        self.assertIsNone(prediction['result'])
+        self.assertEqual(list(prediction['quartiles'].index), ['Peak symptomatic', 'Peak critical', 'Deaths'])
+        self.assertTrue(np.isfinite(prediction['quartiles'][['25%', '75%']].to_numpy()).all())
+
+        # a camp parameter the emulator was not trained on, and a control beyond the training design
+        for overrides in [{"t_sim": 90}, {"ICU_capacity": {"value": 500 / p.population}}]:
+            p = self.create_params('better_hygiene_one_month', overrides)
+            self.assertFalse(emulator.in_distribution(p))
+            result = predict_or_run(emulator, model, p)
+            self.assertFalse(result['emulated'])
+            self.assertEqual(result['result'].rid, p.sha1_hash())
+            self.assertTrue((result['quartiles']['75%'] >= result['quartiles']['25%']).all())
+            # read from the materialized report, the same as from its compact summary block
+            compact = result['result'].result_data['report']
+            sols_raw = {ii: {'y_plot': compact.values[ii, :, len(compact.age_columns):].T.astype(float)}
+                        for ii in range(compact.values.shape[0])}
+            np.testing.assert_allclose(result['quartiles'][['25%', '75%']].to_numpy().ravel(),
+                                       output_quartiles(sols_raw, p))
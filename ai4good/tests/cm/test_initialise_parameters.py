@@ -1,10 +1,12 @@
 import os
+import tempfile
 import unittest
 import numpy as np
 import pandas as pd
 from ai4good.models.cm.cm_model import CompartmentalModel
 from ai4good.runner.facade import Facade
-from ai4good.models.cm.initialise_parameters import Parameters
+from ai4good.models.cm.initialise_parameters import Parameters, contact_matrix_by_age
+from ai4good.utils.file_cache import read_csv_cached
 
 
 # Set a default user input for debugging purposes:
@@ -73,3 +75,33 @@ class InitialiseParameters(unittest.TestCase):
 
         actual = pd.DataFrame(params.infection_matrix)
         self.assertTrue(np.allclose(expected.values, actual.values))
+
+    def test_contact_matrix_by_age(self):
+        contact_matrix = np.random.RandomState(0).rand(16, 16)
+        population = np.random.RandomState(1).rand(8) * 20
+        age_limits = np.array([0, 10, 20, 30, 40, 50, 60, 70, 80])
+        expected = np.zeros((8, 8))
+        for i in range(8):
+            for j in range(8):
+                # two 5 year bands per group, the group population split evenly between them
+                block = contact_matrix[2 * i:2 * i + 2, 2 * j:2 * j + 2]
+                expected[i, j] = block.sum() / 2
+        np.testing.assert_allclose(contact_matrix_by_age(contact_matrix, population, age_limits), expected)
+
+    def test_infection_matrix_not_shared(self):
+        first = Parameters(self.facade.ps, user_input_params, self.profile_df, {})
+        expected = first.infection_matrix.copy()
+        first.infection_matrix[:] = 0
+        second = Parameters(self.facade.ps, user_input_params, self.profile_df, {})
+        np.testing.assert_array_equal(second.infection_matrix, expected)
+        self.assertEqual(first.largest_eigenvalue, second.largest_eigenvalue)
+
+    def test_read_csv_cached(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'frame.csv')
+            pd.DataFrame({'a': [1, 2]}).to_csv(path, index=False)
+            frame = read_csv_cached(path)
+            frame['a'] = 0  # callers get their own copy
+            self.assertEqual(read_csv_cached(path)['a'].tolist(), [1, 2])
+            pd.DataFrame({'a': [1, 2, 3]}).to_csv(path, index=False)
+            self.assertEqual(read_csv_cached(path)['a'].tolist(), [1, 2, 3])
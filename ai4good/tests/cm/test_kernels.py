@@ -0,0 +1,74 @@
+import json
+import unittest
+import numpy as np
+from ai4good.models.cm import kernels
+from ai4good.models.cm.simulator import Simulator
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+
+class KernelsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.params = create_params(Facade.simple().ps, 'compartmental-model', 'custom', user_input_params,
+                                    json.dumps({"numberOfIterations": 2}))
+        population_frame = self.params.population_frame
+        self.age_categories = int(population_frame.shape[0])
+        self.probs = (np.asarray(population_frame.p_symptomatic),
+                      np.asarray(population_frame.p_hosp_given_symptomatic),
+                      np.asarray(population_frame.p_critical_given_hospitalised))
+        self.rates = (0.3, 0.2, 0.15, 0.1, 0.12, 0.3)
+
+    def kernel_args(self):
+        p = self.params
+        return (p.infection_matrix, *self.probs, *self.rates, p.quarant_rate, p.AsymptInfectiousFactor,
+                p.death_prob_with_ICU, p.control_dict['ICU_capacity']['value'],
+                self.age_categories - p.control_dict['remove_high_risk']['n_categories_removed'])
+
+    def states(self):
+        rng = np.random.RandomState(42)
+        n = self.age_categories * self.params.number_compartments
+        # large states leave the removal and ICU caps inactive, small states make them bind
+        return [rng.rand(n) * 1e-2, rng.rand(n) * 1e-5]
+
+    def test_in_window(self):
+        timing = np.array([0., 10., 20., 30.])
+        for t in [-1, 0, 5, 10, 15, 20, 29.9, 30, 40]:
+            self.assertEqual(kernels.in_window(t, timing), t in [0, 5, 20, 29.9])
+
+    def test_rhs_matches_python(self):
+        p = self.params
+        cd = p.control_dict
+        sim = Simulator(p)
+        controls = sim.compiled_controls()
+        for y in self.states():
+            for t in [0., 20., 50., 150.]:
+                expected = sim.ode_system2d(t, y, p.infection_matrix, self.age_categories, *self.probs, *self.rates,
+                                            cd['better_hygiene'], cd['remove_symptomatic'], cd['remove_high_risk'],
+                                            cd['ICU_capacity'])
+                actual = kernels.ode_rhs(y, *self.kernel_args(), *kernels.control_flags(t, *controls))
+                np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-20)
+
+    def test_jacobian_matches_finite_differences(self):
+        controls = Simulator(self.params).compiled_controls()
+        args = self.kernel_args()
+        for y in self.states():
+            for t in [0., 50., 150.]:
+                flags = kernels.control_flags(t, *controls)
+                jac = kernels.ode_jacobian(y, *args, *flags)
+                eps = 1e-4 * np.abs(y).min()
+                numeric = np.zeros(jac.shape)
+                for j in range(len(y)):
+                    step = np.zeros(len(y))
+                    step[j] = eps
+                    numeric[:, j] = (kernels.ode_rhs(y + step, *args, *flags) -
+                                     kernels.ode_rhs(y - step, *args, *flags)) / (2 * eps)
+                np.testing.assert_allclose(jac, numeric, rtol=1e-5, atol=1e-8)
+
+    def test_stiff_solver(self):
+        sim = Simulator(self.params)
+        adams = sim.run_model(200, *self.rates)
+        self.params.control_dict['ode_solver'] = 'bdf'
+        bdf = sim.run_model(200, *self.rates)
+        # agree to within one person
+        self.assertLess(np.abs(adams['y'] - bdf['y']).max() * self.params.population, 1)
@@ -0,0 +1,45 @@
+import json
+import unittest
+import warnings
+import numpy as np
+from ai4good.models.cm import member_cache
+from ai4good.models.cm.cm_model import CompartmentalModel
+from ai4good.models.cm.member_cache import MemberCache
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+
+class MemberCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        warnings.simplefilter("ignore")
+        self.ps = Facade.simple().ps
+        member_cache._caches['memory'] = MemberCache()
+
+    def simulate(self, overrides):
+        p = create_params(self.ps, 'compartmental-model', 'baseline', user_input_params,
+                          json.dumps({"ode_engine": "batched", **overrides}))
+        with self.assertLogs('ai4good.models.cm.member_cache', 'INFO') as logs:
+            config_dict, sols_raw = CompartmentalModel(self.ps).simulate(p)
+        return p, config_dict, sols_raw, logs.output[0]
+
+    def test_extends_ensemble(self):
+        p, _, _, log = self.simulate({"numberOfIterations": 4, "member_cache": "memory"})
+        self.assertIn('0 of 4 ensemble members found', log)
+        p8, config_dict, sols_raw, log = self.simulate({"numberOfIterations": 8, "member_cache": "memory"})
+        self.assertIn('4 of 8 ensemble members found', log)
+        self.assertEqual(p.member_hash(), p8.member_hash())
+        self.assertNotEqual(p.sha1_hash(), p8.sha1_hash())
+
+        expected_config, expected = CompartmentalModel(self.ps).simulate(
+            create_params(self.ps, 'compartmental-model', 'baseline', user_input_params,
+                          json.dumps({"numberOfIterations": 8, "ode_engine": "batched"})))
+        self.assertEqual(list(sols_raw.keys()), list(expected.keys()))
+        self.assertEqual(config_dict, expected_config)
+        for key in expected:
+            np.testing.assert_allclose(sols_raw[key]['y'], expected[key]['y'], rtol=1e-4, atol=1e-9)
+
+    def test_other_run_misses(self):
+        self.simulate({"numberOfIterations": 3, "member_cache": "memory"})
+        _, _, _, log = self.simulate({"numberOfIterations": 3, "member_cache": "memory", "t_sim": 100})
+        self.assertIn('0 of 3 ensemble members found', log)
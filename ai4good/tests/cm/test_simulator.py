@@ -0,0 +1,117 @@
+import json
+import statistics
+import unittest
+import numpy as np
+from scipy.integrate import ode
+from ai4good.models.cm.seirsde import SEIRSDESolver, equally_spaced_pieces
+from ai4good.models.cm.simulator import Simulator, control_timeline, generate_csv
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+
+class SegmentedIntegrationTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.params = create_params(Facade.simple().ps, 'compartmental-model', 'custom', user_input_params,
+                                    json.dumps({"numberOfIterations": 2}))
+        self.rates = (0.3, 0.2, 0.15, 0.1, 0.12, 0.3)
+
+    def test_control_timeline(self):
+        control_dict = self.params.control_dict
+        control_dict['better_hygiene']['timing'] = [0, 250]
+        control_dict['remove_symptomatic']['timing'] = [30, 90]
+        control_dict['remove_high_risk']['timing'] = [12.5, 30, 150, 180]
+        self.assertEqual(control_timeline(control_dict, 0, 200), [0, 12.5, 30, 90, 150, 180, 200])
+        self.assertEqual(control_timeline(control_dict, 100, 200), [100, 150, 180, 200])
+
+    def test_run_model_accuracy(self):
+        p = self.params
+        cd = p.control_dict
+        population_frame = p.population_frame
+        age_categories = int(population_frame.shape[0])
+        actual = Simulator(p).run_model(200, *self.rates)
+
+        # tightly integrated reference using the python right hand side
+        reference = ode(Simulator(p).ode_system2d).set_f_params(
+            p.infection_matrix, age_categories, np.asarray(population_frame.p_symptomatic),
+            np.asarray(population_frame.p_hosp_given_symptomatic),
+            np.asarray(population_frame.p_critical_given_hospitalised), *self.rates,
+            cd['better_hygiene'], cd['remove_symptomatic'], cd['remove_high_risk'], cd['ICU_capacity']
+        ).set_integrator('vode', nsteps=100000, rtol=1e-10, atol=1e-14)
+        reference.set_initial_value(actual['y'][:, 0], 0)
+        for i, t in enumerate(actual['t'][1:], start=1):
+            reference.integrate(t)
+            self.assertLess(np.abs(reference.y - actual['y'][:, i]).max() * p.population, 1)
+
+    def test_equally_spaced_pieces(self):
+        pieces = equally_spaced_pieces(np.array([0., 1., 2., 2.5, 3., 4., 5.]))
+        self.assertEqual([list(piece) for piece in pieces], [[0, 1, 2], [2, 2.5, 3], [3, 4, 5]])
+
+    def test_sde_segments(self):
+        self.params.control_dict['remove_high_risk']['timing'] = [0, 12.5]
+        solver = SEIRSDESolver(self.params)
+        tspan = np.linspace(0, 100, 101)
+        result = solver.run_model(tspan, random_seed=1)
+        self.assertEqual(result['y'].shape, (len(solver.y0), len(tspan)))
+        np.testing.assert_array_equal(result['y'][:, 0], solver.y0)
+        self.assertTrue(np.all(np.isfinite(result['y'])))
+        self.assertIsNone(solver.segment_controls)
+
+    def test_sde_seeding(self):
+        solver = SEIRSDESolver(self.params)
+        sols, _ = solver.simulate_over_parameter_range_parallel(2, 50, 1, random_seed=11)
+        again, _ = solver.simulate_over_parameter_range_parallel(2, 50, 1, random_seed=11)
+        # every iteration has its own stream, and a seed reproduces all of them
+        self.assertFalse(np.allclose(sols[0]['y'], sols[1]['y']))
+        for ii in range(2):
+            np.testing.assert_array_equal(sols[ii]['y'], again[ii]['y'])
+
+    def test_sde_percentiles(self):
+        rng = np.random.RandomState(0)
+        sols = [{'y_plot': rng.rand(len(self.params.categories), 11)} for _ in range(7)]
+        actual = SEIRSDESolver(self.params).generate_percentiles(sols)
+        for k, name in enumerate(self.params.categories.keys()):
+            for i in range(11):
+                values = [sol['y_plot'][k, i] for sol in sols]
+                expected = [np.percentile(values, q) for q in [97.5, 75, 25, 2.5]] + [statistics.median(values)]
+                np.testing.assert_allclose([y[k, i] for y in actual], expected)
+
+
+class GenerateCsvTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.params = create_params(Facade.simple().ps, 'compartmental-model', 'custom', user_input_params,
+                                    json.dumps({"numberOfIterations": 3}))
+        self.t_sim = self.params.control_dict['t_sim'] + 1
+        n_age = self.params.number_compartments * self.params.population_frame.shape[0]
+        rng = np.random.RandomState(0)
+        self.members = [{'y': rng.rand(n_age, self.t_sim), 't': np.arange(self.t_sim, dtype=float),
+                         'y_plot': rng.rand(len(self.params.categories), self.t_sim)} for _ in range(3)]
+
+    def check_member(self, report, ii, member, n_age):
+        rows = report.iloc[ii * self.t_sim:(ii + 1) * self.t_sim]
+        np.testing.assert_array_equal(rows.iloc[:, :n_age].values, member['y'].T)
+        np.testing.assert_array_equal(rows['Time'].values, member['t'])
+        np.testing.assert_array_equal(rows.iloc[:, n_age + 1:n_age + 1 + len(self.params.categories)].values,
+                                      member['y_plot'].T)
+
+    def test_raw(self):
+        keys = [tuple(np.random.RandomState(ii).rand(6)) for ii in range(3)]
+        report = generate_csv(dict(zip(keys, self.members)), self.params, input_type='raw')
+        n_age = self.members[0]['y'].shape[0]
+        self.assertEqual(report.shape, (3 * self.t_sim, n_age + 1 + len(self.params.categories) + 6))
+        self.assertEqual(report.columns[0], 'Susceptible: 0-9')
+        self.assertEqual(list(report.columns[-6:]),
+                         ['R0', 'latentRate', 'removalRate', 'hospRate', 'deathRateICU', 'deathRateNoIcu'])
+        for ii, (key, member) in enumerate(zip(keys, self.members)):
+            self.check_member(report, ii, member, n_age)
+            rows = report.iloc[ii * self.t_sim:(ii + 1) * self.t_sim]
+            np.testing.assert_array_equal(rows.iloc[:, -6:].values, np.tile(key, (self.t_sim, 1)))
+
+    def test_stochastic(self):
+        report = generate_csv(dict(enumerate(self.members)), self.params, input_type='stochastic')
+        n_age = self.members[0]['y'].shape[0]
+        self.assertEqual(report.columns[-1], 'iteration')
+        self.assertTrue((report.dtypes == float).all())
+        for ii, member in enumerate(self.members):
+            self.check_member(report, ii, member, n_age)
+            self.assertTrue((report['iteration'].iloc[ii * self.t_sim:(ii + 1) * self.t_sim] == ii).all())
@@ -0,0 +1,36 @@
+import json
+import unittest
+import pandas.testing as pdt
+from ai4good.models.cm.batched_simulator import BatchedSimulator
+from ai4good.models.cm.compact_report import CompactReport
+from ai4good.models.cm.summary_tables import summary_tables
+from ai4good.models.model_registry import create_params
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+from ai4good.webapp.cm_model_report_utils import normalize_report, prevalence_age_table, prevalence_all_table, \
+    cumulative_all_table, cumulative_age_table
+
+
+class SummaryTablesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.params = create_params(Facade.simple().ps, 'compartmental-model', 'custom', user_input_params,
+                                   json.dumps({"numberOfIterations": 20}))
+        cls.sols_raw, _ = BatchedSimulator(cls.params).simulate_over_parameter_range_parallel(
+            20, cls.params.control_dict['t_sim'], 1, cls.params.generated_disease_vectors)
+
+    def assert_same_tables(self, report):
+        p = self.params
+        df = normalize_report(report.materialize(), p)
+        tables = summary_tables(report, p)
+        pdt.assert_frame_equal(prevalence_all_table(df), tables['prevalence_all'])
+        pdt.assert_frame_equal(prevalence_age_table(df), tables['prevalence_age'])
+        pdt.assert_frame_equal(cumulative_all_table(df, p.population, p.population_frame), tables['cumulative_all'])
+        pdt.assert_frame_equal(cumulative_age_table(df, p.population_frame), tables['cumulative_age'])
+
+    def test_raw(self):
+        self.assert_same_tables(CompactReport.from_solutions(self.sols_raw, self.params, is_ordinary=True))
+
+    def test_stochastic(self):
+        sols = dict(enumerate(self.sols_raw.values()))
+        self.assert_same_tables(CompactReport.from_solutions(sols, self.params, is_ordinary=False))
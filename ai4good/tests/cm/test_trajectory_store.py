@@ -0,0 +1,109 @@
+import json
+import unittest
+import warnings
+from unittest import mock
+from typing import Any, List
+import numpy as np
+from ai4good.models.cm.batched_simulator import BatchedSimulator
+from ai4good.models.cm.trajectory_store import TrajectoryStore, control_segments, divergence_time
+from ai4good.models.cm import trajectory_store
+from ai4good.models.model_registry import create_params
+from ai4good.models.model_result_store import ModelResultStore
+from ai4good.runner.facade import Facade
+from ai4good.runner.tests import user_input_params
+
+
+class DictResultStore(ModelResultStore):
+    # in memory, with the file names of SimpleModelResultStore for list
+    def __init__(self):
+        self.objects = {}
+
+    def store(self, model_id: str, result_id: str, obj: Any):
+        self.objects[f"{model_id}_{result_id}.pkl"] = obj
+
+    def load(self, model_id: str, result_id: str) -> Any:
+        return self.objects[f"{model_id}_{result_id}.pkl"]
+
+    def exists(self, model_id: str, result_id: str) -> bool:
+        return f"{model_id}_{result_id}.pkl" in self.objects
+
+    def list(self, model_id: str) -> List[str]:
+        return [name for name in self.objects if name.startswith(f"{model_id}_")]
+
+    def remove(self, model_id: str, result_id: str):
+        self.objects.pop(f"{model_id}_{result_id}.pkl", None)
+
+    def remove_all(self, model_id: str):
+        self.objects = {name: obj for name, obj in self.objects.items() if not name.startswith(f"{model_id}_")}
+
+
+class TrajectoryStoreTest(unittest.TestCase):
+    def test_divergence_time(self):
+        one_month = control_segments(lambda t: (0.7 if t < 30 else 1.0, 0., 0.), [0, 30, 200])
+        three_month = control_segments(lambda t: (0.7 if t < 90 else 1.0, 0., 0.), [0, 90, 200])
+        always = control_segments(lambda t: (0.7, 0., 0.), [0, 100, 200])
+        self.assertEqual(always, [(0., (0.7, 0., 0.))])
+        self.assertEqual(divergence_time(one_month, three_month), 30)
+        self.assertEqual(divergence_time(three_month, always), 90)
+        self.assertEqual(divergence_time(always, always), np.inf)
+
+    def test_branch_point(self):
+        store = TrajectoryStore(DictResultStore())
+        tim = np.arange(11.)
+        segments = [(0., (0.7, 0., 0.)), (8., (1., 0., 0.))]
+        self.assertEqual(store.branch_point('key', segments, tim), (0, None))
+        y_out = np.arange(22.).reshape(11, 2)
+        # a run without control switches has no checkpoint, one switching at t=4 is kept up to there
+        store.add('key', [(0., (0.7, 0., 0.))], tim, y_out)
+        self.assertEqual(store.branch_point('key', segments, tim), (0, None))
+        store.add('key', [(0., (0.7, 0., 0.)), (4., (0.9, 0., 0.))], tim, y_out)
+        self.assertEqual(len(store.rs.objects), 2)
+        self.assertEqual(store.rs.objects[store.rs.list('cm-trajectory')[0]].shape, (5, 2))
+        index, states = store.branch_point('key', segments, tim)
+        self.assertEqual(index, 4)
+        np.testing.assert_array_equal(states, y_out[:5])
+        self.assertEqual(store.branch_point('other key', segments, tim), (0, None))
+        # the checkpoint is after the controls diverge
+        self.assertEqual(store.branch_point('key', [(0., (0.7, 0., 0.)), (2., (1., 0., 0.))], tim), (0, None))
+
+        # found through the result store by another process
+        other_process = TrajectoryStore(store.rs)
+        index, states = other_process.branch_point('key', segments, tim)
+        self.assertEqual(index, 4)
+        np.testing.assert_array_equal(states, y_out[:5])
+
+    def test_eviction(self):
+        store = TrajectoryStore(DictResultStore())
+        tim = np.arange(11.)
+        y_out = np.zeros((11, 100))
+        with mock.patch.object(trajectory_store, 'MAX_TRAJECTORY_BYTES', 2 * 6 * 800), \
+                mock.patch.object(trajectory_store, 'MAX_STORED_TRAJECTORY_BYTES', 3 * 6 * 800):
+            for t in [5., 6., 7., 8.]:
+                store.add('key', [(0., (0.7, 0., 0.)), (t, (1., 0., 0.))], tim, y_out)
+        # the oldest runs are dropped from memory and removed from the result store first
+        self.assertEqual([segments[1][0] for segments, _, _ in store._trajectories.values()], [8.])
+        self.assertEqual(len(store.rs.list('cm-trajectory')), 2)
+        self.assertEqual(len(store.rs.list('cm-trajectory-index')), 2)
+        other_process = TrajectoryStore(store.rs)
+        self.assertEqual(other_process.branch_point('key', [(0., (0.7, 0., 0.)), (9., (1., 0., 0.))], tim)[0], 8)
+        self.assertEqual(other_process.branch_point('key', [(0., (0.7, 0., 0.)), (7.5, (1., 0., 0.))], tim)[0], 7)
+        self.assertEqual(other_process.branch_point('key', [(0., (0.7, 0., 0.)), (6., (1., 0., 0.))], tim)[0], 0)
+
+    def test_warm_start_matches_cold_start(self):
+        warnings.simplefilter("ignore")
+        ps = Facade.simple().ps
+        trajectory_store._stores['memory'] = TrajectoryStore()
+
+        def run(profile, warm_start):
+            p = create_params(ps, 'compartmental-model', profile, user_input_params,
+                              json.dumps({"numberOfIterations": 5, "ode_engine": "batched", "warm_start": warm_start}))
+            sols_raw, _ = BatchedSimulator(p).simulate_over_parameter_range_parallel(
+                5, p.control_dict['t_sim'], 1, p.generated_disease_vectors)
+            return np.stack([sol['y'] for sol in sols_raw.values()])
+
+        run('better_hygiene_one_month', 'memory')
+        with self.assertLogs('ai4good.models.cm.batched_simulator', 'INFO') as logs:
+            warm = run('better_hygiene_three_month', 'memory')
+        self.assertIn('Branching from a stored trajectory at t=30.0', '\n'.join(logs.output))
+        # the branched run restarts the solver at t=30, the cold one does not, so they agree to the solver tolerance
+        np.testing.assert_allclose(warm, run('better_hygiene_three_month', 'off'), rtol=1e-5, atol=1e-6)
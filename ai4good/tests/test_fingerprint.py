@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+import pandas as pd
+from ai4good.utils.fingerprint import fingerprint
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_float_rounding(self):
+        values = np.random.RandomState(0).rand(50) * 100
+        # the last bits of a computed value do not change the digest, any real change does
+        self.assertEqual(fingerprint(values), fingerprint(values * (1 + 1e-15)))
+        self.assertEqual(fingerprint(0.1 + 0.2), fingerprint(0.3))
+        # including sums that land just below a power of two
+        self.assertEqual(fingerprint(sum([0.1] * 10)), fingerprint(1.0))
+        self.assertEqual(fingerprint(0.9999999999999999), fingerprint(1.0))
+        self.assertEqual(fingerprint(-0.9999999999999999), fingerprint(-1.0))
+        self.assertEqual(fingerprint(np.array([sum([0.1] * 10), 0.49999999999999994, -1.9999999999999998])),
+                         fingerprint(np.array([1.0, 0.5, -2.0])))
+        self.assertEqual(fingerprint(np.array([0.9999999999999999, np.nan])), fingerprint(np.array([1.0, np.nan])))
+        self.assertNotEqual(fingerprint(values), fingerprint(values * (1 + 1e-9)))
+        self.assertEqual(fingerprint(0.0), fingerprint(-0.0))
+        self.assertEqual(fingerprint(np.array([np.nan, 1.0])), fingerprint(np.array([-np.nan, 1.0])))
+
+    def test_structure(self):
+        self.assertEqual(fingerprint({'a': 1, 'b': [2.5, 'x']}), fingerprint({'b': [2.5, 'x'], 'a': 1}))
+        self.assertNotEqual(fingerprint([1, 2], 3), fingerprint([1], 2, 3))
+        self.assertNotEqual(fingerprint('1'), fingerprint(1))
+        self.assertNotEqual(fingerprint(1), fingerprint(1.0))
+        self.assertNotEqual(fingerprint(None), fingerprint(False))
+        self.assertNotEqual(fingerprint(np.zeros((2, 3))), fingerprint(np.zeros((3, 2))))
+
+    def test_frame(self):
+        frame = pd.DataFrame({'Age': ['0-9', '10-19'], 'value': [0.25, 0.75], 'count': [1, 2]})
+        self.assertEqual(fingerprint(frame), fingerprint(frame.copy()))
+        self.assertNotEqual(fingerprint(frame), fingerprint(frame.rename(columns={'value': 'other'})))
+        changed = frame.copy()
+        changed.loc[1, 'count'] = 3
+        self.assertNotEqual(fingerprint(frame), fingerprint(changed))
+        with self.assertRaises(TypeError):
+            fingerprint(object())
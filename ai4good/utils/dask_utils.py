@@ -0,0 +1,64 @@
+import contextlib
+
+import dask
+from dask.diagnostics import ProgressBar
+from distributed import get_client, get_worker, worker_client
+
+from ai4good.utils.logger_util import get_logger
+
+logger = get_logger(__name__)
+
+
+@contextlib.contextmanager
+def active_client():
+    """
+    The distributed client to submit work to, or None if there is none. When called from inside a task the worker
+    gives up its thread slot while the context is open, so the submitted tasks can also run on it.
+    """
+    try:
+        get_worker()
+        in_worker = True
+    except ValueError:
+        in_worker = False
+
+    if in_worker:
+        with worker_client() as client:
+            yield client
+    else:
+        try:
+            client = get_client()
+        except ValueError:
+            client = None
+        yield client
+
+
+def _run_members(model, method, member_kwargs):
+    run = getattr(model, method)
+    return [run(**kwargs) for kwargs in member_kwargs]
+
+
+def compute_members(model, method, member_kwargs, scheduler='single-threaded', members_per_task=10):
+    """
+    Call model.<method>(**kwargs) for every entry of member_kwargs and return the results in the same order.
+
+    With scheduler='distributed' the members are submitted to the active distributed client in chunks of
+    members_per_task, so a single run is spread over the whole cluster. Otherwise, or if there is no client, the
+    members are computed one after the other in this process.
+    """
+    if scheduler == 'distributed':
+        with active_client() as client:
+            if client is not None:
+                logger.info(f"Submitting {len(member_kwargs)} ensemble members in chunks of {members_per_task}")
+                model_future = client.scatter(model)
+                futures = [client.submit(_run_members, model_future, method,
+                                         member_kwargs[i:i + members_per_task], pure=False)
+                           for i in range(0, len(member_kwargs), members_per_task)]
+                return [result for chunk in client.gather(futures) for result in chunk]
+            logger.warning("No distributed client found, computing ensemble members in process")
+
+    run = getattr(model, method)
+    lazy_results = [dask.delayed(run)(**kwargs) for kwargs in member_kwargs]
+    #with dask.config.set(scheduler='processes', num_workers=n_processes): --Does not work with Dask Distributed
+    with dask.config.set(scheduler='single-threaded', num_workers=1):
+        with ProgressBar():
+            return list(dask.compute(*lazy_results))
@@ -0,0 +1,28 @@
+import os
+import threading
+
+import pandas as pd
+
+_lock = threading.Lock()
+_frames = {}
+
+
+def file_version(path: str) -> tuple:
+    # changes whenever the file is rewritten
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_csv_cached(path: str) -> pd.DataFrame:
+    """
+    pd.read_csv(path), read once per process and again only when the file changes (modification time or size).
+    Returns a copy, so the caller is free to modify it.
+    """
+    version = file_version(path)
+    with _lock:
+        cached = _frames.get(path)
+    if cached is None or cached[0] != version:
+        cached = (version, pd.read_csv(path))
+        with _lock:
+            _frames[path] = cached
+    return cached[1].copy()
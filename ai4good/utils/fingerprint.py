@@ -0,0 +1,93 @@
+import hashlib
+import math
+import numbers
+
+import numpy as np
+import pandas as pd
+
+MANTISSA_BITS = 40  # floats are compared to about 12 significant digits
+
+
+def fingerprint(*values) -> str:
+    """
+    sha1 hex digest of values, which may be nested dicts, lists and tuples of scalars, strings, numpy arrays and
+    DataFrames. Arrays and numeric columns are hashed from their buffers rather than serialized, and floats are
+    rounded to MANTISSA_BITS bits first, so the last bits of a computed value (or the way it is printed) do not
+    change the digest. Dict keys are sorted, so the digest does not depend on insertion order.
+    """
+    digest = hashlib.sha1()
+    _update(digest, list(values))
+    return digest.hexdigest()
+
+
+def canonical_floats(values) -> np.ndarray:
+    # binary mantissa rounded to MANTISSA_BITS bits and exponent, with -0.0 and all NaNs mapped to single values
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values)
+    all_finite = finite.all()
+    mantissa, exponent = np.frexp(values if all_finite else np.where(finite, values, 0.0))
+    mantissa = np.round(np.ldexp(mantissa, MANTISSA_BITS)).astype(np.int64)
+    exponent = exponent.astype(np.int64)
+    # a mantissa rounded up to the next power of two is renormalized, so 0.9999999999999999 matches 1.0
+    carry = np.abs(mantissa) == 1 << MANTISSA_BITS
+    mantissa = np.where(carry, mantissa // 2, mantissa)
+    exponent += carry
+    if not all_finite:
+        # infinities and NaN get an exponent no finite value has
+        mantissa[~finite] = np.sign(np.nan_to_num(values[~finite]))
+        exponent[~finite] = np.iinfo(np.int32).max
+    return np.stack([mantissa, exponent], axis=-1)
+
+
+def _canonical_float(value: float) -> tuple:
+    # scalar version of canonical_floats
+    if not math.isfinite(value):
+        return (0 if math.isnan(value) else int(math.copysign(1, value))), np.iinfo(np.int32).max
+    mantissa, exponent = math.frexp(value)
+    rounded = int(round(math.ldexp(mantissa, MANTISSA_BITS)))
+    if abs(rounded) == 1 << MANTISSA_BITS:
+        rounded, exponent = rounded // 2, exponent + 1
+    return rounded, (exponent if mantissa else 0)
+
+
+def _update(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(b'frame%d' % len(value))
+        _update(digest, [str(column) for column in value.columns])
+        for column in value.columns:
+            _update(digest, value[column].to_numpy())
+    elif isinstance(value, pd.Series):
+        _update(digest, value.to_numpy())
+    elif isinstance(value, np.ndarray):
+        if value.dtype.kind in 'fc':
+            digest.update(b'floats' + repr(value.shape).encode())
+            parts = [value.real, value.imag] if value.dtype.kind == 'c' else [value]
+            for part in parts:
+                digest.update(np.ascontiguousarray(canonical_floats(part)).tobytes())
+        elif value.dtype.kind in 'biu':
+            digest.update(b'ints' + repr(value.shape).encode())
+            digest.update(np.ascontiguousarray(value, dtype=np.int64).tobytes())
+        else:
+            _update(digest, value.tolist())
+    elif isinstance(value, dict):
+        digest.update(b'dict%d' % len(value))
+        for key in sorted(value, key=str):
+            _update(digest, str(key))
+            _update(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'list%d' % len(value))
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, (bool, np.bool_)) or value is None:
+        digest.update(b'const' + repr(None if value is None else bool(value)).encode())
+    elif isinstance(value, numbers.Integral):
+        digest.update(b'int' + str(int(value)).encode())
+    elif isinstance(value, numbers.Real):
+        digest.update(b'float%d,%d' % _canonical_float(float(value)))
+    elif isinstance(value, numbers.Complex):
+        _update(digest, np.array([value]))
+    elif isinstance(value, str):
+        encoded = value.encode('UTF-8')
+        digest.update(b'str%d:' % len(encoded) + encoded)
+    else:
+        raise TypeError(f'Cannot fingerprint {type(value).__name__}')